@@ -1,68 +1,269 @@
+import math
 import time
+from collections import defaultdict, deque
+
+import numpy as np
 
 from Board import Board
+from Patterns import PatternTable
+from Solver import ConstraintSet, SolverBackend, AutoBackend, SamplingBackend, SolverTimeout, ComponentCache, \
+    combine_solutions
 from nguyenpanda.swan import Color
-from typing_extensions import List
-import copy
+from typing_extensions import Callable, List
+
+
+class ActionBatch:
+    """
+    Everything the AI decided in one turn, for the engine to apply at once with Board.apply_actions.
+    Iterating over it gives the cells to open.
+    When the AI had to guess, probability is the chance the cell it opens is a mine. If that came
+    from sampling (the move ran out of time to count exactly), samples is the effective number of
+    samples behind it and error its standard error, roughly
+    """
+    def __init__(self, opens: List, flags: List, turn: int, probability: float = None, error: float = 0.,
+                 samples: float = None):
+        self.opens = opens
+        self.flags = flags
+        self.turn = turn
+        self.probability = probability
+        self.error = error
+        self.samples = samples
+
+    def __iter__(self):
+        return iter(self.opens)
+
+    def __len__(self):
+        return len(self.opens)
 
 
 class AI:
-    def __init__(self, board: Board):
+    # The cell opened on the first turn, create the board with first_click=AI.FIRST_MOVE so it's safe
+    FIRST_MOVE = (0, 0)
+    # How much of a move's time budget has gone by when exact counting, then sampling, have to
+    # stop. What's left is for combining the components and picking the move
+    BUDGET_EXACT = 0.5
+    BUDGET_SAMPLING = 0.9
+    # Changed cells the frontier is brought up to date with, and numbered cells rule 1 and 2
+    # go through, between two looks at the clock, on a Board and on a ChunkedBoard, see catch_up
+    FRONTIER_BLOCK = 256
+    FRONTIER_BLOCK_CHUNKED = 64
+    RULE_BLOCK = 512
+    RULE_BLOCK_CHUNKED = 64
+    # Fewer numbered cells than this are quicker to go through one at a time than with array passes
+    RULE_GRID_CELLS = 32
+
+    def __init__(self, board: Board, verbose: bool = True, backend: SolverBackend = None, cacheSize: int = 256,
+                 budget: float = None, sampler: SamplingBackend = None, patterns: PatternTable = None):
+        """
+        :param board: the board to play
+        :param verbose: print the probabilities and the edge each turn
+        :param backend: the solver for the edge components, see Solver.py, AutoBackend by default
+        :param cacheSize: number of component solutions kept across turns
+        :param budget: seconds a move may take, None for no limit, make_move can override it
+        :param sampler: estimates the components that can't be counted in time, SamplingBackend by default
+        :param patterns: local patterns looked up before any search, see Patterns.py, None to go without
+        """
         self.__turn: int = 0
+        self.__verbose = verbose
+        self.__backend = backend if backend is not None else AutoBackend()
+        self.__sampler = sampler if sampler is not None else SamplingBackend()
+        self.__budget = budget
+        self.__patterns = patterns
+        # The cells that changed since the patterns were last looked up, see apply_patterns
+        self.__patternChanges = {}
+        # time.perf_counter() values this move's exact counting and sampling stop at, None without a budget
+        self.__exactDeadline = None
+        self.__samplingDeadline = None
+        # This turn's guess: the chance it's a mine, its standard error and samples, see ActionBatch
+        self.__guess = (None, 0., None)
+        # The AI never writes to the real board, each turn works on a snapshot of it
+        self.__live_board = board
         self.__board = board
         self.__minesCount = board.get_mines_count()
-        self.__boardMines = board.get_board_mines()
+        # A board that doesn't know its mine count (ChunkedBoard) only tells the chance of each cell
+        self.__density = board.get_density() if self.__minesCount is None else None
+        # The probability of every cell is only kept in a grid to be printed, see new_probabilities
+        self.__probabilityGrid = verbose and self.__density is None
         self.__boardFreq = board.get_board_freq()
         self.__boardStates = board.get_board_state()
         self.__board_shapes = board.get_board_shape()
 
 
-        self.__movesList = []
+        # Numbered cells that still have a hidden neighbour, and the hidden cells next to them.
+        # Use a dictionary so I don't have to use 'not in' again, both are updated from the
+        # board's changes each turn instead of being rebuilt, see update_frontier
+        self.__movesList = {}
+        self.__edgeCells = {}
+        # The numbered cells something changed around since rule 1 and 2 last went over them, see apply_rules
+        self.__ruleCells = {}
+        # The same since propagation last settled the numbers around them, and the constraints it
+        # derived then, with the ones each hidden cell is in, see propagate_constraints
+        self.__propagationCells = {}
+        self.__reductions = {}
+        self.__reductionsAt = {}
+        # The board version already read, the changes up to it not folded into the two above
+        # yet, and the flags this AI sent last turn
+        self.__version = 0
+        self.__changes = deque()
+        self.__pending_flags = []
+        # The solutions of the components solved on earlier turns
+        self.__cache = ComponentCache(cacheSize)
+        # Called with each turn's metrics, nothing is measured while there's none, see add_observer
+        self.__observers = []
+        self.__metrics = None
         self.__markedList = []
-        self.__probabilities = [[-1.] * self.__board_shapes[1] for _ in range(self.__board_shapes[0])]
+        self.__probabilities = self.new_probabilities()
         self.__moves_Return = []
+        self.__flags_Return = []
 
-    def make_move(self):
+    def make_move(self, budget: float = None):
         """
         The AI choose a cell to unlock and mark the cells that are 100% to be a mine
-        :return: row, column
+        :param budget: seconds this move may take, the AI's budget if None. The components that
+        can't be counted exactly in time are sampled instead, the move is then less sure, see ActionBatch.
+        The changes the frontier and the rules can't catch up on in time are left for the next move
+        once there's something to open (see catch_up), without anything to open it catches up first
+        :return: ActionBatch with the cells to open and the cells to flag
+        """
+        start = time.perf_counter()
+        budget = self.__budget if budget is None else budget
+        self.__exactDeadline = None if budget is None else start + budget * self.BUDGET_EXACT
+        self.__samplingDeadline = None if budget is None else start + budget * self.BUDGET_SAMPLING
+        if not self.__observers:
+            return self.play_turn()
+
+        self.__metrics = metrics = {"turn": self.__turn, "time": 0., "time_frontier": 0., "time_probability_grid": 0.,
+                                    "time_rule_one": 0., "time_rule_two": 0., "time_patterns": 0.,
+                                    "time_propagation": 0., "time_enumeration": 0., "components": 0,
+                                    "largest_component": 0,
+                                    "arrangements": 0, "sampled_components": 0, "samples": 0., "guess": False,
+                                    "guess_probability": 0., "guess_error": 0.}
+        branches, pruned = self.__backend.branches, self.__backend.pruned
+        hits, misses = self.__cache.hits, self.__cache.misses
+        actions = self.play_turn()
+        metrics["time"] = time.perf_counter() - start
+        metrics["frontier_size"] = len(self.__edgeCells)
+        metrics["numbers"] = len(self.__movesList)
+        metrics["branches"] = self.__backend.branches - branches
+        metrics["pruned"] = self.__backend.pruned - pruned
+        metrics["cache_hits"] = self.__cache.hits - hits
+        metrics["cache_misses"] = self.__cache.misses - misses
+        metrics["opens"] = len(actions.opens)
+        metrics["flags"] = len(actions.flags)
+        self.__metrics = None
+        for observer in list(self.__observers):
+            observer(metrics)
+        return actions
+
+    def add_observer(self, observer: Callable):
+        """
+        Call observer(metrics) after every turn from now on, metrics is a dictionary of how long
+        each step took (time_*), the size of the frontier and of its components, the search
+        branches tried and pruned, the arrangements found and the move taken, see Metrics.py
         """
-        # For the first couple turn, let the AI cheats and choose a safe cell
-        if self.__turn == 0:
+        self.__observers.append(observer)
+        self.__backend.instrumented = True
+
+    def remove_observer(self, observer: Callable):
+        self.__observers.remove(observer)
+        self.__backend.instrumented = bool(self.__observers)
+
+    def timed(self, step: str, function: Callable, *args):
+        """
+        Run one step of the turn, its time is added to the turn's metrics when someone observes them
+        """
+        if self.__metrics is None:
+            return function(*args)
+        start = time.perf_counter()
+        result = function(*args)
+        self.__metrics["time_" + step] += time.perf_counter() - start
+        return result
+
+    def play_turn(self):
+        self.__board = self.__live_board.snapshot()
+        # From the snapshot too: a ChunkedBoard's grids create the chunks they're asked for, that
+        # has to happen on the snapshot and not on the board the game is being played on
+        self.__boardFreq = self.__board.get_board_freq()
+        self.__boardStates = self.__board.get_board_state()
+        self.__flags_Return = []
+        self.__guess = (None, 0., None)
+        # Nothing to go on for the first turn, the board keeps FIRST_MOVE clear when it's told to
+        if self.__turn == 0 and self.__board.get_opened_count() == 0 and self.__board.get_flagged_count() == 0:
             self.__turn += 1
-            self.__moves_Return = [(0, 0)]
-            self.print_probability()
-            return self.__moves_Return
-        elif self.__turn >= 1:
+            self.__moves_Return = [self.FIRST_MOVE]
+            if self.__verbose:
+                self.print_probability()
+            return ActionBatch(self.__moves_Return, self.__flags_Return, self.__turn - 1)
+        else:
             # This is the important part
-            # 1. Filter out the solved cells
-            # 2. Look through all the numbered cells and find their neighbour
-            self.filter_solved_cells()
-            edgeCells = {}  # Use a dictionary so I don't have to use 'not in' again
-            # TODO: Add some localization for faster decision
-            for move in self.__movesList:
-                potential_neighbour = self.__board.get_hidden_neighbour(move[0], move[1])
-                for p in potential_neighbour:
-                    edgeCells[p] = p
+            # 1. Update the numbered cells and the edge around what changed since last turn
+            # 2. Deduce from the numbered cells, then enumerate the edge if needed
+            version = self.__board.get_version()
+            if self.__turn == 0:
+                # Started on a game already under way (e.g. a replayed position), every cell that isn't hidden is new
+                changes = self.__board.known_cells()
+            else:
+                changes = self.__board.changes_since(self.__version) + self.__pending_flags
+            self.__changes.extend(changes)
+            self.__version = version
+            if self.__patterns is not None:
+                self.__patternChanges.update(dict.fromkeys(changes))
 
             # Update the probabilities for each cell and self.__moves_Return
             self.__moves_Return = []
-            self.calculate_probability(edgeCells)
+            self.calculate_probability(self.__edgeCells)
+            self.__pending_flags = self.__flags_Return
 
             # Loop
             self.__turn += 1
-            return self.__moves_Return
+            return ActionBatch(self.__moves_Return, self.__flags_Return, self.__turn - 1, *self.__guess)
 
         pass
 
-    def filter_solved_cells(self):
-        for i in range(len(self.__movesList) - 1, -1, -1):
-            cell = self.__movesList[i]
-            if self.__board.solved_cell(cell[0], cell[1]):
-                self.__movesList.pop(i)
+    def update_frontier(self, changes: List):
+        """
+        Bring the numbered cells and the edge cells up to date. Only the changed cells and
+        their neighbours can join or leave either, so nothing else is looked at. The constraints
+        propagation derived with a changed cell in them are dropped
+        :param changes: cells whose state changed
+        :return: None
+        """
+        for cell in changes:
+            for cells in self.__reductionsAt.pop(cell, ()):
+                self.__reductions.pop(cells, None)
+        touched = self.__board.neighbourhood(changes)
+        # After a big flood fill, working both sets out for all the touched cells at once is much quicker
+        if self.__density is None and len(touched) > 64:
+            rows, cols = np.array(touched, dtype=np.intp).T
+            moves, edge = self.__board.frontier_masks(rows * self.__board_shapes[1] + cols)
+            marks = zip(touched, moves.tolist(), edge.tolist())
+        else:
+            marks = ((cell, self.__boardStates[cell] == 2 and self.__boardFreq[cell] > 0 and
+                      not self.__board.solved_cell(cell[0], cell[1]),
+                      self.__boardStates[cell] == 0 and bool(self.__board.get_frequency_neighbours(cell[0], cell[1])))
+                     for cell in touched)
+        for cell, isMove, isEdge in marks:
+            if isMove:
+                self.__movesList[cell] = cell
+                self.__ruleCells[cell] = cell
+                self.__propagationCells[cell] = cell
+            else:
+                self.__movesList.pop(cell, None)
+                self.__ruleCells.pop(cell, None)
+                self.__propagationCells.pop(cell, None)
+            if isEdge:
+                self.__edgeCells[cell] = cell
+            else:
+                self.__edgeCells.pop(cell, None)
 
     def get_moves_list(self):
-        return self.__movesList
+        return list(self.__movesList)
+
+    def get_cache(self):
+        return self.__cache
+
+    def get_backend(self):
+        return self.__backend
 
     def calculate_probability(self, edgeCell):
         """
@@ -71,174 +272,530 @@ class AI:
         :return:
         """
         # Marked cells are 100% to be bomb
-        self.__probabilities = [[-1.] * self.__board_shapes[1] for _ in range(self.__board_shapes[0])]
-        self.fill_marked_probabilities()
-        self.fill_opened_probabilities()
-        # Trivial deduction rule 1
-        self.ruleOne()
-        # Trivial deduction rule 2
-        self.ruleTwo()
+        self.__probabilities = self.new_probabilities()
+        if self.__probabilityGrid:
+            self.timed("probability_grid", self.fill_marked_probabilities)
+            self.timed("probability_grid", self.fill_opened_probabilities)
+        # Trivial deduction rule 1 and 2, on the numbers around what changed
+        self.catch_up()
+        # The patterns the numbers make, a hash lookup per window, only on a Board's full grids
+        if len(self.__moves_Return) == 0 and self.__patterns is not None and self.__density is None:
+            flags = len(self.__flags_Return)
+            self.timed("patterns", self.apply_patterns)
+            # The mines it found may finish off more numbers
+            if len(self.__flags_Return) > flags:
+                self.timed("rule_two", self.ruleTwoGrid, self.numbers_around(self.__flags_Return[flags:]))
+        # Combine neighbouring numbers before falling back to enumeration
+        if len(self.__moves_Return) == 0:
+            self.timed("propagation", self.propagate_constraints)
 
         # Only do this if there's no way to avoid having luck involved in decision, well in theory
         if len(self.__moves_Return) == 0:
-            # Generate all possible arrangement
-            # key: (row, column) - value: the frequency of that cell
-            moveFreq = {}
-            for r, c in self.__movesList:
-                moveFreq[(r, c)] = self.__boardFreq[r][c]
-                moveFreq[(r, c)] -= len(self.__board.get_flagged_neighbour(r, c))
-
-
-            edgeMine = {}
-            edgeList = []
-            arrange_probability = {}
-            # Base case before generation, all edge doesn't contain any bomb
-            for r, c in edgeCell:
-                edgeMine[(r, c)] = 0
-                arrange_probability[(r, c)] = 0.
-                if self.__boardStates[r][c] != 1:
-                    edgeList.append((r, c))
-            arrangementList = []
-            print(Color["b"],edgeList)
-            self.generate_arrangement(0, moveFreq, edgeList, edgeMine, arrangementList)
-            print(len(arrangementList))
+            # Rule 1 may have flagged some cells
+            self.timed("frontier", self.update_frontier, self.__flags_Return)
+            self.timed("enumeration", self.enumerate_edge)
 
+    def enumerate_edge(self):
+        """
+        Solve every component of the edge and pick the cell least likely to be a bomb, on the edge or not
+        :return: None
+        """
+        # Generate all possible arrangement
+        # key: (row, column) - value: the frequency of that cell
+        moveFreq = {}
+        for r, c in self.__movesList:
+            moveFreq[(r, c)] = int(self.__boardFreq[r, c])
+            moveFreq[(r, c)] -= self.__board.flagged_neighbour_count(r, c)
 
+        edgeList = list(self.__edgeCells)
+        arrange_probability = {}
+        if self.__verbose:
+            print(Color["b"],edgeList)
 
-            num_arrange = len(arrangementList)
-
-            for arrangement in arrangementList:
-                for edge in edgeList:
-                    arrange_probability[edge] += arrangement[edge]
-
-
-            for edge in edgeList:
-                arrange_probability[edge] /= num_arrange
-                self.__probabilities[edge[0]][edge[1]] = arrange_probability[edge]
-                if len(self.__moves_Return) == 0:
-                    self.__moves_Return = [edge]
-                # This edge cell has a smaller change to be a bomb
-                elif arrange_probability[edge] < arrange_probability[self.__moves_Return[0]]:
-                    self.__moves_Return = [edge]
-
-
+        # Enumerate every independent part of the frontier on its own, 2^a + 2^b instead of 2^(a+b).
+        # A component that didn't change since it was last solved is in the cache, its cells
+        # are sorted so the same component always gets the same signature
+        components = [sorted(component) for component in self.find_components(edgeList)]
+        constraintSets = []
+        for component in components:
+            # key: frequency cell - value: the indices of its cells in component
+            componentFreq = {}
+            for j, (r, c) in enumerate(component):
+                for n in self.__board.get_frequency_neighbours(r, c):
+                    componentFreq.setdefault(n, []).append(j)
+            constraintSets.append(ConstraintSet(component, [(moveFreq[n], indices)
+                                                            for n, indices in componentFreq.items()]))
+
+        # Smallest first, so one huge component can't take the time the others need to be counted exactly.
+        # key: component - value: effective number of samples, for the ones that were only estimated
+        samples = {}
+        solutionsList = [None] * len(components)
+        for c in sorted(range(len(components)), key=lambda c: len(components[c])):
+            key = self.__cache.signature(constraintSets[c])
+            solutions = self.__cache.get(key)
+            if solutions is None:
+                solutions = self.count_exactly(constraintSets[c])
+                # A backend that only estimates (SamplingBackend asked for by name) is never cached
+                if solutions is not None and self.__backend.exact:
+                    self.__cache.put(key, solutions)
+                elif solutions is not None:
+                    samples[c] = self.__backend.effective_samples
+            solutionsList[c] = solutions
+
+        # The components that couldn't be counted in time are sampled, they share the time left
+        sampled = [c for c, solutions in enumerate(solutionsList) if solutions is None]
+        for i, c in enumerate(sampled):
+            now = time.perf_counter()
+            self.__sampler.deadline = now + max(0., self.__samplingDeadline - now) / (len(sampled) - i)
+            solutionsList[c] = self.__sampler.count_solutions(constraintSets[c])
+            samples[c] = self.__sampler.effective_samples
+        self.__sampler.deadline = None
+        if self.__verbose:
+            for component, solutions in zip(components, solutionsList):
+                print(len(component), sum(count for count, _ in solutions.values()))
+
+        # A component without a single arrangement (no sample made it in time) says nothing, it's left out
+        known = [c for c, solutions in enumerate(solutionsList) if solutions]
+        # The hidden cells that don't touch any frequency cell and the mines left for the whole board
+        if self.__density is None:
+            interiorCount = self.__board.get_hidden_count() - len(edgeList)
+            componentProbabilities, interior_probability = combine_solutions(
+                [solutionsList[c] for c in known], self.__minesCount - self.__board.get_flagged_count(),
+                interiorCount)
+        else:
+            interiorCount = None
+            componentProbabilities, interior_probability = combine_solutions(
+                [solutionsList[c] for c in known], None, None, self.__density)
+
+        # key: edge cell - value: its component
+        edgeComponent = {}
+        for c, probabilities in zip(known, componentProbabilities):
+            for edge, probability in zip(components[c], probabilities):
+                arrange_probability[edge] = probability
+                edgeComponent[edge] = c
+
+        for edge in edgeList:
+            if edge not in arrange_probability:
+                continue
+            self.__probabilities[edge[0]][edge[1]] = arrange_probability[edge]
+            if len(self.__moves_Return) == 0:
+                self.__moves_Return = [edge]
+            # This edge cell has a smaller change to be a bomb
+            elif arrange_probability[edge] < arrange_probability[self.__moves_Return[0]]:
+                self.__moves_Return = [edge]
+
+        # Every interior cell has the same chance, take one if it beats the whole edge
+        interiorCell = None
+        if interiorCount is None:
+            # No end to the interior of a chunked board, any hidden cell off the edge will do
+            interiorCell = next(self.__board.interior_cells(self.__edgeCells), None)
+        elif interiorCount > 0:
+            interior = self.__board.interior_mask(self.__edgeCells)
+            if self.__probabilityGrid:
+                self.__probabilities[interior] = interior_probability
+            interiorCell = divmod(int(np.flatnonzero(interior)[0]), interior.shape[1])
+        if interiorCell is not None:
+            if len(self.__moves_Return) == 0 or \
+                    interior_probability < arrange_probability[self.__moves_Return[0]]:
+                self.__moves_Return = [interiorCell]
+
+        if self.__moves_Return:
+            move = self.__moves_Return[0]
+            probability = arrange_probability.get(move, interior_probability)
+            # An edge cell depends on the samples of its component, an interior cell on every
+            # sampled component (not with a density, an interior cell is then independent of the edge)
+            if move in edgeComponent:
+                moveSamples = samples.get(edgeComponent[move])
+            elif interiorCount is not None and samples:
+                moveSamples = min(samples.values())
+            else:
+                moveSamples = None
+            error = 0.
+            if moveSamples is not None:
+                error = math.sqrt(max(0., probability * (1 - probability)) / max(moveSamples, 1.))
+            self.__guess = (probability, error, moveSamples)
+
+        if self.__metrics is not None:
+            move = self.__moves_Return[0] if self.__moves_Return else None
+            self.__metrics.update(components=len(components),
+                                  largest_component=max((len(component) for component in components), default=0),
+                                  arrangements=sum(count for c, solutions in enumerate(solutionsList)
+                                                   if c not in samples for count, _ in solutions.values()),
+                                  sampled_components=len(samples),
+                                  samples=sum(samples.values()),
+                                  guess=move is not None,
+                                  guess_probability=arrange_probability.get(move, interior_probability),
+                                  guess_error=self.__guess[1])
+
+    def count_exactly(self, constraintSet: ConstraintSet):
+        """
+        Count the arrangements of a component with the backend, unless this move's time for exact counting runs out.
+        A backend that isn't exact (see SolverBackend.exact) only estimates them
+        :return: the solutions, None if it ran out of time
+        """
+        if self.__exactDeadline is None:
+            return self.__backend.count_solutions(constraintSet)
+        if time.perf_counter() > self.__exactDeadline:
+            return None
+        self.__backend.deadline = self.__exactDeadline
+        try:
+            return self.__backend.count_solutions(constraintSet)
+        except SolverTimeout:
+            return None
+        finally:
+            self.__backend.deadline = None
 
+    def find_components(self, edgeList: List):
+        """
+        Split the edge cells into groups that don't share any frequency cell, the arrangement of
+        one group has no effect on the others so each group can be generated on its own
+        :param edgeList: The list containing all edge cells
+        :return: A list of groups, each group keeps the order of edgeList
+        """
+        # key: frequency cell - value: the edge cells around it
+        freqEdges = {}
+        for edge in edgeList:
+            for n in self.__board.get_frequency_neighbours(edge[0], edge[1]):
+                freqEdges.setdefault(n, []).append(edge)
+
+        componentID = {}
+        count = 0
+        for edge in edgeList:
+            if edge in componentID:
+                continue
+            # BFS through the shared frequency cells
+            componentID[edge] = count
+            queue = deque([edge])
+            while queue:
+                curr = queue.popleft()
+                for n in self.__board.get_frequency_neighbours(curr[0], curr[1]):
+                    for other in freqEdges[n]:
+                        if other not in componentID:
+                            componentID[other] = count
+                            queue.append(other)
+            count += 1
+
+        components = [[] for _ in range(count)]
+        for edge in edgeList:
+            components[componentID[edge]].append(edge)
+        return components
+
+    def new_probabilities(self):
+        """
+        A (height, width) float array of -1 to print when verbose on a Board. Otherwise an empty
+        row -> column -> probability mapping, only the cells worked out this turn are kept,
+        filling a grid each turn would cost more the bigger the board
+        """
+        if not self.__probabilityGrid:
+            return defaultdict(dict)
+        return np.full(self.__board_shapes, -1.)
 
     def fill_marked_probabilities(self):
-        for i in range(self.__board_shapes[0]):
-            for j in range(self.__board_shapes[1]):
-                if self.__boardStates[i][j] == 1:
-                    self.__probabilities[i][j] = 1
+        self.__probabilities[self.__boardStates == 1] = 1
 
     def fill_opened_probabilities(self):
-        for i in range(self.__board_shapes[0]):
-            for j in range(self.__board_shapes[1]):
-                if self.__boardStates[i][j] == 2:
-                    self.__probabilities[i][j] = 0
+        self.__probabilities[self.__boardStates == 2] = 0
 
-    def ruleOne(self):
+    def catch_up(self):
         """
-        For each frequency cell if it has the same amount of hidden cells as the un-flagged bomb around it then flag it
+        Bring the numbered cells and the edge up to date with the changes since the last move,
+        FRONTIER_BLOCK of them at a time, and apply rule 1 and 2 to the numbers each block
+        touched. Once this move's time for exact counting has run out and there's something to
+        open, the changes left are kept for the next move. The search needs all of the edge,
+        without anything to open this goes on to the last change
         :return: None
         """
-        for r, c in self.__movesList:
-            un_flagged = self.__board.get_hidden_neighbour(r, c)
-            flagged = self.__board.get_flagged_neighbour(r, c)
-            if len(un_flagged) + len(flagged) == self.__boardFreq[r][c]:
+        size = self.FRONTIER_BLOCK if self.__density is None else self.FRONTIER_BLOCK_CHUNKED
+        deadline = self.__exactDeadline
+        # Without a budget in one go
+        if deadline is None:
+            size = max(len(self.__changes), 1)
+        while True:
+            block = [self.__changes.popleft() for _ in range(min(size, len(self.__changes)))]
+            self.timed("frontier", self.update_frontier, block)
+            self.apply_rules()
+            if not self.__changes:
+                return
+            if self.__moves_Return and deadline is not None and time.perf_counter() > deadline:
+                return
+
+    def apply_rules(self):
+        """
+        Rule 1 then rule 2 on the numbered cells something changed around since they were last
+        looked at, RULE_BLOCK of them at a time. Nothing new can come from the others, what they
+        said has been played already. Rule 2 also goes over the numbers next to rule 1's new flags.
+        Once this move's time for exact counting has run out and there's something to open, the
+        numbers left are kept for the next move.
+        On a Board, RULE_GRID_CELLS numbers or more go through the grid versions of the rules
+        :return: None
+        """
+        size = self.RULE_BLOCK if self.__density is None else self.RULE_BLOCK_CHUNKED
+        deadline = self.__exactDeadline
+        cells = list(self.__ruleCells)
+        if deadline is None:
+            size = max(len(cells), 1)
+        for start in range(0, len(cells), size):
+            if self.__moves_Return and deadline is not None and time.perf_counter() > deadline:
+                break
+            block = cells[start:start + size]
+            flags = len(self.__flags_Return)
+            if self.__density is None and len(block) >= self.RULE_GRID_CELLS:
+                self.timed("rule_one", self.ruleOneGrid, block)
+            else:
+                self.timed("rule_one", self.ruleOne, block)
+            numbers = block + self.numbers_around(self.__flags_Return[flags:])
+            if self.__density is None and len(numbers) >= self.RULE_GRID_CELLS:
+                self.timed("rule_two", self.ruleTwoGrid, numbers)
+            else:
+                self.timed("rule_two", self.ruleTwo, numbers)
+            for cell in block:
+                del self.__ruleCells[cell]
+        # A cell next to two numbers is found by both. On a Board, in row-major order whichever
+        # way the rules went, the order the cells are played in decides the ties between guesses later
+        self.__moves_Return = list(dict.fromkeys(self.__moves_Return))
+        if self.__density is None:
+            self.__moves_Return.sort()
+            self.__flags_Return.sort()
+
+    def numbers_around(self, cells: List):
+        """
+        The numbered cells with a hidden neighbour next to any of cells
+        """
+        if not cells:
+            return []
+        return [n for n in self.__board.neighbourhood(cells) if n in self.__movesList]
+
+    def ruleOne(self, cells: List):
+        """
+        For each frequency cell if it has the same amount of hidden cells as the un-flagged bomb around it then flag it,
+        on the snapshot and in the flags returned to the engine
+        :param cells: the numbered cells to look at
+        :return: None
+        """
+        for r, c in cells:
+            hidden = self.__board.hidden_neighbour_count(r, c)
+            flagged = self.__board.flagged_neighbour_count(r, c)
+            if hidden > 0 and hidden + flagged == self.__boardFreq[r, c]:
                 # All the un-flagged are bomb -> flag them
-                for n_r, n_c in un_flagged:
+                for n_r, n_c in self.__board.get_hidden_neighbour(r, c):
                     self.__probabilities[n_r][n_c] = 1
-                    self.__boardStates[n_r][n_c] = 1
+                    self.__board.set_state(n_r, n_c, 1)
+                    self.__flags_Return.append((n_r, n_c))
+
+    def ruleOneGrid(self, cells: List):
+        """
+        Rule 1 for many numbered cells at once: the board counts their hidden and flagged
+        neighbours, the numbers they add up to are full and every hidden cell next to one of
+        them is flagged, each once, in row-major order. Same flags as ruleOne
+        :param cells: the numbered cells to look at
+        :return: None
+        """
+        idx = self.flat_indices(cells)
+        hidden, flagged = self.__board.neighbour_counts(idx)
+        full = idx[(hidden > 0) & (hidden + flagged == self.__boardFreq.reshape(-1)[idx])]
+        for n_r, n_c in self.__board.set_states(self.__board.hidden_around(full), 1):
+            self.__probabilities[n_r][n_c] = 1
+            self.__flags_Return.append((n_r, n_c))
+
+    def ruleTwoGrid(self, cells: List):
+        """
+        Rule 2 for many numbered cells at once, after rule 1's flags: the numbers with as many
+        flags as mines are done and every hidden cell next to one of them is safe.
+        Same cells as ruleTwo, each once, in row-major order
+        :param cells: the numbered cells to look at
+        :return: None
+        """
+        idx = self.flat_indices(cells)
+        hidden, flagged = self.__board.neighbour_counts(idx)
+        done = idx[(hidden > 0) & (flagged == self.__boardFreq.reshape(-1)[idx])]
+        width = self.__board_shapes[1]
+        for n in self.__board.hidden_around(done).tolist():
+            n_r, n_c = divmod(n, width)
+            self.__probabilities[n_r][n_c] = 0
+            self.__moves_Return.append((n_r, n_c))
+
+    def flat_indices(self, cells: List):
+        """
+        :return: the row-major indices of cells, an int array
+        """
+        if not cells:
+            return np.zeros(0, dtype=np.intp)
+        rows, cols = np.array(cells, dtype=np.intp).T
+        return rows * self.__board_shapes[1] + cols
 
-    def ruleTwo(self):
+    def ruleTwo(self, cells: List):
         """
         If a cell's frequency is the same as the number flagged cell around it, the remaining
         hidden square are 100% NOT bomb!
 
+        :param cells: the numbered cells to look at
         :return: None
         """
-        for r, c in self.__movesList:
-            un_flagged = self.__board.get_hidden_neighbour(r, c)
-            flagged = self.__board.get_flagged_neighbour(r, c)
-            if len(flagged) == self.__boardFreq[r][c]:
+        for r, c in cells:
+            hidden = self.__board.hidden_neighbour_count(r, c)
+            flagged = self.__board.flagged_neighbour_count(r, c)
+            if hidden > 0 and flagged == self.__boardFreq[r, c]:
                 # All the un-flagged are  NOT bomb -> Open them
-                for n_r, n_c in un_flagged:
+                for n_r, n_c in self.__board.get_hidden_neighbour(r, c):
                     self.__probabilities[n_r][n_c] = 0
-                    # self.__boardStates[n_r][n_c] = 2
+                    # self.__boardStates[n_r, n_c] = 2
                     self.__moves_Return.append((n_r, n_c))
 
-    def generate_arrangement(self, i: int, moveFreq, edgeList, edgeMine, arrangeList: List):
-        # 1st cell is a bomb
-        self.generate_arrangement_helper(i, moveFreq, edgeList, edgeMine, isBomb=1,
-                                         arrangeList=arrangeList)
-        # 1st cell is not a bomb
-        self.generate_arrangement_helper(i, moveFreq, edgeList, edgeMine, isBomb=0,
-                                         arrangeList=arrangeList)
-
-    def generate_arrangement_helper(self, i: int, moveFreq, edgeList, edgeMine, isBomb: int,
-                                    arrangeList: List):
-        """
-        Generate and test all possible bomb arrangement that satisfy all
-        neighbouring frequency cells of all edge cells
-        :param i: the index traverse the edgeCell list
-        :param moveFreq: A dictionary to store the leftover frequency of the neighbour of the edge cell
-        :param edgeList: The list containing all edge cells
-        :param edgeMine: A dictionary to store the assumption if the cell contains a bomb
-        :param isBomb: Assumption that the i-th cell of the list is a bomb or not
-        :param arrangeList: A list to store all possible arrangements
-        :return:
+    def apply_patterns(self):
         """
-        temp_freq = copy.deepcopy(moveFreq)
-        temp_mine = copy.deepcopy(edgeMine)
-        # if i == 0:
-        #     print(Color["CYAN"] +"="*25, isBomb)
-        # else:
-        #     print(Color["CYAN"] + "\t\t" + "=" * 25, isBomb)
-        # # print(Color["b"],temp_freq)
-        # print(Color["g"],temp_mine)
-        try:
-            curr_edge = edgeList[i]
-        except:
-            print("Index:", i)
-            print(edgeList)
-        # print("Curr eddge:",curr_edge)
-        # If the cell is flagged is guaranteed to be a bomb
-        if self.__boardStates[curr_edge[0]][curr_edge[1]] == 1:
-            if isBomb == 0:  # The assumption is wrong, no need to traverse this path
-                return
-
-        if isBomb == 1:
-            # Find the frequency neighbour of this edge cell
-            # print(Color["r"]+"Bomb=1")
-            temp_mine[curr_edge] = 1
-            neighbours = self.__board.get_frequency_neighbours(curr_edge[0], curr_edge[1])
-            for n in neighbours:
-                if temp_freq[n] == 0:
-                    # If this cell is a mine then the frequency will be greater than actual value
-                    return  # This means that the assumption is wrong, no need to traverse this path
-                temp_freq[n] -= 1  # Reduce the frequency
-            # No more edge cell to check, meaning have generated all possibilities
-
-        elif isBomb == 0:
-            # print(Color["p"]+"Bomb=0")
-            temp_mine[curr_edge] = 0
-
-
-
-        # print(Color["b"], temp_freq)
-        # print(Color["g"], temp_mine)
-        if i == len(edgeList) - 1:
-
-            if not all(value == 0 for value in temp_freq.values()):
-                # print(Color["r"]+ "This arrangement does NOT satisfy the frequency")
-                return
-            # print(Color["r"]+ "This arrangement DOES satisfy the frequency")
-            arrangeList.append(temp_mine)
-            return
-        self.generate_arrangement_helper(i + 1, temp_freq, edgeList, temp_mine, isBomb=1,
-                                         arrangeList=arrangeList)
-        self.generate_arrangement_helper(i + 1, temp_freq, edgeList, temp_mine, isBomb=0,
-                                         arrangeList=arrangeList)
+        Look the window around every numbered cell up in the pattern table. Mines are flagged
+        like rule 1 and safe cells are returned like rule 2. A window nothing changed in since
+        the last lookup is skipped, what it forced then has been played already
+        :return: None
+        """
+        # The changes since last time, and the flags of this turn so far
+        self.__patternChanges.update(dict.fromkeys(self.__board.changes_since(self.__version)))
+        mines, safe = self.__patterns.lookup(self.__boardStates, self.__boardFreq, list(self.__movesList),
+                                             list(self.__patternChanges))
+        self.__patternChanges = {}
+        for n_r, n_c in mines:
+            self.__probabilities[n_r][n_c] = 1
+            self.__board.set_state(n_r, n_c, 1)
+            self.__flags_Return.append((n_r, n_c))
+        for n_r, n_c in safe:
+            self.__probabilities[n_r][n_c] = 0
+            self.__moves_Return.append((n_r, n_c))
+
+    def propagate_constraints(self):
+        """
+        Every numbered cell says "this many mines among these hidden cells". Two numbers that
+        share hidden cells say more together than apart:
+        - If A's cells are all in B's, B's other cells hold B - A mines (subset reduction),
+          which is added as a new constraint
+        - The shared cells hold between max(0, A - |A only|, B - |B only|) and min(A, B, |shared|)
+          mines, if that forces B's own cells to be all mines or all safe, they are
+        Known cells are taken out of every constraint and this repeats until nothing changes, or
+        this move's time for exact counting runs out, what was deduced by then still holds.
+        Only the components (numbers linked by the hidden cells they share) something changed in
+        since they were last settled are gone over, together with the constraints derived for
+        them then. The others found nothing then and would find nothing again.
+        Mines are flagged like rule 1 and safe cells are returned like rule 2
+        :return: None
+        """
+        deadline = self.__exactDeadline
+        timedOut = False
+        # The numbered cells of those components and their hidden cells, reached through the
+        # numbers around each hidden cell. This turn's flags changed the numbers around them too
+        numbers = {}
+        reached = {}
+        queue = list(self.__propagationCells) + self.numbers_around(self.__flags_Return)
+        while queue:
+            if deadline is not None and time.perf_counter() > deadline:
+                timedOut = True
+                break
+            number = queue.pop()
+            if number in numbers or number not in self.__movesList:
+                continue
+            numbers[number] = cells = frozenset(self.__board.get_hidden_neighbour(*number))
+            for cell in cells:
+                if cell not in reached:
+                    reached[cell] = cell
+                    queue.extend(n for n in self.__board.get_frequency_neighbours(*cell) if n not in numbers)
+
+        # key: the hidden cells - value: the mines among them. In the order of the numbered cells,
+        # what's found is played in that order and that order decides the ties between guesses later
+        constraints = {}
+        for number in self.__movesList:
+            cells = numbers.get(number)
+            if cells:
+                constraints[cells] = int(self.__boardFreq[number]) - self.__board.flagged_neighbour_count(*number)
+        given = set(constraints)
+        # The ones derived last time, less this turn's flags
+        kept = {}
+        for cell in reached:
+            kept.update(self.__reductionsAt.pop(cell, {}))
+        for cells in kept:
+            count = self.__reductions.pop(cells, None)
+            if count is None:
+                continue
+            count -= sum(1 for cell in cells if self.__boardStates[cell] == 1)
+            cells = frozenset(cell for cell in cells if self.__boardStates[cell] == 0)
+            if cells:
+                constraints.setdefault(cells, count)
+
+        safe = {}
+        mines = {}
+        changed = True
+        while changed and constraints:
+            changed = False
+            # key: cell - value: the constraints it's in
+            cellConstraints = {}
+            for cells in constraints:
+                for cell in cells:
+                    cellConstraints.setdefault(cell, []).append(cells)
+
+            derived = {}
+            for a, mines_a in constraints.items():
+                if deadline is not None and time.perf_counter() > deadline:
+                    timedOut = True
+                    break
+                others = {b for cell in a for b in cellConstraints[cell] if b is not a}
+                for b in others:
+                    mines_b = constraints[b]
+                    shared = a & b
+                    only_b = b - shared
+                    if not only_b:
+                        continue
+                    if len(shared) == len(a) and only_b not in constraints:
+                        derived[only_b] = mines_b - mines_a
+                    most = min(mines_a, mines_b, len(shared))
+                    least = max(0, mines_a - (len(a) - len(shared)), mines_b - len(only_b))
+                    if mines_b - most == len(only_b):
+                        for cell in only_b:
+                            mines[cell] = cell
+                        changed = True
+                    elif mines_b - least == 0:
+                        for cell in only_b:
+                            safe[cell] = cell
+                        changed = True
+            if timedOut:
+                break
+            for cells, count in derived.items():
+                constraints[cells] = count
+                changed = True
+
+            # Take the known cells out, a constraint left with all or none of its cells as mines is decided.
+            # One that lost cells goes round again, a cell decided later in this pass may not be out of
+            # the ones before it, whether propagation got everything mustn't depend on their order
+            reduced = {}
+            for cells, count in constraints.items():
+                known_mines = sum(1 for cell in cells if cell in mines)
+                size = len(cells)
+                cells = frozenset(cell for cell in cells if cell not in mines and cell not in safe)
+                count -= known_mines
+                if not cells:
+                    continue
+                if len(cells) < size:
+                    changed = True
+                if count == 0 or count == len(cells):
+                    for cell in cells:
+                        (mines if count else safe)[cell] = cell
+                    changed = True
+                    continue
+                reduced[cells] = count
+            constraints = reduced
+
+        # Kept for the next time these components change
+        for cells, count in constraints.items():
+            if cells not in given:
+                self.__reductions[cells] = count
+                for cell in cells:
+                    self.__reductionsAt.setdefault(cell, {})[cells] = None
+        if not timedOut:
+            self.__propagationCells = {}
+
+        for n_r, n_c in mines:
+            self.__probabilities[n_r][n_c] = 1
+            self.__board.set_state(n_r, n_c, 1)
+            self.__flags_Return.append((n_r, n_c))
+        for n_r, n_c in safe:
+            self.__probabilities[n_r][n_c] = 0
+            self.__moves_Return.append((n_r, n_c))
 
     def print_probability(self):
         print(Color["p"])
@@ -0,0 +1,233 @@
+"""
+Benchmarks for the hot paths of Board and AI, on every board size.
+
+Each benchmark runs on a fixed set of seeded inputs, every input several times. The fastest
+run of an input is the one least disturbed by whatever else the machine is doing, the total
+of those over all the inputs is what a baseline is compared on. Each benchmark is run once
+more under tracemalloc for its peak memory. Anything slower than the tolerance is flagged
+and the exit code is 1.
+
+    cd Game
+    python Benchmark.py --save baseline.json
+    python Benchmark.py --compare baseline.json
+    python Benchmark.py --sizes expert --only make_move game
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+
+from Board import Board
+from AI import AI
+from Simulator import play_game
+from Storage import pack_board, unpack_board
+
+# name: (width, height, mines, full games to time)
+SIZES = {
+    "beginner": (9, 9, 10, 20),
+    "intermediate": (16, 16, 40, 20),
+    "expert": (30, 16, 99, 20),
+    "oversized": (100, 100, 2000, 3),
+}
+
+
+def bench_construction(width: int, height: int, mines: int):
+    def setup(i):
+        return i
+
+    def run(seed):
+        Board(width, height, mines, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+    return setup, run
+
+
+def bench_fill_frequency(width: int, height: int, mines: int):
+    def setup(i):
+        return Board(width, height, mines, seed=i, verbose=False)
+
+    def run(board):
+        board.fillFrequency()
+    return setup, run
+
+
+def bench_flood_fill(width: int, height: int, mines: int):
+    """
+    Open the middle of a board kept clear around it, the whole empty region opens with it
+    """
+    middle = (height // 2, width // 2)
+
+    def setup(i):
+        return Board(width, height, mines, seed=i, verbose=False, first_click=middle)
+
+    def run(board):
+        board.open_cell(*middle)
+    return setup, run
+
+
+def midgame_positions(width: int, height: int, mines: int, count: int, max_seeds: int = None):
+    """
+    Positions from seeded games the rules and propagation can't settle, so the AI has to count
+    the arrangements of the edge and guess. Taken right before the first such turn after the AI
+    has opened 40% of the safe cells (or before its last one, if the game ends earlier).
+    Games with no such turn are skipped
+    :param max_seeds: seeds tried at most, 100 * count by default, a small or sparse board may
+        have few games with such a turn or none
+    :return: the positions, packed with Storage.pack_board, fewer than count with a warning if
+        the seeds ran out first
+    :raises ValueError: none of the games had such a turn
+    """
+    if max_seeds is None:
+        max_seeds = 100 * count
+    positions = []
+    seed = 0
+    while len(positions) < count and seed < max_seeds:
+        board = Board(width, height, mines, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+        ai = AI(board, verbose=False)
+        target = 0.4 * (width * height - mines)
+        position = None
+        while not board.winning_check():
+            packed = pack_board(board)
+            moves = ai.make_move()
+            if moves.probability is not None and moves.turn > 0:
+                position = packed
+                if board.get_opened_count() >= target:
+                    break
+            if len(moves) == 0 or board.apply_actions(moves.flags, moves.opens)[1]:
+                break
+        if position is not None:
+            positions.append(position)
+        seed += 1
+    if not positions:
+        raise ValueError("The AI had no guess to count in %d games on %dx%d boards with %d mines"
+                         % (max_seeds, width, height, mines))
+    if len(positions) < count:
+        warnings.warn("Only %d of %d mid-game positions in %d games on %dx%d boards with %d mines"
+                      % (len(positions), count, max_seeds, width, height, mines))
+    return positions
+
+
+def bench_make_move(width: int, height: int, mines: int, count: int = 20):
+    """
+    A fresh AI's guess on a mid-game position, building its frontier from the board included
+    """
+    positions = midgame_positions(width, height, mines, count)
+
+    def setup(i):
+        return AI(unpack_board(positions[i % len(positions)]), verbose=False)
+
+    def run(ai):
+        ai.make_move()
+    return setup, run
+
+
+def bench_game(width: int, height: int, mines: int):
+    def setup(i):
+        return i
+
+    def run(seed):
+        play_game(seed, width=width, height=height, mines=mines)
+    return setup, run
+
+
+BENCHMARKS = {
+    "construction": bench_construction,
+    "fill_frequency": bench_fill_frequency,
+    "flood_fill": bench_flood_fill,
+    "make_move": bench_make_move,
+    "game": bench_game,
+}
+
+
+def measure(setup, run, inputs: int, rounds: int):
+    """
+    :param inputs: number of inputs, setup(0) to setup(inputs - 1)
+    :param rounds: runs of each input, setup is called again for every one
+    :return: median and total of the fastest seconds of each input, peak bytes allocated by one run
+    """
+    times = []
+    for i in range(inputs):
+        fastest = float("inf")
+        for _ in range(rounds):
+            arg = setup(i)
+            start = time.perf_counter()
+            run(arg)
+            fastest = min(fastest, time.perf_counter() - start)
+        times.append(fastest)
+
+    # Once more for the memory, tracemalloc slows everything down so it's not timed
+    arg = setup(0)
+    tracemalloc.start()
+    run(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), sum(times), peak
+
+
+def run_benchmarks(sizes, names, repeat: int, rounds: int):
+    """
+    :param repeat: inputs of each benchmark, full games use SIZES
+    :param rounds: runs of each input
+    :return: key: benchmark/size - value: median, total (seconds) and peak (bytes)
+    """
+    results = {}
+    for size in sizes:
+        width, height, mines, games = SIZES[size]
+        for name in names:
+            setup, run = BENCHMARKS[name](width, height, mines)
+            median, total, peak = measure(setup, run, games if name == "game" else repeat, rounds)
+            results["%s/%s" % (name, size)] = {"median": median, "total": total, "peak": peak}
+            print("%-28s median %10.3fms   total %10.3fms   peak %9.1fKiB" % (
+                "%s/%s" % (name, size), 1000 * median, 1000 * total, peak / 1024))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    :param tolerance: how much slower than the baseline is still fine, 0.2 is 20%
+    :return: the benchmarks that got slower than that
+    """
+    slower = []
+    print("\n%-28s %12s %12s %8s" % ("", "baseline", "now", "ratio"))
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["total"] / baseline[key]["total"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            slower.append(key)
+            flag = "  SLOWER"
+        print("%-28s %10.3fms %10.3fms %7.2fx%s" % (key, 1000 * baseline[key]["total"], 1000 * result["total"],
+                                                   ratio, flag))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the Board and AI hot paths")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=20, help="inputs of each benchmark, full games use SIZES")
+    parser.add_argument("--rounds", type=int, default=3, help="runs of each input, the fastest counts")
+    parser.add_argument("--save", type=str, default=None, help="write the results to this baseline file")
+    parser.add_argument("--compare", type=str, default=None, help="compare with this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="slowdown flagged by --compare, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.only, args.repeat, args.rounds)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "results": results},
+                      f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        slower = compare(results, baseline, args.tolerance)
+        if slower:
+            print("\nSlower than the baseline:", ", ".join(slower))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
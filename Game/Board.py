@@ -1,9 +1,171 @@
+import functools
 import random
+import threading
+
+import numpy as np
 from nguyenpanda.swan import Color
-import pygame
-from typing_extensions import Callable
+from typing_extensions import Callable, List
 import time
-# random.seed(5)
+
+
+def sample_mines(rng: random.Random, width: int, height: int, mines: int, first_click: tuple = None,
+                 safe_radius: int = 1):
+    """
+    Pick the mines of a board without replacement, so a dense board costs the same as a sparse one.
+    The cells kept clear around first_click are a square, the mines are drawn from the numbers of
+    the other cells in row-major order and each is moved past the square, so nothing the size of
+    the board is built
+    :param rng: the generator to draw from, the same state always gives the same mines
+    :param width: number of columns
+    :param height: number of rows
+    :param mines: number of mines
+    :param first_click: (row, col) of the first cell that will be opened, no mine within safe_radius of it
+    :param safe_radius: size of the square kept clear around first_click, 0 only keeps the cell itself clear
+    :return: the row-major indices of the mines
+    """
+    if first_click is None:
+        top = bottom = left = right = 0
+    else:
+        row, col = first_click
+        top, bottom = max(row - safe_radius, 0), min(row + safe_radius, height - 1) + 1
+        left, right = max(col - safe_radius, 0), min(col + safe_radius, width - 1) + 1
+    cleared = max(bottom - top, 0) * max(right - left, 0)
+    if mines > width * height - cleared:
+        raise ValueError("Cannot place %d mines on %d cells" % (mines, width * height - cleared))
+    if cleared == 0:
+        return rng.sample(range(width * height), mines)
+    # The other cells: the ones before the square's first row, then width - (right - left) on each
+    # of its rows, then the rest
+    first = top * width + left
+    gap = width - (right - left)
+    beside = gap * (bottom - top)
+    picked = []
+    for idx in rng.sample(range(width * height - cleared), mines):
+        if idx >= first:
+            if idx - first < beside:
+                idx += (right - left) * ((idx - first) // gap + 1)
+            else:
+                idx += cleared
+        picked.append(idx)
+    return picked
+
+
+def generate_boards(count: int, seed: int = 0, **kwargs):
+    """
+    Generate many reproducible boards, the i-th one is the same as Board(seed=seed + i, **kwargs)
+    :param count: number of boards
+    :param seed: seed of the first board
+    :param kwargs: passed on to Board, verbose is off unless asked for
+    :return: a generator of Board
+    """
+    kwargs.setdefault("verbose", False)
+    for i in range(count):
+        yield Board(seed=seed + i, **kwargs)
+
+
+@functools.lru_cache(maxsize=2)
+def neighbour_table(height: int, width: int):
+    """
+    For every cell of a height x width board, the row-major indices of its neighbours, in CSR form:
+    the neighbours of cell i = row * width + col are indices[indptr[i]:indptr[i + 1]]. Built once per
+    board shape with array passes, about 36 bytes a cell, so neighbour queries are a slice instead
+    of 8 bounds checks
+    :param height: number of rows
+    :param width: number of columns
+    :return: indptr, indices, both int32 arrays
+    """
+    rows, cols = np.divmod(np.arange(height * width, dtype=np.int32), np.int32(width))
+    offsets = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if not dx == dy == 0]
+    # (cells, 8): the neighbour in each direction, -1 off the board
+    neighbours = np.full((height * width, len(offsets)), -1, dtype=np.int32)
+    for k, (dx, dy) in enumerate(offsets):
+        inside = (rows + dx >= 0) & (rows + dx < height) & (cols + dy >= 0) & (cols + dy < width)
+        neighbours[inside, k] = (rows[inside] + dx) * width + cols[inside] + dy
+    inside = neighbours >= 0
+    indptr = np.zeros(height * width + 1, dtype=np.int32)
+    np.cumsum(np.count_nonzero(inside, axis=1), out=indptr[1:])
+    return indptr, neighbours[inside]
+
+
+def gather_neighbours(indptr: np.ndarray, indices: np.ndarray, idx: np.ndarray):
+    """
+    The neighbours of many cells at once from a neighbour table, see neighbour_table
+    :param indptr: the table's indptr
+    :param indices: the table's indices
+    :param idx: row-major indices of the cells
+    :return: int32 array, the neighbours of idx[0], then of idx[1], ..., a cell next to more
+        than one of them is there more than once
+    """
+    starts = indptr[idx]
+    counts = indptr[idx + 1] - starts
+    offsets = np.arange(int(counts.sum()), dtype=np.int32) - np.repeat(np.cumsum(counts) - counts, counts)
+    return indices[np.repeat(starts, counts) + offsets]
+
+
+def label_components(mask: np.ndarray):
+    """
+    Label the 8-connected groups of True cells of mask with array passes. Each row's runs of
+    True cells are numbered, runs that touch across two rows are joined, then the labels are
+    merged along those joins, each run taking the smallest label it's joined to, until none change
+    :param mask: (height, width) bool array
+    :return: (height, width) int32 array, -1 outside mask, the groups are numbered from 0 in
+        row-major order of their first cell
+    """
+    h, w = mask.shape
+    starts = mask.copy()
+    starts[:, 1:] &= ~mask[:, :-1]
+    run = np.cumsum(starts.reshape(-1), dtype=np.int32).reshape(h, w) - 1
+    runs = int(run[-1, -1]) + 1 if h * w else 0
+    if runs == 0:
+        return np.full((h, w), -1, dtype=np.int32)
+    # Pairs of runs that touch, straight down or diagonally
+    a, b = [], []
+    for upper, lower in (((slice(None), slice(None)), (slice(None), slice(None))),
+                         ((slice(None), slice(1, None)), (slice(None), slice(None, -1))),
+                         ((slice(None), slice(None, -1)), (slice(None), slice(1, None)))):
+        top, bottom = mask[:-1][upper], mask[1:][lower]
+        both = top & bottom
+        a.append(run[:-1][upper][both])
+        b.append(run[1:][lower][both])
+    a, b = np.concatenate(a), np.concatenate(b)
+    label = np.arange(runs, dtype=np.int32)
+    while len(a):
+        la, lb = label[a], label[b]
+        joined = la != lb
+        if not joined.any():
+            break
+        a, b, la, lb = a[joined], b[joined], la[joined], lb[joined]
+        low = np.minimum(la, lb)
+        np.minimum.at(label, la, low)
+        np.minimum.at(label, lb, low)
+        # Point every run straight at its group's smallest run
+        while True:
+            jumped = label[label]
+            if np.array_equal(jumped, label):
+                break
+            label = jumped
+    # Renumber the groups 0, 1, ... in order of their first run
+    roots = label == np.arange(runs, dtype=np.int32)
+    number = np.cumsum(roots, dtype=np.int32) - 1
+    return np.where(mask, number[label][run], -1).astype(np.int32)
+
+
+def neighbour_sum(grid: np.ndarray):
+    """
+    For every cell, the sum of grid over its (up to 8) neighbours, for the whole grid at once.
+    The 3x3 block around each cell is added up on a zero-padded copy, rows then columns, then the
+    cell itself is taken out
+    :param grid: (height, width) array, bool or small integers
+    :return: (height, width) uint8 array
+    """
+    h, w = grid.shape
+    # Faster than np.pad on board-sized grids
+    padded = np.zeros((h + 2, w + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = grid
+    rows = padded[:-2] + padded[1:-1] + padded[2:]
+    return rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:] - padded[1:-1, 1:-1]
+
+
 class Board:
     # @formatter:off
     # Board settings
@@ -22,46 +184,188 @@ class Board:
     # # @formatter: on
 
 
-    def __init__(self):
-        self.__board_width   = self.BOARD_WIDTH_S
-        self.__board_height  = self.BOARD_HEIGHT_S
-        self.__mines_counts = self.BOARD_MINES_S
-        self.__board_mines    = [[0] * self.__board_width for _ in range(self.__board_height)]
-        self.__board_freq     = [[0] * self.__board_width for _ in range(self.__board_height)]
+    def __init__(self, width: int = BOARD_WIDTH_S, height: int = BOARD_HEIGHT_S, mines: int = BOARD_MINES_S,
+                 seed: int = None, verbose: bool = True, first_click: tuple = None, safe_radius: int = 1):
+        """
+        :param width: number of columns
+        :param height: number of rows
+        :param mines: number of mines
+        :param seed: seed for the mine placement, the same seed always gives the same board
+        :param verbose: print the boards after generation
+        :param first_click: (row, col) of the first cell that will be opened, it's kept clear of mines
+        :param safe_radius: how far around first_click is kept clear, see sample_mines
+        """
+        self.__seed = seed
+        self.__rng = random.Random(seed)
+        self.__first_click = first_click
+        self.__safe_radius = safe_radius
+        self.__board_width   = width
+        self.__board_height  = height
+        self.__mines_counts = mines
+        # Every grid is a (height, width) uint8 array, index them with [row, col]
+        self.__board_mines    = np.zeros((self.__board_height, self.__board_width), dtype=np.uint8)
+        self.__board_freq     = np.zeros((self.__board_height, self.__board_width), dtype=np.uint8)
         # 0: Neutral; 1: Marked;  2: Opened
-        self.__board_state    = [[0] * self.__board_width for _ in range(self.__board_height)]
+        self.__board_state    = np.zeros((self.__board_height, self.__board_width), dtype=np.uint8)
+        # Shared by every board of the same shape, see neighbour_table
+        self.__neighbours = None
+        # For every cell, how many of its neighbours are hidden / flagged, kept up to date by set_state
+        self.__hidden_count = neighbour_sum(np.ones((self.__board_height, self.__board_width), dtype=np.uint8))
+        self.__flagged_count = np.zeros((self.__board_height, self.__board_width), dtype=np.uint8)
+        # Row-major views of the grids, for the flat indices of the neighbour queries, see __flatten
+        self.__flat = None
+        # Number of cells in each state (0: Neutral; 1: Marked;  2: Opened), kept up to date by set_state
+        self.__state_count = [self.__board_width * self.__board_height, 0, 0]
+        # Every cell whose state changed, in order, see changes_since. A snapshot only keeps its own
+        # changes and asks the board it was taken from for the ones before __journal_base
+        self.__journal = []
+        self.__journal_parent = None
+        self.__journal_base = 0
+        # Held while the board is copied by snapshot or changed by apply_actions
+        self.__lock = threading.RLock()
+        # Zero regions, see label_regions
+        self.__region_label = None
+        self.__regions = None
         self.fillBoard(self.__mines_counts)
         self.fillFrequency()
-        self.printBoards()
+        if verbose:
+            self.printBoards()
+
+    @classmethod
+    def restore(cls, mines: np.ndarray, state: np.ndarray = None, seed: int = None, first_click: tuple = None):
+        """
+        Rebuild a board from its mines and states, e.g. read back from a file (see Storage.py).
+        The restored board starts with an empty journal, as if it had just been generated
+        :param mines: (height, width) array, 1 where there is a mine
+        :param state: (height, width) array of states, every cell hidden if None
+        :param seed: the seed the board was generated from, only kept for get_seed
+        :param first_click: only kept for get_first_click
+        :return: Board
+        """
+        height, width = mines.shape
+        board = cls(width, height, 0, seed=seed, verbose=False)
+        board.__mines_counts = int(np.count_nonzero(mines))
+        board.__first_click = first_click
+        board.__board_mines[:] = mines
+        board.fillFrequency()
+        if state is not None:
+            flat = np.asarray(state).reshape(-1)
+            for s in (1, 2):
+                board.set_states(np.flatnonzero(flat == s), s)
+            board.__journal = []
+        return board
 
     def fillBoard(self, numMines: int):
-        mines_dict = {}
-        while len(mines_dict) < numMines:
-            idx = random.randint(0, self.__board_width * self.__board_height -1)
-            mines_dict[idx] = idx
-            row = idx // self.__board_width
-            col = idx % self.__board_width
-            self.__board_mines[row][col] = 1
+        mines = sample_mines(self.__rng, self.__board_width, self.__board_height, numMines,
+                             self.__first_click, self.__safe_radius)
+        self.__board_mines.reshape(-1)[mines] = 1
+
+    def place_mines(self, first_click: tuple):
+        """
+        Place the mines again with first_click kept clear, for a player whose first click isn't known
+        when the board is made. The mines are the ones Board(seed=seed, first_click=first_click) gets
+        :param first_click: (row, col) of the first cell that will be opened
+        :return: None
+        :raises ValueError: a cell has already been opened
+        """
+        if self.__state_count[2] > 0:
+            raise ValueError("The mines can only be placed before the first cell is opened")
+        self.__rng = random.Random(self.__seed)
+        self.__first_click = first_click
+        self.__board_mines[:] = 0
+        self.fillBoard(self.__mines_counts)
+        self.fillFrequency()
+        self.__region_label = None
+        self.__regions = None
 
     def fillFrequency(self):
-        for i in range(self.__board_height):
-            for j in range(self.__board_width):
-                neighbourList = self.getNeighbour(i, j)
-                for n_x, n_y in neighbourList:
-                    if self.__board_mines[n_x][n_y]:
-                        self.__board_freq[i][j] += 1
+        """
+        The frequency of a cell is the number of mines around it, see neighbour_sum
+        :return: None
+        """
+        self.__board_freq = neighbour_sum(self.__board_mines)
+        self.__flatten()
+
+    def __flatten(self):
+        """
+        Refresh the row-major views, whenever one of the grids is replaced
+        """
+        self.__flat = (self.__board_state.reshape(-1), self.__board_freq.reshape(-1),
+                       self.__hidden_count.reshape(-1), self.__flagged_count.reshape(-1))
 
     def getNeighbour(self, row: int, col: int, func: Callable = None):
-        dX = [-1, 0, 1]
-        dY = [-1, 0, 1]
-        neighbourList = []
-        for dx in dX:
-            for dy in dY:
-                if dx == dy == 0: continue
-                if self.inBoard(row + dx, col + dy):
-                    neighbourList.append((row + dx, col + dy))
+        width = self.__board_width
+        return [divmod(n, width) for n in self.__adjacency(row, col)]
+
+    def neighbourhood(self, cells: List):
+        """
+        The cells and all their neighbours, each once, in the order a loop over cells and then
+        getNeighbour of each would first reach them. Gathered from the neighbour table at once
+        :param cells: list of (row, col)
+        :return: list of (row, col)
+        """
+        width = self.__board_width
+        # The array passes cost more than they save on the few cells of a usual turn
+        if len(cells) < 32:
+            touched = {}
+            for row, col in cells:
+                touched[row * width + col] = None
+                for n in self.__adjacency(row, col):
+                    touched[n] = None
+            return [divmod(n, width) for n in touched]
+        if self.__neighbours is None:
+            self.__neighbours = neighbour_table(self.__board_height, width)
+        indptr, indices = self.__neighbours
+        rows, cols = np.array(cells, dtype=np.int32).T
+        idx = rows * width + cols
+        counts = indptr[idx + 1] - indptr[idx]
+        # Each cell followed by its neighbours
+        sizes = counts + 1
+        firsts = np.cumsum(sizes) - sizes
+        gathered = np.empty(int(sizes.sum()), dtype=np.int32)
+        gathered[firsts] = idx
+        others = np.ones(len(gathered), dtype=bool)
+        others[firsts] = False
+        gathered[others] = gather_neighbours(indptr, indices, idx)
+        _, first = np.unique(gathered, return_index=True)
+        return [divmod(n, width) for n in gathered[np.sort(first)].tolist()]
+
+    def neighbour_counts(self, indices: np.ndarray):
+        """
+        hidden_neighbour_count and flagged_neighbour_count of many cells at once
+        :param indices: row-major indices
+        :return: two uint8 arrays, in the order of indices
+        """
+        hidden, flagged = self.__flat[2:]
+        return hidden[indices], flagged[indices]
 
-        return neighbourList
+    def hidden_around(self, indices: np.ndarray):
+        """
+        The hidden neighbours of many cells at once, through the neighbour table
+        :param indices: row-major indices
+        :return: row-major indices, each once, sorted
+        """
+        if self.__neighbours is None:
+            self.__neighbours = neighbour_table(self.__board_height, self.__board_width)
+        around = gather_neighbours(*self.__neighbours, indices)
+        return np.unique(around[self.__flat[0][around] == 0])
+
+    def frontier_masks(self, indices: np.ndarray):
+        """
+        For many cells at once, whether each is a number with a hidden neighbour and whether
+        it's a hidden cell next to an opened number, from the counters and the neighbour table
+        :param indices: row-major indices
+        :return: two bool arrays, in the order of indices
+        """
+        if self.__neighbours is None:
+            self.__neighbours = neighbour_table(self.__board_height, self.__board_width)
+        indptr, table = self.__neighbours
+        state, freq, hidden, _ = self.__flat
+        numbers = (state[indices] == 2) & (freq[indices] > 0)
+        around = gather_neighbours(indptr, table, indices)
+        owner = np.repeat(np.arange(len(indices)), indptr[indices + 1] - indptr[indices])
+        numbered = np.bincount(owner, (state[around] == 2) & (freq[around] > 0), minlength=len(indices))
+        return numbers & (hidden[indices] > 0), (state[indices] == 0) & (numbered > 0)
 
     def get_hidden_neighbour(self, row: int, col: int):
         """
@@ -70,104 +374,293 @@ class Board:
         :param col:
         :return:
         """
-        dX = [-1, 0, 1]
-        dY = [-1, 0, 1]
-        neighbourList = []
-        for dx in dX:
-            for dy in dY:
-                if dx == dy == 0: continue
-                if self.inBoard(row + dx, col + dy) and self.__board_state[row + dx][col + dy] == 0:
-                    neighbourList.append((row + dx, col + dy))
-
-        return neighbourList
+        width = self.__board_width
+        state = self.__flat[0]
+        return [divmod(n, width) for n in self.__adjacency(row, col) if state[n] == 0]
 
     def get_flagged_neighbour(self, row: int, col: int):
         """
-        Return the neighbours that are not marked or opened
+        Return the neighbours that are marked
         :param row:
         :param col:
         :return:
         """
-        dX = [-1, 0, 1]
-        dY = [-1, 0, 1]
-        neighbourList = []
-        for dx in dX:
-            for dy in dY:
-                if dx == dy == 0: continue
-                if self.inBoard(row + dx, col + dy) and self.__board_state[row + dx][col + dy] == 1:
-                    neighbourList.append((row + dx, col + dy))
-
-        return neighbourList
-
-    def get_friendly_neighbours(self, row: int, col: int):
-        dX = [-1, 0, 1]
-        dY = [-1, 0, 1]
-        neighbourList = []
-        for dx in dX:
-            for dy in dY:
-                if dx == dy == 0: continue
-                if self.__board_freq[row][col] > 0: break
-                if self.inBoard(row + dx, col + dy) and self.__board_mines[row+dx][col+dy] != 1:
-                    neighbourList.append((row + dx, col + dy))
-
-        return neighbourList
+        width = self.__board_width
+        state = self.__flat[0]
+        return [divmod(n, width) for n in self.__adjacency(row, col) if state[n] == 1]
 
     def get_frequency_neighbours(self, row:int, col: int):
-        dX = [-1, 0, 1]
-        dY = [-1, 0, 1]
-        neighbourList = []
-        for dx in dX:
-            for dy in dY:
-                if dx == dy == 0: continue
-                if (self.inBoard(row + dx, col + dy) and self.__board_freq[row+dx][col+dy] > 0 and
-                    self.__board_state[row + dx][col + dy] == 2):
-                    neighbourList.append((row + dx, col + dy))
-
-        return neighbourList
+        """
+        Return the opened neighbours that show a number
+        """
+        width = self.__board_width
+        state, freq = self.__flat[:2]
+        return [divmod(n, width) for n in self.__adjacency(row, col) if freq[n] > 0 and state[n] == 2]
 
     def solved_cell(self, row: int, col: int):
         """
         A solve cells is a cell that has all of it's neighbour opened and marked
         :return:
         """
-        dX = [-1, 0, 1]
-        dY = [-1, 0, 1]
-        neighbourList = []
-        counter = 0
-        for dx in dX:
-            for dy in dY:
-                if dx == dy == 0: continue
-                if self.inBoard(row + dx, col + dy):
-                    if self.__board_state[row + dx][col + dy] == 0:
-                        return False
-
-        return True
+        return self.__hidden_count[row, col] == 0
+
+    def hidden_neighbour_count(self, row: int, col: int):
+        """
+        Same as len(get_hidden_neighbour(row, col)) without building the list
+        """
+        return int(self.__hidden_count[row, col])
+
+    def flagged_neighbour_count(self, row: int, col: int):
+        """
+        Same as len(get_flagged_neighbour(row, col)) without building the list
+        """
+        return int(self.__flagged_count[row, col])
+
+    def set_state(self, row: int, col: int, state: int):
+        """
+        Change the state of a cell, every change of state has to go through here so the
+        neighbour counters stay correct
+        :param row: row
+        :param col: column
+        :param state: 0: Neutral; 1: Marked;  2: Opened
+        :return: None
+        """
+        old = self.__board_state[row, col]
+        if old == state:
+            return
+        self.__board_state[row, col] = state
+        self.__journal.append((row, col))
+        self.__state_count[old] -= 1
+        self.__state_count[state] += 1
+        neighbours = self.__adjacency(row, col)
+        hidden, flagged = self.__flat[2:]
+        if old == 0:
+            for n in neighbours:
+                hidden[n] -= 1
+        elif old == 1:
+            for n in neighbours:
+                flagged[n] -= 1
+        if state == 0:
+            for n in neighbours:
+                hidden[n] += 1
+        elif state == 1:
+            for n in neighbours:
+                flagged[n] += 1
+
+    def set_states(self, indices: np.ndarray, state: int):
+        """
+        set_state for many cells at once, with array passes over the grids and the neighbour
+        table instead of one call per cell
+        :param indices: row-major indices of the cells, each once
+        :param state: 0: Neutral; 1: Marked;  2: Opened
+        :return: the cells that changed, as (row, col), in the order of indices
+        """
+        flat_state, _, hidden, flagged = self.__flat
+        indices = indices[flat_state[indices] != state]
+        if len(indices) == 0:
+            return []
+        old = flat_state[indices]
+        flat_state[indices] = state
+        for before, count in enumerate(np.bincount(old, minlength=3).tolist()):
+            self.__state_count[before] -= count
+        self.__state_count[state] += len(indices)
+        for before, counter in ((0, hidden), (1, flagged)):
+            leaving = indices[old == before]
+            if len(leaving):
+                self.__count_neighbours(counter, leaving, np.subtract)
+        if state in (0, 1):
+            self.__count_neighbours((hidden, flagged)[state], indices, np.add)
+        rows, cols = np.divmod(indices, self.__board_width)
+        changed = list(zip(rows.tolist(), cols.tolist()))
+        self.__journal.extend(changed)
+        return changed
+
+    def __count_neighbours(self, counter: np.ndarray, indices: np.ndarray, ufunc):
+        """
+        Add (np.add) or take (np.subtract) one from counter at every neighbour of every cell of
+        indices. Through the neighbour table for a few cells, with neighbour_sum over the grid for many
+        :param counter: row-major view of a counter grid
+        :param indices: row-major indices, each once
+        :return: None
+        """
+        h, w = self.__board_height, self.__board_width
+        if len(indices) > h * w // 64:
+            marked = np.zeros(h * w, dtype=np.uint8)
+            marked[indices] = 1
+            ufunc(counter, neighbour_sum(marked.reshape(h, w)).reshape(-1), out=counter)
+            return
+        if self.__neighbours is None:
+            self.__neighbours = neighbour_table(h, w)
+        ufunc.at(counter, gather_neighbours(*self.__neighbours, indices), 1)
+
+    def __adjacency(self, row: int, col: int):
+        """
+        The row-major indices of the neighbours of (row, col), see neighbour_table. The table of
+        this board's shape is only built the first time a border cell's neighbours are asked for,
+        the others are at fixed flat offsets. Callers index the grids' flat views with them and
+        only turn the ones they return into (row, col)
+        :return: list of int, in the table's order
+        """
+        width = self.__board_width
+        idx = row * width + col
+        if 0 < row < self.__board_height - 1 and 0 < col < width - 1:
+            return [idx - width - 1, idx - width, idx - width + 1, idx - 1, idx + 1,
+                    idx + width - 1, idx + width, idx + width + 1]
+        if self.__neighbours is None:
+            self.__neighbours = neighbour_table(self.__board_height, width)
+        indptr, indices = self.__neighbours
+        start, end = indptr[idx:idx + 2].tolist()
+        return indices[start:end].tolist()
+
+    def get_version(self):
+        """
+        The number of state changes so far, pass it to changes_since later to get what changed after this point
+        """
+        return self.__journal_base + len(self.__journal)
+
+    def changes_since(self, version: int):
+        """
+        The cells whose state changed after get_version() returned version, a cell that
+        changed more than once is listed more than once
+        :param version: a value returned by get_version
+        :return: list of (row, col)
+        """
+        if version >= self.__journal_base:
+            return self.__journal[version - self.__journal_base:]
+        before = self.__journal_parent.changes_since(version)[:self.__journal_base - version]
+        return before + self.__journal
+
+    def snapshot(self):
+        """
+        A private copy of this board for a solver to work on. The mines, frequencies and
+        neighbour tables are shared, the states and counters are copied, so changes on either
+        side are never seen by the other
+        :return: Board
+        """
+        with self.__lock:
+            copy = object.__new__(Board)
+            copy.__dict__.update(self.__dict__)
+            copy.__board_state = self.__board_state.copy()
+            copy.__hidden_count = self.__hidden_count.copy()
+            copy.__flagged_count = self.__flagged_count.copy()
+            copy.__flatten()
+            copy.__state_count = list(self.__state_count)
+            copy.__journal = []
+            copy.__journal_parent = self
+            copy.__journal_base = self.get_version()
+            copy.__lock = threading.RLock()
+        return copy
+
+    def apply_actions(self, flags: List, opens: List):
+        """
+        Apply a solver's turn in one go, nobody else can snapshot or apply in between
+        :param flags: cells to flag
+        :param opens: cells to open, in order, stopping at the first mine
+        :return: the cells that were opened, whether a mine was opened
+        """
+        with self.__lock:
+            for row, col in flags:
+                if self.__board_state[row, col] == 0:
+                    self.set_state(row, col, 1)
+            opened = []
+            for row, col in opens:
+                opened += self.open_cell(row, col)
+                if self.__board_mines[row, col] == 1:
+                    return opened, True
+            return opened, False
+
+    def open_cell(self, row: int, col: int):
+        """
+        Open a cell, if it's an empty cell (no mine and no mine around it) its whole
+        zero region is opened with it, the same cells a BFS from it would reach
+        :param row: row
+        :param col: column
+        :return: the cells that were opened by this call, (row, col) first
+        """
+        if self.__board_state[row, col] == 2:
+            return []
+        self.set_state(row, col, 2)
+        opened = [(row, col)]
+        if self.__board_mines[row, col] == 1 or self.__board_freq[row, col] > 0:
+            return opened
+
+        if self.__regions is None:
+            self.label_regions()
+        indptr, cells = self.__regions
+        label = self.__region_label[row, col]
+        return opened + self.set_states(cells[indptr[label]:indptr[label + 1]], 2)
+
+    def label_regions(self):
+        """
+        Label the connected groups of empty cells, see label_components. A region holds its empty
+        cells and the numbered cells around them, which is everything that opens when one of them
+        is clicked, as row-major indices in CSR form like neighbour_table. Done once per board,
+        on the first empty cell that gets opened
+        :return: None
+        """
+        h, w = self.__board_height, self.__board_width
+        empty = (self.__board_freq == 0) & (self.__board_mines == 0)
+        label = label_components(empty)
+        inside = np.flatnonzero(empty)
+        # The border: the other cells next to an empty one, with the labels around them, each
+        # once, a border cell next to two regions is in both
+        border = np.flatnonzero(~empty & (neighbour_sum(empty) > 0))
+        padded = np.full((h + 2, w + 2), -1, dtype=np.int32)
+        padded[1:-1, 1:-1] = label
+        rows, cols = np.divmod(border, w)
+        at = (rows + 1) * (w + 2) + cols + 1
+        offsets = np.array([dx * (w + 2) + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1) if not dx == dy == 0])
+        around = np.sort(padded.reshape(-1)[at[None, :] + offsets[:, None]], axis=0)
+        keep = around >= 0
+        keep[1:] &= around[1:] != around[:-1]
+        regions = np.concatenate((label.reshape(-1)[inside], around[keep]))
+        members = np.concatenate((inside, np.broadcast_to(border, around.shape)[keep]))
+        order = np.argsort(regions, kind="stable")
+        region_ptr = np.zeros(int(label.max(initial=-1)) + 2, dtype=np.int64)
+        np.cumsum(np.bincount(regions, minlength=len(region_ptr) - 1), out=region_ptr[1:])
+        members = members[order]
+        self.__region_label = label
+        self.__regions = (region_ptr, members.astype(np.int32))
+
+    def known_cells(self):
+        """
+        The flagged and opened cells
+        :return: list of (row, col)
+        """
+        return [(row, col) for row, col in np.argwhere(self.__board_state != 0).tolist()]
+
+    def interior_mask(self, exclude):
+        """
+        The hidden cells that are not in exclude, for the whole grid at once
+        :param exclude: cells to leave out, e.g. the AI's edge cells
+        :return: (height, width) bool array
+        """
+        excluded = np.zeros((self.__board_height, self.__board_width), dtype=bool)
+        if exclude:
+            rows, cols = np.array(list(exclude), dtype=np.intp).T
+            excluded[rows, cols] = True
+        return (self.__board_state == 0) & ~excluded
+
     def inBoard(self, row: int, col:int):
         return 0 <= row < self.__board_height and 0 <= col < self.__board_width
 
 
     def winning_check(self):
         safeCells: int = self.__board_width * self.__board_height - self.__mines_counts
-        count: int = 0
-        # Count opended space
-        for r in range(self.__board_height):
-            for c in range(self.__board_width):
-                if self.__board_state[r][c] == 2:
-                    count += 1
-        return safeCells == count
+        return safeCells == self.__state_count[2]
     def printBoards(self):
         print(Color["y"])
         print(Color["y"] + "="*30)
-        for row in self.__board_mines:
+        for row in self.__board_mines.tolist():
             print(row)
 
         print(Color["r"] + "="*30)
         print(Color["r"])
-        for row in self.__board_freq:
+        for row in self.__board_freq.tolist():
             print(row)
         print(Color["g"] + "="*30)
         print(Color["g"])
-        for row in self.__board_state:
+        for row in self.__board_state.tolist():
             print(row)
     def get_board_mines(self):
         return self.__board_mines
@@ -176,9 +669,27 @@ class Board:
         return self.__board_freq
 
     def get_board_state(self):
+        """
+        Read only, use set_state to change a cell
+        """
         return self.__board_state
 
+    def get_hidden_count(self):
+        return self.__state_count[0]
+
+    def get_flagged_count(self):
+        return self.__state_count[1]
+
+    def get_opened_count(self):
+        return self.__state_count[2]
+
     def get_mines_count(self):
         return self.__mines_counts
     def get_board_shape(self):
         return self.__board_height, self.__board_width
+
+    def get_seed(self):
+        return self.__seed
+
+    def get_first_click(self):
+        return self.__first_click
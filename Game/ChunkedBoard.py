@@ -0,0 +1,438 @@
+"""
+A board made of square chunks that are only created when one of their cells is first looked
+at, for fields far too big to allocate (100k x 100k) or with no end at all.
+
+The mines of a chunk come from its own generator, seeded with (seed, chunk row, chunk column),
+so any chunk can be generated on its own and always comes out the same. Every cell is a mine
+with the same chance (density), the number of mines is not known up front.
+A chunk's frequencies need the mines just across its border, so creating a chunk generates
+(only) the mines of the 8 chunks around it. Memory grows with the area that was explored.
+
+Rows and columns start at 0, width and height are None for a field with no end.
+ChunkedBoard has the same cell-level methods as Board, the AI plays on either.
+
+    cd Game
+    python ChunkedBoard.py --turns 100 --budget 0.1
+"""
+import argparse
+import random
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+from typing_extensions import List
+
+CHUNK_SIZE = 64
+
+
+class Chunk:
+    """
+    One square of the board, every array is indexed [row, col] from the chunk's top left cell.
+    The mines and frequencies never change and are shared between a board and its snapshots
+    """
+    __slots__ = ("mines", "freq", "state", "hidden_count", "flagged_count")
+
+    def copy(self):
+        chunk = Chunk()
+        chunk.mines = self.mines
+        chunk.freq = self.freq
+        chunk.state = self.state.copy()
+        chunk.hidden_count = self.hidden_count.copy()
+        chunk.flagged_count = self.flagged_count.copy()
+        return chunk
+
+
+class ChunkGrid:
+    """
+    Read-only stand-in for one of Board's grids, grid[row, col] like the numpy array
+    """
+    def __init__(self, board, field: str):
+        self.__board = board
+        self.__field = field
+
+    def __getitem__(self, cell):
+        chunk, r, c = self.__board.locate(cell[0], cell[1])
+        return getattr(chunk, self.__field)[r, c]
+
+
+class ChunkedBoard:
+    def __init__(self, width: int = None, height: int = None, density: float = 0.2, seed: int = None,
+                 chunk_size: int = CHUNK_SIZE, first_click: tuple = None, safe_radius: int = 1):
+        """
+        :param width: number of columns, None for no end
+        :param height: number of rows, None for no end
+        :param density: the chance of each cell to be a mine
+        :param seed: seed for the mines, a random one is picked (see get_seed) if None
+        :param chunk_size: side of a chunk
+        :param first_click: (row, col) of the first cell that will be opened, it's kept clear of mines
+        :param safe_radius: how far around first_click is kept clear
+        """
+        self.__seed = seed if seed is not None else random.randrange(2 ** 63)
+        self.__board_width = width
+        self.__board_height = height
+        self.__density = density
+        self.__chunk_size = chunk_size
+        self.__first_click = first_click
+        self.__safe_radius = safe_radius
+        # key: (chunk row, chunk column) - value: its mines, shared with the snapshots
+        self.__mines = {}
+        self.__no_mines = np.zeros((chunk_size, chunk_size), dtype=np.uint8)
+        # key: (chunk row, chunk column) - value: Chunk
+        self.__chunks = {}
+        # The chunks this board may change in place, the others are shared with a snapshot and copied first
+        self.__owned = {}
+        # Number of cells in each state (0: Neutral; 1: Marked;  2: Opened), only 1 and 2 are kept up to date
+        self.__state_count = [0, 0, 0]
+        # Same as Board, see changes_since
+        self.__journal = []
+        self.__journal_parent = None
+        self.__journal_base = 0
+        self.__lock = threading.RLock()
+
+    def inBoard(self, row: int, col: int):
+        return 0 <= row and 0 <= col and (self.__board_height is None or row < self.__board_height) and \
+            (self.__board_width is None or col < self.__board_width)
+
+    def mines_of(self, chunk_row: int, chunk_col: int):
+        """
+        The mines of a chunk, generated the first time they're asked for
+        """
+        key = (chunk_row, chunk_col)
+        mines = self.__mines.get(key)
+        if mines is not None:
+            return mines
+        size = self.__chunk_size
+        top, left = chunk_row * size, chunk_col * size
+        if top < 0 or left < 0 or not self.inBoard(top, left):
+            return self.__no_mines
+
+        rng = np.random.default_rng([self.__seed & 0xFFFFFFFFFFFFFFFF, chunk_row, chunk_col])
+        mines = (rng.random((size, size)) < self.__density).astype(np.uint8)
+        if self.__board_height is not None:
+            mines[max(0, self.__board_height - top):, :] = 0
+        if self.__board_width is not None:
+            mines[:, max(0, self.__board_width - left):] = 0
+        if self.__first_click is not None:
+            row, col = self.__first_click
+            radius = self.__safe_radius
+            mines[max(0, row - radius - top):max(0, row + radius + 1 - top),
+                  max(0, col - radius - left):max(0, col + radius + 1 - left)] = 0
+        self.__mines[key] = mines
+        return mines
+
+    def chunk(self, chunk_row: int, chunk_col: int):
+        """
+        The chunk, created the first time it's asked for. No cell around a new chunk has
+        changed state yet (set_state touches the chunks around a cell), so every neighbour
+        is hidden and every count starts from the board's edges alone
+        """
+        key = (chunk_row, chunk_col)
+        chunk = self.__chunks.get(key)
+        if chunk is not None:
+            return chunk
+        size = self.__chunk_size
+        top, left = chunk_row * size, chunk_col * size
+        # The mines of the 3x3 chunks around it, cut down to one cell past its border
+        around = np.block([[self.mines_of(chunk_row + dr, chunk_col + dc) for dc in (-1, 0, 1)] for dr in (-1, 0, 1)])
+        padded = around[size - 1:2 * size + 1, size - 1:2 * size + 1]
+        rows = np.arange(top - 1, top + size + 1)
+        cols = np.arange(left - 1, left + size + 1)
+        inside = ((rows >= 0) & (rows < (self.__board_height or rows[-1] + 1)))[:, None] & \
+                 ((cols >= 0) & (cols < (self.__board_width or cols[-1] + 1)))[None, :]
+        inside = inside.astype(np.uint8)
+
+        chunk = Chunk()
+        chunk.mines = padded[1:-1, 1:-1].copy()
+        chunk.freq = np.zeros((size, size), dtype=np.uint8)
+        chunk.hidden_count = np.zeros((size, size), dtype=np.uint8)
+        for dr in range(3):
+            for dc in range(3):
+                chunk.freq += padded[dr:dr + size, dc:dc + size]
+                chunk.hidden_count += inside[dr:dr + size, dc:dc + size]
+        chunk.freq -= chunk.mines
+        chunk.hidden_count -= inside[1:-1, 1:-1]
+        chunk.state = np.zeros((size, size), dtype=np.uint8)
+        chunk.flagged_count = np.zeros((size, size), dtype=np.uint8)
+        self.__chunks[key] = chunk
+        self.__owned[key] = key
+        return chunk
+
+    def locate(self, row: int, col: int):
+        """
+        :return: the cell's chunk, the cell's row and column in it
+        """
+        size = self.__chunk_size
+        return self.chunk(row // size, col // size), row % size, col % size
+
+    def __writable(self, row: int, col: int):
+        """
+        Same as locate, the chunk is copied first if it's shared with a snapshot
+        """
+        size = self.__chunk_size
+        key = (row // size, col // size)
+        chunk = self.chunk(*key)
+        if key not in self.__owned:
+            chunk = self.__chunks[key] = chunk.copy()
+            self.__owned[key] = key
+        return chunk, row % size, col % size
+
+    def getNeighbour(self, row: int, col: int, func=None):
+        return [(row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+                if not dr == dc == 0 and self.inBoard(row + dr, col + dc)]
+
+    def neighbourhood(self, cells: List):
+        """
+        See Board.neighbourhood
+        """
+        touched = {}
+        for cell in cells:
+            touched[cell] = cell
+            for n in self.getNeighbour(cell[0], cell[1]):
+                touched[n] = n
+        return list(touched)
+
+    def get_state(self, row: int, col: int):
+        chunk, r, c = self.locate(row, col)
+        return chunk.state[r, c]
+
+    def get_hidden_neighbour(self, row: int, col: int):
+        return [n for n in self.getNeighbour(row, col) if self.get_state(*n) == 0]
+
+    def get_flagged_neighbour(self, row: int, col: int):
+        return [n for n in self.getNeighbour(row, col) if self.get_state(*n) == 1]
+
+    def get_frequency_neighbours(self, row: int, col: int):
+        result = []
+        for n in self.getNeighbour(row, col):
+            chunk, r, c = self.locate(*n)
+            if chunk.freq[r, c] > 0 and chunk.state[r, c] == 2:
+                result.append(n)
+        return result
+
+    def solved_cell(self, row: int, col: int):
+        chunk, r, c = self.locate(row, col)
+        return chunk.hidden_count[r, c] == 0
+
+    def hidden_neighbour_count(self, row: int, col: int):
+        chunk, r, c = self.locate(row, col)
+        return int(chunk.hidden_count[r, c])
+
+    def flagged_neighbour_count(self, row: int, col: int):
+        chunk, r, c = self.locate(row, col)
+        return int(chunk.flagged_count[r, c])
+
+    def set_state(self, row: int, col: int, state: int):
+        """
+        Same as Board.set_state
+        """
+        chunk, r, c = self.__writable(row, col)
+        old = chunk.state[r, c]
+        if old == state:
+            return
+        chunk.state[r, c] = state
+        self.__journal.append((row, col))
+        self.__state_count[old] -= 1
+        self.__state_count[state] += 1
+        for n_row, n_col in self.getNeighbour(row, col):
+            n_chunk, n_r, n_c = self.__writable(n_row, n_col)
+            if old == 0:
+                n_chunk.hidden_count[n_r, n_c] -= 1
+            elif old == 1:
+                n_chunk.flagged_count[n_r, n_c] -= 1
+            if state == 0:
+                n_chunk.hidden_count[n_r, n_c] += 1
+            elif state == 1:
+                n_chunk.flagged_count[n_r, n_c] += 1
+
+    def get_version(self):
+        return self.__journal_base + len(self.__journal)
+
+    def changes_since(self, version: int):
+        """
+        Same as Board.changes_since
+        """
+        if version >= self.__journal_base:
+            return self.__journal[version - self.__journal_base:]
+        before = self.__journal_parent.changes_since(version)[:self.__journal_base - version]
+        return before + self.__journal
+
+    def snapshot(self):
+        """
+        Same as Board.snapshot, the chunks are shared until either side changes one
+        :return: ChunkedBoard
+        """
+        with self.__lock:
+            copy = object.__new__(ChunkedBoard)
+            copy.__dict__.update(self.__dict__)
+            copy.__chunks = dict(self.__chunks)
+            copy.__owned = {}
+            self.__owned = {}
+            copy.__state_count = list(self.__state_count)
+            copy.__journal = []
+            copy.__journal_parent = self
+            copy.__journal_base = self.get_version()
+            copy.__lock = threading.RLock()
+        return copy
+
+    def apply_actions(self, flags: List, opens: List):
+        """
+        Same as Board.apply_actions
+        """
+        with self.__lock:
+            for row, col in flags:
+                if self.get_state(row, col) == 0:
+                    self.set_state(row, col, 1)
+            opened = []
+            for row, col in opens:
+                opened += self.open_cell(row, col)
+                if self.get_board_mines()[row, col] == 1:
+                    return opened, True
+            return opened, False
+
+    def open_cell(self, row: int, col: int):
+        """
+        Same as Board.open_cell, the empty region is found with a BFS as there's no labelling the whole board
+        """
+        chunk, r, c = self.locate(row, col)
+        if chunk.state[r, c] == 2:
+            return []
+        self.set_state(row, col, 2)
+        opened = [(row, col)]
+        if chunk.mines[r, c] == 1 or chunk.freq[r, c] > 0:
+            return opened
+
+        queue = deque([(row, col)])
+        while queue:
+            cell = queue.popleft()
+            for n in self.getNeighbour(cell[0], cell[1]):
+                n_chunk, n_r, n_c = self.locate(*n)
+                if n_chunk.state[n_r, n_c] != 2:
+                    self.set_state(n[0], n[1], 2)
+                    opened.append(n)
+                    if n_chunk.freq[n_r, n_c] == 0:
+                        queue.append(n)
+        return opened
+
+    def known_cells(self):
+        """
+        The flagged and opened cells, see Board.known_cells
+        """
+        size = self.__chunk_size
+        cells = []
+        for (chunk_row, chunk_col), chunk in self.__chunks.items():
+            for r, c in np.argwhere(chunk.state != 0).tolist():
+                cells.append((chunk_row * size + r, chunk_col * size + c))
+        return cells
+
+    def interior_cells(self, exclude):
+        """
+        Hidden cells of the chunks created so far that are not in exclude, lazily, see Board.interior_mask
+        """
+        size = self.__chunk_size
+        for (chunk_row, chunk_col), chunk in list(self.__chunks.items()):
+            for r, c in np.argwhere(chunk.state == 0).tolist():
+                cell = (chunk_row * size + r, chunk_col * size + c)
+                if cell not in exclude and self.inBoard(*cell):
+                    yield cell
+
+    def winning_check(self):
+        """
+        A field with no end is never cleared. A bounded one can only be once every chunk has
+        been created, only then are its mines counted
+        """
+        if self.__board_width is None or self.__board_height is None:
+            return False
+        size = self.__chunk_size
+        chunks = -(-self.__board_height // size) * -(-self.__board_width // size)
+        if len(self.__chunks) < chunks:
+            return False
+        mines = sum(int(chunk.mines.sum()) for chunk in self.__chunks.values())
+        return self.__board_width * self.__board_height - mines == self.__state_count[2]
+
+    def get_board_mines(self):
+        return ChunkGrid(self, "mines")
+
+    def get_board_freq(self):
+        return ChunkGrid(self, "freq")
+
+    def get_board_state(self):
+        """
+        Read only, use set_state to change a cell
+        """
+        return ChunkGrid(self, "state")
+
+    def get_hidden_count(self):
+        """
+        None for a field with no end
+        """
+        if self.__board_width is None or self.__board_height is None:
+            return None
+        return self.__board_width * self.__board_height - self.__state_count[1] - self.__state_count[2]
+
+    def get_flagged_count(self):
+        return self.__state_count[1]
+
+    def get_opened_count(self):
+        return self.__state_count[2]
+
+    def get_mines_count(self):
+        """
+        Not known up front, see get_density
+        """
+        return None
+
+    def get_density(self):
+        return self.__density
+
+    def get_board_shape(self):
+        return self.__board_height, self.__board_width
+
+    def get_seed(self):
+        return self.__seed
+
+    def get_first_click(self):
+        return self.__first_click
+
+    def get_chunk_count(self):
+        return len(self.__chunks)
+
+
+def main():
+    from AI import AI
+
+    parser = argparse.ArgumentParser(description="Let the AI play on a chunked board")
+    parser.add_argument("--width", type=int, default=None, help="number of columns, no end if left out")
+    parser.add_argument("--height", type=int, default=None, help="number of rows, no end if left out")
+    parser.add_argument("--density", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--budget", type=float, default=None, help="seconds each move may take, no limit by default")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    board = ChunkedBoard(args.width, args.height, args.density, args.seed, first_click=AI.FIRST_MOVE)
+    ai = AI(board, verbose=False, budget=args.budget)
+    outcome = "stopped"
+    turns = 0
+    while turns < args.turns:
+        moves = ai.make_move()
+        turns += 1
+        if len(moves) == 0:
+            outcome = "won" if board.winning_check() else "stuck"
+            break
+        if board.apply_actions(moves.flags, moves.opens)[1]:
+            outcome = "lost"
+            break
+    elapsed = time.perf_counter() - start
+    print("Outcome:     ", outcome, "after", turns, "turns")
+    print("Opened:      ", board.get_opened_count(), "- flagged:", board.get_flagged_count())
+    print("Chunks:      ", board.get_chunk_count())
+    print("Time:         %.2fs" % elapsed)
+    print("Peak memory:  %.1fMiB" % (tracemalloc.get_traced_memory()[1] / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
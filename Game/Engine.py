@@ -1,13 +1,17 @@
+import os
+import queue
 import threading
-from collections import deque
 
 import pygame
 import time
 
-from typing_extensions import List
 
 from Board import Board
-from AI import AI
+from AI import AI, ActionBatch
+from Replay import GameRecorder
+from Metrics import JsonLinesSink
+from Patterns import load_table
+from Renderer import Renderer, WHITE, RED, DARK_GREY
 
 
 
@@ -15,58 +19,29 @@ from AI import AI
 TILE_SIZE = 40
 BOARD_MARGIN = 10
 TOP_WINDOW_HEIGHT = 60
-WIDTH = Board.BOARD_WIDTH_S * TILE_SIZE + 2 * BOARD_MARGIN
-HEIGHT = Board.BOARD_HEIGHT_S * TILE_SIZE + 2 * BOARD_MARGIN + TOP_WINDOW_HEIGHT
-SCREEN_SIZE = (WIDTH, HEIGHT)
+# Frames drawn per second at most
+FPS = 30
+
+# Use AI?
+USE_AI: bool = True
+
+# Create a Board instance, the AI's first move is kept clear of mines. A player's mines are
+# placed again on their first left click, see Board.place_mines
+board = Board(first_click=AI.FIRST_MOVE if USE_AI else None)
 
-# Colors
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-GREY = (77, 84, 91)
-RED = (255, 0, 0)
-YELLOW = (255, 255, 0)
-# Additional colors
-BLUE = (0, 0, 255)
-GREEN = (0, 255, 0)
-CYAN = (0, 255, 255)
-MAGENTA = (255, 0, 255)
-ORANGE = (255, 165, 0)
-PURPLE = (128, 0, 128)
-BROWN = (165, 42, 42)
-PINK = (255, 192, 203)
-LIGHT_GREY = (113, 120, 127)
-DARK_GREY = (35, 42, 49)
-DARK_RED = (139, 0, 0)
-DARK_GREEN = (0, 100, 0)
-DARK_BLUE = (0, 0, 139)
-LIGHT_BLUE = (173, 216, 230)
-LIGHT_GREEN = (144, 238, 144)
-GOLD = (255, 215, 0)
-SHADOW = (48, 48, 48)
-HIGHLIGHT = (192, 192, 192)
-# Colors for frequency count from light to dark
-FREQUENCY_COLORS = [
-    (173, 216, 230),  # Light Blue
-    (135, 206, 235),  # Sky Blue
-    (0, 191, 255),  # Deep Sky Blue
-    (30, 144, 255),  # Dodger Blue
-    (0, 0, 255),  # Blue
-    (0, 0, 139),  # Dark Blue
-    (0, 100, 0),  # Dark Green
-    (255, 165, 0),  # Orange
-    (255, 0, 0)  # Red
-]
+# The window fits the board
+BOARD_ROWS, BOARD_COLS = board.get_board_shape()
+WIDTH = BOARD_COLS * TILE_SIZE + 2 * BOARD_MARGIN
+HEIGHT = BOARD_ROWS * TILE_SIZE + 2 * BOARD_MARGIN + TOP_WINDOW_HEIGHT
+SCREEN_SIZE = (WIDTH, HEIGHT)
 
 # Set up the display
 screen = pygame.display.set_mode(SCREEN_SIZE)
 pygame.display.set_caption("Minesweeper")
 
-# Create a Board instance
-board = Board()
-
 # Game variables
 start_time = time.time()
-total_flags = board.BOARD_MINES_S
+total_flags = board.get_mines_count()
 flags_left = total_flags
 
 # Player status
@@ -139,34 +114,8 @@ def draw_top_window():
     elapsed_time = int(time.time() - start_time)
     draw_seven_segment_flag(screen, elapsed_time, (20, 10), TOP_WINDOW_HEIGHT - 20)
 
-    # Draw the flags left
-    draw_seven_segment_time(screen, flags_left, (WIDTH - 140, 10), TOP_WINDOW_HEIGHT - 20)
-
-
-def unlock_empty_neighbour(row, col, boardState):
-    """
-    This function is responsible for
-    1. Performing BFS from chosen cell to unlock empty cells
-    2. Mark the neighbours as '2: Opened'
-    :param row: row
-    :param col: column
-    :param boardState: current state of the entire board  (0: Neutral, 1: Marked, 2: Opened)
-    :return: None
-    """
-    neighbour = deque(board.get_friendly_neighbours(row, col))
-    # For each neighbour
-    while neighbour:
-        # Pop and mark
-        curr = neighbour.popleft()
-        boardState[curr[0]][curr[1]] = 2
-        # Find new neighbours that are not bombs
-        new_neighbour = board.get_friendly_neighbours(curr[0], curr[1])
-        for new_n in new_neighbour:
-            # Add neighbour if
-            # 1. Not already in the deque
-            # 2. Not already been opened or still hidden
-            if (new_n not in neighbour and boardState[new_n[0]][new_n[1]] != 2):
-                neighbour.append(new_n)
+    # Draw the flags left, the AI places flags too
+    draw_seven_segment_time(screen, total_flags - board.get_flagged_count(), (WIDTH - 140, 10), TOP_WINDOW_HEIGHT - 20)
 
 
 def chooseCell(row, col, boardState, boardMines):
@@ -176,10 +125,8 @@ def chooseCell(row, col, boardState, boardMines):
     if boardMines[row][col] == 1:
         ALIVE = False
 
-    # Safe
-    boardState[row][col] = 2
-    if ALIVE:
-        unlock_empty_neighbour(row, col, boardState)
+    # Opens the whole empty region at once when the cell is empty
+    board.open_cell(row, col)
 
 
 """
@@ -190,202 +137,177 @@ def chooseCell(row, col, boardState, boardMines):
         /_/   \_\___|      |____/ |_|  \___/|_|   |_|
 """
 
-# Use AI?
-USE_AI: bool = True
+# Seconds between two AI moves
 ai_delay: int = 1
 ai_thinking: bool = False
+# Every AI game is logged here, see Replay.py, None to turn it off
+RECORD_DIR = "records"
+recorder = None
+# Write the AI's metrics for every turn to this file, see Metrics.py, None to turn it off
+METRICS_PATH = None
+metrics_sink = None
+# Seconds the AI may think about one move, it samples what it can't count exactly by then, None for no limit
+AI_BUDGET = 1.
+# The AI's table of local patterns, see Patterns.py, used if it has been built
+PATTERNS_PATH = "patterns.msp"
 if USE_AI:
-    # Create a lock for threading
-    AI = AI(board)
+    patterns = load_table(PATTERNS_PATH) if os.path.exists(PATTERNS_PATH) else None
+    AI = AI(board, budget=AI_BUDGET, patterns=patterns)
+    if RECORD_DIR is not None:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        recorder = GameRecorder(os.path.join(RECORD_DIR, "game-%d.jsonl" % int(start_time)), board,
+                                AI.get_backend().name, AI_BUDGET,
+                                os.path.abspath(PATTERNS_PATH) if patterns is not None else None)
+    if METRICS_PATH is not None:
+        metrics_sink = JsonLinesSink(METRICS_PATH)
+        AI.add_observer(metrics_sink)
+
+
+class AIWorker(threading.Thread):
+    """
+    One long-lived thread for the AI. The game loop asks for a move with request_move and
+    picks the result up from results, the worker sleeps on its queue in between
+    """
+    def __init__(self, ai: AI):
+        super().__init__(daemon=True)
+        self.__ai = ai
+        self.__requests = queue.Queue()
+        self.results = queue.Queue()
+
+    def request_move(self):
+        self.__requests.put(True)
+
+    def stop(self):
+        self.__requests.put(None)
 
+    def run(self):
+        while self.__requests.get() is not None:
+            start = time.perf_counter()
+            moves = self.__ai.make_move()
+            self.results.put((moves, time.perf_counter() - start))
 
-def unlock_empty_neighbour_AI(row: int, col: int, boardState: List, boardFreq: List, movesList: List):
+
+def apply_ai_moves(actions: ActionBatch, think: float):
     """
-    This function is responsible for
-    1. Performing BFS from chosen cell to unlock empty cells
-    2. Mark the neighbours as '2: Opened'
-    :param row: row
-    :param col: column
-    :param boardState: current state of the entire board  (0: Neutral, 1: Marked, 2: Opened)
+    Apply the AI's flags and moves to the board at once
+    :param actions: the result of AI.make_move
+    :param think: seconds the AI took, for the game log
     :return: None
     """
-    neighbour = deque(board.get_friendly_neighbours(row, col))
-    # For each neighbour
-    while neighbour:
-        # Pop and mark
-        curr = neighbour.popleft()
-        boardState[curr[0]][curr[1]] = 2
-        # If it's a numbered cell add it to the list for probability calculation
-        if boardFreq[curr[0]][curr[1]] > 0 and curr not in movesList:
-            movesList.append(curr)
-
-        # Find new neighbours that are not bombs
-        new_neighbour = board.get_friendly_neighbours(curr[0], curr[1])
-        for new_n in new_neighbour:
-            # Add neighbour if
-            # 1. Not already in the deque
-            # 2. Not already been opened or still hidden or a mine!
-            if new_n not in neighbour and boardState[new_n[0]][new_n[1]] != 2:
-                neighbour.append(new_n)
-
-
-def choose_cell_AI(row: int, col: int, boardState: List, boardMines: List, boardFreq: List, movesList: List):
-    """
-
-    :param row: row
-    :param col: column
-    :param boardState: current state of the entire board  (0: Neutral, 1: Marked, 2: Opened)
-    :param boardMines:
-    :param movesList:
-    :return:
-    """
     global ALIVE
+    opened, hitMine = board.apply_actions(actions.flags, actions.opens)
+    if recorder is not None:
+        recorder.record_turn(actions.opens, actions.flags, think, len(opened), hitMine)
     # Hit a bomb!
-    if boardMines[row][col] == 1:
+    if hitMine:
         ALIVE = False
 
-    # Safe
-    boardState[row][col] = 2
-    if ALIVE:
-        move = (row, col)
-        if boardFreq[row][col] > 0 and move not in movesList:
-            movesList.append(move)
-        unlock_empty_neighbour_AI(row, col, boardState, boardFreq, movesList)
-
-
-def ai_calculate_moves(board: Board, AI: AI):
-    global ai_thinking
-    ai_thinking = True  # AI starts thinking
-
-    # Retrieve the current state of the board
-    t_boardState = board.get_board_state()
-    t_boardMines = board.get_board_mines()
-    t_boardFreq = board.get_board_freq()
-    t_movesList = AI.get_moves_list()  # A reference to the possible moves
-    # Makes a move
-    # print(movesList)
-
-    # If AI is think of a move, let it continue
-    moves = AI.make_move()
-    for t_row, t_col in moves:
-        choose_cell_AI(t_row, t_col, t_boardState, t_boardMines, t_boardFreq, t_movesList)
-
-    ai_thinking = False
-
 
 # Pygame initialization
 pygame.init()
 running: bool = True
-count = 0
+screen.fill(WHITE)
+pygame.display.flip()
+renderer = Renderer(screen, board, TILE_SIZE, BOARD_MARGIN, BOARD_MARGIN + TOP_WINDOW_HEIGHT)
+last_top_window = None
+clock = pygame.time.Clock()
+game_over_time = None
+
+if USE_AI:
+    ai_worker = AIWorker(AI)
+    ai_worker.start()
+    ai_worker.request_move()
+    ai_thinking = True
+    next_ai_move = 0.
+
 # Main loop
 while running:
-    # "If you fail to make a call to the event queue for too long, the system may decide your program has locked up."
-    #  https://stackoverflow.com/questions/20165492/pygame-window-not-responding-after-a-few-seconds
-    #  use pygame.event.pump
-    pygame.event.pump()
-    print("Running")
-    """
-
-    """
-    if USE_AI:
-        if ai_thinking:
-            continue
-        else:
-            ai_thread = threading.Thread(target=ai_calculate_moves, args=(board, AI))
-            ai_thread.start()
-
-    # Player event handling
-    elif not USE_AI:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                location = pygame.mouse.get_pos()
-                col = (location[0] - BOARD_MARGIN) // TILE_SIZE
-                row = (location[1] - BOARD_MARGIN - TOP_WINDOW_HEIGHT) // TILE_SIZE
-                if 0 <= col < board.BOARD_WIDTH_S and 0 <= row < board.BOARD_HEIGHT_S:
-                    boardState = board.get_board_state()
-                    boardMines = board.get_board_mines()
-
-                    if event.button == 1:  # Left mouse button
-                        chooseCell(row, col, boardState, boardMines)
-
-
-                    elif event.button == 3:  # Right mouse button
-                        print("Right mouse button clicked")
-                        if boardState[row][col] == 0 and flags_left > 0:  # Only place a flag on a closed tile
-                            boardState[row][col] = 1
-                            flags_left -= 1
-                        elif boardState[row][col] == 1:  # Remove flag
-                            boardState[row][col] = 0
-                            flags_left += 1
+    frame_end = time.perf_counter() + 1 / FPS
+    game_over = not ALIVE or board.winning_check()
+
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            renderer.invalidate()
+        # Player event handling
+        elif event.type == pygame.MOUSEBUTTONDOWN and not USE_AI and not game_over:
+            location = event.pos
+            col = (location[0] - BOARD_MARGIN) // TILE_SIZE
+            row = (location[1] - BOARD_MARGIN - TOP_WINDOW_HEIGHT) // TILE_SIZE
+            if 0 <= col < BOARD_COLS and 0 <= row < BOARD_ROWS:
+                # The first cell the player opens is never a mine
+                if event.button == 1 and board.get_opened_count() == 0:
+                    board.place_mines((row, col))
+                boardState = board.get_board_state()
+                boardMines = board.get_board_mines()
+
+                if event.button == 1:  # Left mouse button
+                    chooseCell(row, col, boardState, boardMines)
+
+
+                elif event.button == 3:  # Right mouse button
+                    print("Right mouse button clicked")
+                    if boardState[row][col] == 0 and flags_left > 0:  # Only place a flag on a closed tile
+                        board.set_state(row, col, 1)
+                    elif boardState[row][col] == 1:  # Remove flag
+                        board.set_state(row, col, 0)
+                    flags_left = total_flags - board.get_flagged_count()
+
+    # Apply the AI's moves until it's time to draw the next frame. With no delay the AI
+    # gets its next turn straight away, so it plays as fast as it can think
+    while USE_AI and not game_over:
+        if not ai_thinking:
+            if time.perf_counter() < next_ai_move:
+                break
+            ai_worker.request_move()
+            ai_thinking = True
+        try:
+            moves, think = ai_worker.results.get(timeout=max(0., frame_end - time.perf_counter()))
+        except queue.Empty:
+            break
+        apply_ai_moves(moves, think)
+        ai_thinking = False
+        next_ai_move = time.perf_counter() + ai_delay
+        game_over = not ALIVE or board.winning_check()
+        if frame_end <= time.perf_counter():
+            break
 
     """
     This part onwards only responsible for updating the graphics
     """
-    # Fill the screen with white background
-    screen.fill(WHITE)
-
-    # Draw the top window
-    draw_top_window()
-
-    # Draw the Minesweeper board
-
-    for row in range(board.BOARD_HEIGHT_S):
-        for col in range(board.BOARD_WIDTH_S):
-            # Create a rectangle for each tile
-            boardState = board.get_board_state()
-            rect = pygame.Rect(BOARD_MARGIN + col * TILE_SIZE, BOARD_MARGIN + row * TILE_SIZE + TOP_WINDOW_HEIGHT,
-                               TILE_SIZE, TILE_SIZE)
-
-            # Default tile
-            if boardState[row][col] == 0:
-                pygame.draw.rect(screen, GREY, rect)
-                pygame.draw.rect(screen, BLACK, rect, 1)
-
-            # Marked tile (right-click)
-            elif boardState[row][col] == 1:
-                pygame.draw.rect(screen, LIGHT_GREY, rect)
-                pygame.draw.rect(screen, BLACK, rect, 1)
-                pygame.draw.line(screen, RED, rect.topleft, rect.bottomright, 2)
-                pygame.draw.line(screen, RED, rect.topright, rect.bottomleft, 2)
-
-            # Opened tile (left-click)
-            elif boardState[row][col] == 2:
-                pygame.draw.rect(screen, DARK_GREY, rect)
-                pygame.draw.rect(screen, BLACK, rect, 1)
-
-                # Draw a red circle if there's a mine
-                if board.get_board_mines()[row][col] == 1:
-                    pygame.draw.circle(screen, RED, rect.center, TILE_SIZE // 4)
-
-                # Display the frequency count of adjacent mines
-                freq = board.get_board_freq()[row][col]
-                if freq > 0:
-                    font = pygame.font.Font(None, 36)
-                    color = FREQUENCY_COLORS[freq]
-                    text = font.render(str(freq), True, color)
-                    text_rect = text.get_rect(center=rect.center)
-                    screen.blit(text, text_rect)
-            else:
-                raise Exception("How did we get here?!")
-
-    # Update the display
-    if not ai_thinking or count == 1:
-        pygame.display.flip()
-    if not ALIVE:
-        # TODO: ADD DEATH MESSAGE
-        print("You ded")
-        time.sleep(10)
-        running = False
-        pass
-    if board.winning_check():
-        # TODO: ADD WINNING MESSAGE
-        print("You won")
-        time.sleep(10)
+    # Only the tiles that changed are drawn and pushed to the display
+    rects = renderer.draw()
+
+    # The top window only changes when the time or the flags left do
+    top_window = (int(time.time() - start_time), total_flags - board.get_flagged_count())
+    if top_window != last_top_window and game_over_time is None:
+        last_top_window = top_window
+        draw_top_window()
+        rects.append(pygame.Rect(0, 0, WIDTH, TOP_WINDOW_HEIGHT))
+
+    if rects:
+        pygame.display.update(rects)
+
+    if game_over and game_over_time is None:
+        game_over_time = time.time()
+        if not ALIVE:
+            # TODO: ADD DEATH MESSAGE
+            print("You ded")
+        else:
+            # TODO: ADD WINNING MESSAGE
+            print("You won")
+    # Keep the final board on screen for a while
+    if game_over_time is not None and time.time() - game_over_time > 10:
         running = False
 
-    time.sleep(ai_delay)
-    count = 1
+    clock.tick(FPS)
+
+if USE_AI:
+    ai_worker.stop()
+if recorder is not None:
+    recorder.close("lost" if not ALIVE else "won" if board.winning_check() else "stuck")
+if metrics_sink is not None:
+    metrics_sink.close()
 # Quit Pygame
 pygame.quit()
@@ -0,0 +1,36 @@
+"""
+Sinks for the AI's per-turn metrics, see AI.add_observer.
+
+    sink = JsonLinesSink("metrics.jsonl")
+    ai.add_observer(sink)
+    ...
+    sink.close()
+
+Every turn becomes one JSON object on its own line, e.g. to find the turns that blew up:
+
+    jq 'select(.time > 0.1) | {turn, time, largest_component, branches}' metrics.jsonl
+"""
+import json
+
+
+class JsonLinesSink:
+    """
+    Observer that writes each turn's metrics to a JSON-lines file
+    """
+    def __init__(self, path: str, **fields):
+        """
+        :param path: the file, it's created or truncated
+        :param fields: added to every line, e.g. seed=3
+        """
+        self.__file = open(path, "w")
+        self.__fields = fields
+
+    def __call__(self, metrics: dict):
+        if self.__file.closed:
+            return
+        if self.__fields:
+            metrics = dict(self.__fields, **metrics)
+        self.__file.write(json.dumps(metrics) + "\n")
+
+    def close(self):
+        self.__file.close()
@@ -0,0 +1,326 @@
+"""
+Precomputed local patterns for the AI.
+
+A pattern is a size x size window (5 by default) around a numbered cell: which of its cells are
+hidden and, for the numbers whose neighbours are all inside it, how many mines they still need.
+That is enough to work out the cells that are mines or safe whatever lies outside the window,
+e.g. the 1-1, 1-2 and 1-2-1 patterns against a wall or in a corner. The table maps every such
+window that forces something to the cells it forces, the AI looks the windows around its
+numbers up before any search, see AI.apply_patterns.
+
+The windows that can occur are far too many to enumerate (a 5x5 window has 12^9 * 3^16 codes),
+so the generator collects the ones that do occur in games the AI plays and solves each of them
+exactly. A window is stored once for its 8 rotations and reflections, a table is a header, the
+windows at two codes per byte, then the forced mines and safe cells of each as bitmasks.
+
+    cd Game
+    python Patterns.py --games 2000 --out patterns.msp
+    python Simulator.py --games 1000 --patterns patterns.msp
+"""
+import argparse
+import functools
+import struct
+import time
+
+import numpy as np
+
+from Board import generate_boards, neighbour_sum
+from Solver import ConstraintSet, EnumerationBackend
+
+# magic, version, window size, number of patterns
+PATTERN_HEADER = struct.Struct("<4sHBI")
+PATTERN_MAGIC = b"MSWP"
+PATTERN_VERSION = 1
+
+# The code of each cell of a window, a number that still needs r mines is NUMBER + r
+HIDDEN = 0
+# Opened, flagged, off the board or a hidden cell next to none of the window's numbers
+BLOCKED = 1
+NUMBER = 2
+
+# Boards the generator plays on: width, height, mines
+GENERATOR_SIZES = ((9, 9, 10), (16, 16, 40), (30, 16, 99))
+
+
+def symmetries(size: int):
+    """
+    The 8 rotations and reflections of a size x size window, as permutations of its cells in
+    row-major order: cell i of the turned window is cell perm[i] of the window
+    :return: (8, size * size) array
+    """
+    cells = np.arange(size * size).reshape(size, size)
+    perms = []
+    for k in range(4):
+        turned = np.rot90(cells, k)
+        perms.append(turned.reshape(-1))
+        perms.append(turned[:, ::-1].reshape(-1))
+    return np.array(perms)
+
+
+def window_codes(state: np.ndarray, freq: np.ndarray, centres: list, size: int):
+    """
+    The windows around the given cells, for all of them at once
+    :param state: the board's states
+    :param freq: the board's frequencies
+    :param centres: the cells in the middle of the windows, (row, col)
+    :param size: odd window size
+    :return: (len(centres), size * size) uint8 array of codes, row-major
+    """
+    half = size // 2
+    height, width = state.shape
+    hidden = state == 0
+    remaining = freq.astype(np.int16) - neighbour_sum(state == 1)
+    # A number with more flags around it than mines, from a wrong flag, is blocked like an opened
+    # cell, NUMBER + remaining would wrap around and not fit in the half byte save packs a code in
+    numbers = (state == 2) & (freq > 0) & (neighbour_sum(hidden) > 0) & (remaining >= 0)
+    # Only the numbers of the inner (size - 2) x (size - 2) cells have all their neighbours in the window.
+    # Everything off the board is blocked, the grids are filled in rather than np.pad-ed, it's faster
+    outer = np.full((height + 2 * half, width + 2 * half), BLOCKED, dtype=np.uint8)
+    outer[half:half + height, half:half + width] = np.where(hidden, HIDDEN, BLOCKED)
+    inner = outer.copy()
+    inner[half:half + height, half:half + width][numbers] = (NUMBER + remaining)[numbers]
+
+    # The window around (row, col) of the board is outer[row:row + size, col:col + size]
+    rows, cols = np.array(centres, dtype=np.intp).reshape(-1, 2).T
+    offsets = np.arange(size)
+    rows = rows[:, None, None] + offsets[None, :, None]
+    cols = cols[:, None, None] + offsets[None, None, :]
+    codes = outer[rows, cols]
+    codes[:, 1:-1, 1:-1] = inner[rows[:, 1:-1], cols[:, :, 1:-1]]
+
+    # A hidden cell next to none of the numbers plays no part in the window
+    padded = np.zeros((len(codes), size + 2, size + 2), dtype=bool)
+    padded[:, 1:-1, 1:-1] = codes >= NUMBER
+    near = np.zeros(codes.shape, dtype=bool)
+    for dr in range(3):
+        for dc in range(3):
+            near |= padded[:, dr:dr + size, dc:dc + size]
+    codes[(codes == HIDDEN) & ~near] = BLOCKED
+    return codes.reshape(len(codes), size * size)
+
+
+def solve_window(codes: np.ndarray, size: int):
+    """
+    :param codes: one window, see window_codes
+    :return: the cells of the window (row-major indices) that are mines in every arrangement its
+    numbers allow, and the ones that are safe in every one
+    """
+    cells = [i for i in range(size * size) if codes[i] == HIDDEN]
+    position = {cell: j for j, cell in enumerate(cells)}
+    constraints = []
+    for i in range(size * size):
+        if codes[i] < NUMBER:
+            continue
+        row, col = divmod(i, size)
+        # Only the inner cells have numbers, their neighbours are all in the window
+        indices = [position[r * size + c] for r in range(row - 1, row + 2) for c in range(col - 1, col + 2)
+                   if r * size + c in position]
+        constraints.append((int(codes[i]) - NUMBER, indices))
+    solutions = EnumerationBackend().count_solutions(ConstraintSet(cells, constraints))
+    total = sum(count for count, _ in solutions.values())
+    # A window no board can have, e.g. from a wrong flag
+    if total == 0:
+        return (), ()
+    cellCounts = [sum(counts[j] for _, counts in solutions.values()) for j in range(len(cells))]
+    mines = tuple(cell for cell, count in zip(cells, cellCounts) if count == total)
+    safe = tuple(cell for cell, count in zip(cells, cellCounts) if count == 0)
+    return mines, safe
+
+
+class PatternTable:
+    """
+    The forced cells of every window that forces any, stored once for its 8 symmetries
+    """
+    def __init__(self, size: int = 5):
+        """
+        :param size: odd window size, 3 to 7
+        """
+        if size % 2 == 0 or not 3 <= size <= 7:
+            raise ValueError("The window size has to be odd, from 3 to 7")
+        self.size = size
+        # key: the codes of a window, turned so they are the smallest of its symmetries - value: mines, safe cells
+        self.__patterns = {}
+        # Windows looked at by add, whether they force anything or not
+        self.__seen = set()
+        # Windows, as they were on the board, that lookup found in no symmetry. Most of the windows
+        # around the edge are the same from one turn to the next, they are skipped straight away
+        self.__misses = set()
+        self.__symmetries = symmetries(size)
+
+    def canonical(self, codes: np.ndarray):
+        """
+        :return: the key of the window, the permutation that turns the window into it
+        """
+        variants = codes[self.__symmetries]
+        keys = [variant.tobytes() for variant in variants]
+        best = min(range(len(keys)), key=keys.__getitem__)
+        return keys[best], self.__symmetries[best]
+
+    def add(self, codes: np.ndarray):
+        """
+        Solve a window and keep it if it forces anything
+        :return: whether it was new
+        """
+        key, perm = self.canonical(codes)
+        if key in self.__seen:
+            return False
+        self.__seen.add(key)
+        mines, safe = solve_window(codes, self.size)
+        if mines or safe:
+            # Cell w of the window is cell where[w] of the key
+            where = np.argsort(perm)
+            self.__patterns[key] = (tuple(int(where[w]) for w in mines), tuple(int(where[w]) for w in safe))
+        return True
+
+    def lookup(self, state: np.ndarray, freq: np.ndarray, centres: list, changed: list = None):
+        """
+        Look up the window around each of centres, in all 8 symmetries
+        :param state: the board's states
+        :param freq: the board's frequencies
+        :param centres: cells to look around, (row, col), the numbered cells
+        :param changed: cells whose state changed since the last lookup, only the windows with one
+            of them inside are looked up, the others are the same as last time. None to look up every window
+        :return: the cells found to be mines and the ones found to be safe, both in the order found
+        """
+        mines = {}
+        safe = {}
+        size = self.size
+        half = size // 2
+        if changed is not None and centres:
+            # A window's codes only depend on the states of its own cells
+            near = np.zeros(state.shape, dtype=bool)
+            if changed:
+                rows, cols = np.array(changed, dtype=np.intp).T
+                near[rows, cols] = True
+            for _ in range(half):
+                near |= neighbour_sum(near) > 0
+            centres = [cell for cell in centres if near[cell]]
+        if not centres or not self.__patterns:
+            return mines, safe
+        length = size * size
+        codes = window_codes(state, freq, centres, size)
+        data = codes.tobytes()
+        windows = {}
+        for i in range(len(centres)):
+            window = data[i * length:(i + 1) * length]
+            if window not in self.__misses:
+                windows[i] = window
+        if not windows:
+            return mines, safe
+        rows = list(windows)
+        # Every window in every symmetry, (windows, 8, size * size), in one gather
+        data = np.ascontiguousarray(codes[rows][:, self.__symmetries]).tobytes()
+        hits = set()
+        for n, i in enumerate(rows):
+            for p, perm in enumerate(self.__symmetries):
+                start = (n * len(self.__symmetries) + p) * length
+                found = self.__patterns.get(data[start:start + length])
+                if found is None:
+                    continue
+                hits.add(i)
+                row, col = centres[i]
+                for cells, into in zip(found, (mines, safe)):
+                    for k in cells:
+                        r, c = divmod(int(perm[k]), size)
+                        cell = (row - half + r, col - half + c)
+                        into[cell] = cell
+        if len(self.__misses) > 2 ** 16:
+            self.__misses.clear()
+        self.__misses.update(window for i, window in windows.items() if i not in hits)
+        return mines, safe
+
+    def save(self, path: str):
+        keys = list(self.__patterns)
+        length = self.size * self.size
+        codes = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(-1, length)
+        # Two codes per byte, the first in the low half
+        codes = np.pad(codes, ((0, 0), (0, length % 2)))
+        packed = codes[:, 0::2] | codes[:, 1::2] << 4
+        masks = np.zeros((len(keys), 2), dtype="<u8")
+        for n, key in enumerate(keys):
+            for m, cells in enumerate(self.__patterns[key]):
+                masks[n, m] = sum(1 << k for k in cells)
+        with open(path, "wb") as f:
+            f.write(PATTERN_HEADER.pack(PATTERN_MAGIC, PATTERN_VERSION, self.size, len(keys)))
+            f.write(packed.tobytes())
+            f.write(masks.tobytes())
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, size, count = PATTERN_HEADER.unpack_from(data, 0)
+        if magic != PATTERN_MAGIC or version != PATTERN_VERSION:
+            raise ValueError("%s is not a version %d pattern table" % (path, PATTERN_VERSION))
+        table = cls(size)
+        length = size * size
+        width = (length + 1) // 2
+        start = PATTERN_HEADER.size
+        packed = np.frombuffer(data, dtype=np.uint8, count=count * width, offset=start).reshape(count, width)
+        masks = np.frombuffer(data, dtype="<u8", count=2 * count, offset=start + count * width).reshape(count, 2)
+        codes = np.empty((count, 2 * width), dtype=np.uint8)
+        codes[:, 0::2] = packed & 15
+        codes[:, 1::2] = packed >> 4
+        codes = codes[:, :length]
+        for n in range(count):
+            table.__patterns[codes[n].tobytes()] = tuple(tuple(k for k in range(length) if int(mask) >> k & 1)
+                                                         for mask in masks[n])
+        return table
+
+    def __len__(self):
+        return len(self.__patterns)
+
+
+@functools.lru_cache(maxsize=4)
+def load_table(path: str):
+    """
+    PatternTable.load, once per path and process, for the simulator's workers
+    """
+    return PatternTable.load(path)
+
+
+def harvest(table: PatternTable, games: int, seed: int = 0):
+    """
+    Add the windows around the numbers of every position of games the AI plays, on every board of GENERATOR_SIZES
+    :return: number of windows solved
+    """
+    from AI import AI
+
+    solved = 0
+    for width, height, mines in GENERATOR_SIZES:
+        for board in generate_boards(games, seed, width=width, height=height, mines=mines, verbose=False,
+                                     first_click=AI.FIRST_MOVE):
+            ai = AI(board, verbose=False)
+            while not board.winning_check():
+                state = board.get_board_state()
+                freq = board.get_board_freq()
+                centres = [(r, c) for r, c in np.argwhere((state == 2) & (freq > 0)).tolist()
+                           if board.hidden_neighbour_count(r, c) > 0]
+                if centres:
+                    for codes in window_codes(state, freq, centres, table.size):
+                        solved += table.add(codes)
+                moves = ai.make_move()
+                if len(moves) == 0 or board.apply_actions(moves.flags, moves.opens)[1]:
+                    break
+    return solved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the AI's table of local patterns")
+    parser.add_argument("--games", type=int, default=1000, help="games played on each board size")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--size", type=int, default=5, help="window size, odd from 3 to 7")
+    parser.add_argument("--out", type=str, default="patterns.msp")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = PatternTable(args.size)
+    solved = harvest(table, args.games, args.seed)
+    table.save(args.out)
+    print("Windows solved: ", solved)
+    print("Patterns kept:  ", len(table))
+    print("Time:            %.1fs" % (time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
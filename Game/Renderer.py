@@ -0,0 +1,136 @@
+import pygame
+
+from Board import Board
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GREY = (77, 84, 91)
+RED = (255, 0, 0)
+YELLOW = (255, 255, 0)
+# Additional colors
+BLUE = (0, 0, 255)
+GREEN = (0, 255, 0)
+CYAN = (0, 255, 255)
+MAGENTA = (255, 0, 255)
+ORANGE = (255, 165, 0)
+PURPLE = (128, 0, 128)
+BROWN = (165, 42, 42)
+PINK = (255, 192, 203)
+LIGHT_GREY = (113, 120, 127)
+DARK_GREY = (35, 42, 49)
+DARK_RED = (139, 0, 0)
+DARK_GREEN = (0, 100, 0)
+DARK_BLUE = (0, 0, 139)
+LIGHT_BLUE = (173, 216, 230)
+LIGHT_GREEN = (144, 238, 144)
+GOLD = (255, 215, 0)
+SHADOW = (48, 48, 48)
+HIGHLIGHT = (192, 192, 192)
+# Colors for frequency count from light to dark
+FREQUENCY_COLORS = [
+    (173, 216, 230),  # Light Blue
+    (135, 206, 235),  # Sky Blue
+    (0, 191, 255),  # Deep Sky Blue
+    (30, 144, 255),  # Dodger Blue
+    (0, 0, 255),  # Blue
+    (0, 0, 139),  # Dark Blue
+    (0, 100, 0),  # Dark Green
+    (255, 165, 0),  # Orange
+    (255, 0, 0)  # Red
+]
+
+
+class Renderer:
+    """
+    Draws the board tiles. Every surface is rendered once up front and only the cells whose
+    state changed since the last draw are blitted again (Board.changes_since)
+    """
+    def __init__(self, screen: pygame.Surface, board: Board, tileSize: int, left: int, top: int):
+        """
+        Needs pygame.init() to have been called, for the font
+        :param screen: the display surface
+        :param board: the board to draw
+        :param tileSize: size of a tile in pixels
+        :param left: x of the board's top left corner
+        :param top: y of the board's top left corner
+        """
+        self.__screen = screen
+        self.__board = board
+        self.__tile_size = tileSize
+        self.__left = left
+        self.__top = top
+        self.__version = 0
+        self.__full_redraw = True
+
+        # Default tile
+        self.__hidden = self.__make_tile(GREY)
+        # Marked tile (right-click)
+        self.__flagged = self.__make_tile(LIGHT_GREY)
+        pygame.draw.line(self.__flagged, RED, (0, 0), (tileSize, tileSize), 2)
+        pygame.draw.line(self.__flagged, RED, (tileSize, 0), (0, tileSize), 2)
+        # Opened tile (left-click)
+        self.__opened = self.__make_tile(DARK_GREY)
+        # Red circle for a mine, drawn over an opened tile
+        self.__mine = pygame.Surface((tileSize, tileSize), pygame.SRCALPHA)
+        pygame.draw.circle(self.__mine, RED, (tileSize // 2, tileSize // 2), tileSize // 4)
+        # Frequency count of adjacent mines, index 0 is never drawn
+        font = pygame.font.Font(None, 36)
+        self.__digits = [None] + [font.render(str(freq), True, FREQUENCY_COLORS[freq]) for freq in range(1, 9)]
+
+    def __make_tile(self, color):
+        tile = pygame.Surface((self.__tile_size, self.__tile_size))
+        tile.fill(color)
+        pygame.draw.rect(tile, BLACK, tile.get_rect(), 1)
+        return tile
+
+    def cell_rect(self, row: int, col: int):
+        return pygame.Rect(self.__left + col * self.__tile_size, self.__top + row * self.__tile_size,
+                           self.__tile_size, self.__tile_size)
+
+    def invalidate(self):
+        """
+        Redraw every tile on the next draw, e.g. after the window was covered
+        """
+        self.__full_redraw = True
+
+    def draw(self):
+        """
+        Blit the tiles that changed since the last call
+        :return: the rectangles that were drawn on, for pygame.display.update
+        """
+        version = self.__board.get_version()
+        if self.__full_redraw:
+            self.__full_redraw = False
+            self.__version = version
+            height, width = self.__board.get_board_shape()
+            for row in range(height):
+                for col in range(width):
+                    self.draw_cell(row, col)
+            board_rect = self.cell_rect(0, 0).union(self.cell_rect(height - 1, width - 1))
+            return [board_rect]
+
+        rects = []
+        for row, col in set(self.__board.changes_since(self.__version)):
+            rects.append(self.draw_cell(row, col))
+        self.__version = version
+        return rects
+
+    def draw_cell(self, row: int, col: int):
+        rect = self.cell_rect(row, col)
+        state = self.__board.get_board_state()[row, col]
+        if state == 0:
+            self.__screen.blit(self.__hidden, rect)
+        elif state == 1:
+            self.__screen.blit(self.__flagged, rect)
+        elif state == 2:
+            self.__screen.blit(self.__opened, rect)
+            if self.__board.get_board_mines()[row, col] == 1:
+                self.__screen.blit(self.__mine, rect)
+            freq = self.__board.get_board_freq()[row, col]
+            if freq > 0:
+                text = self.__digits[freq]
+                self.__screen.blit(text, text.get_rect(center=rect.center))
+        else:
+            raise Exception("How did we get here?!")
+        return rect
@@ -0,0 +1,181 @@
+"""
+Game recording and headless replay.
+
+GameRecorder writes one JSON object per line as the game goes: the starting board (packed
+with Storage.pack_board, so even an unseeded board comes back exactly) and how the AI was set
+up (backend, budget, pattern table), then every turn the
+AI played with the flags and cells it sent, how long it thought and what happened, then the
+outcome. Lines are only ever appended and flushed, a crashed game keeps every turn up to it.
+
+Replay reads a log back and rebuilds the board after any turn without running the AI, or
+plays the AI again, set up the same way, over the recorded positions to check it still makes
+the same moves and compare its timings with the recorded ones.
+
+    cd Game
+    python Replay.py game.jsonl --turn 12
+    python Replay.py game.jsonl --verify
+"""
+import argparse
+import base64
+import json
+import time
+
+from typing_extensions import List
+
+from Board import Board
+from AI import AI
+from Patterns import load_table
+from Solver import BACKENDS
+from Storage import pack_board, unpack_board
+
+
+class GameRecorder:
+    """
+    Append-only log of one game
+    """
+    def __init__(self, path: str, board: Board, backend: str = "auto", budget: float = None, patterns: str = None):
+        """
+        :param path: the log file, it's created or truncated
+        :param board: the board, before anything is opened
+        :param backend: name of the AI's solver backend, see Solver.BACKENDS
+        :param budget: the AI's seconds per move, None for no limit
+        :param patterns: the AI's pattern table file, None if it has none
+        """
+        self.__file = open(path, "w")
+        self.__turns = 0
+        self.write({"event": "start", "seed": board.get_seed(), "time": time.time(),
+                    "board": base64.b64encode(pack_board(board)).decode("ascii"),
+                    "backend": backend, "budget": budget, "patterns": patterns})
+
+    def write(self, record: dict):
+        if self.__file.closed:
+            return
+        self.__file.write(json.dumps(record) + "\n")
+        self.__file.flush()
+
+    def record_turn(self, opens: List, flags: List, think: float, opened: int, hitMine: bool):
+        """
+        :param opens: the cells the AI opened, in order
+        :param flags: the cells the AI flagged
+        :param think: seconds make_move took
+        :param opened: number of cells that were opened, flood fills included
+        :param hitMine: whether a mine was opened
+        :return: None
+        """
+        self.write({"event": "turn", "turn": self.__turns, "opens": opens, "flags": flags,
+                    "think": think, "opened": opened, "hit_mine": hitMine})
+        self.__turns += 1
+
+    def close(self, outcome: str):
+        """
+        :param outcome: won / lost / stuck / error: ...
+        """
+        self.write({"event": "end", "outcome": outcome, "turns": self.__turns})
+        self.__file.close()
+
+
+class Replay:
+    """
+    A recorded game, read back from a GameRecorder log
+    """
+    def __init__(self, path: str):
+        self.seed = None
+        # How the AI was set up, logs from before these were recorded get the defaults
+        self.backend = "auto"
+        self.budget = None
+        self.patterns = None
+        self.outcome = None
+        self.turns = []
+        self.__board = None
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["event"] == "start":
+                    self.seed = record["seed"]
+                    self.backend = record.get("backend", "auto")
+                    self.budget = record.get("budget")
+                    self.patterns = record.get("patterns")
+                    self.__board = base64.b64decode(record["board"])
+                elif record["event"] == "turn":
+                    record["opens"] = [tuple(cell) for cell in record["opens"]]
+                    record["flags"] = [tuple(cell) for cell in record["flags"]]
+                    self.turns.append(record)
+                elif record["event"] == "end":
+                    self.outcome = record["outcome"]
+        if self.__board is None:
+            raise ValueError("%s has no start record" % path)
+
+    def initial_board(self):
+        return unpack_board(self.__board)
+
+    def board_at(self, turn: int):
+        """
+        :param turn: number of turns played, 0 is the starting board
+        :return: the board after that many turns
+        """
+        board = self.initial_board()
+        for record in self.turns[:turn]:
+            board.apply_actions(record["flags"], record["opens"])
+        return board
+
+    def positions(self):
+        """
+        Fast-forward through the game
+        :return: a generator of (turn record, the board right before it), the same board is
+        changed in place from one turn to the next
+        """
+        board = self.initial_board()
+        for record in self.turns:
+            yield record, board
+            board.apply_actions(record["flags"], record["opens"])
+
+    def verify(self, **kwargs):
+        """
+        Play the AI again over the recorded game, applying the recorded turns. The AI is set up
+        the way the recorded one was, a move that ran out of budget may still come out different
+        :param kwargs: passed on to AI, over the recorded setup, e.g. backend
+        :return: per turn: turn, whether the AI made the same move, recorded and new seconds
+        """
+        board = self.initial_board()
+        kwargs.setdefault("verbose", False)
+        if "backend" not in kwargs:
+            kwargs["backend"] = BACKENDS[self.backend]()
+        kwargs.setdefault("budget", self.budget)
+        if "patterns" not in kwargs:
+            kwargs["patterns"] = load_table(self.patterns) if self.patterns is not None else None
+        ai = AI(board, **kwargs)
+        results = []
+        for record in self.turns:
+            start = time.perf_counter()
+            moves = ai.make_move()
+            think = time.perf_counter() - start
+            same = list(moves.opens) == record["opens"] and list(moves.flags) == record["flags"]
+            results.append({"turn": record["turn"], "same": same, "recorded": record["think"], "think": think})
+            board.apply_actions(record["flags"], record["opens"])
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or check a recorded game")
+    parser.add_argument("log", help="a log written by GameRecorder")
+    parser.add_argument("--turn", type=int, default=None, help="print the board after this many turns")
+    parser.add_argument("--verify", action="store_true", help="play the AI again and compare its moves and timings")
+    args = parser.parse_args()
+
+    replay = Replay(args.log)
+    print("Seed:", replay.seed, "- turns:", len(replay.turns), "- outcome:", replay.outcome)
+    print("AI:   backend", replay.backend, "- budget:", replay.budget, "- patterns:", replay.patterns)
+    if args.turn is not None:
+        replay.board_at(args.turn).printBoards()
+    if args.verify:
+        results = replay.verify()
+        for r in results:
+            print("turn %4d  %s  recorded %.4fs  now %.4fs" % (r["turn"], "same" if r["same"] else "DIFFERENT",
+                                                                r["recorded"], r["think"]))
+        print("Different moves:", sum(not r["same"] for r in results))
+
+
+if __name__ == '__main__':
+    main()
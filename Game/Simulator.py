@@ -0,0 +1,177 @@
+"""
+Headless batch simulator for the AI.
+
+Plays N seeded games of Board + AI without pygame, spread across a process pool, and
+reports games/sec, win rate and per-game turn counts.
+
+    cd Game
+    python Simulator.py --games 10000 --processes 8 --seed 0
+    python Simulator.py --games 1000 --backend enumeration
+    python Simulator.py --games 100 --record logs     # one Replay.py log per game
+    python Simulator.py --games 100 --metrics logs    # the AI's metrics for every turn of every game
+    python Simulator.py --games 1000 --budget 0.05    # moves of about 50ms at most, see AI.make_move
+    python Simulator.py --games 1000 --patterns patterns.msp    # built by Patterns.py
+"""
+import argparse
+import functools
+import multiprocessing
+import os
+import statistics
+import time
+
+from typing_extensions import List
+
+from Board import Board
+from AI import AI
+from Solver import BACKENDS
+from Replay import GameRecorder
+from Metrics import JsonLinesSink
+from Patterns import load_table
+
+# A game that goes on for longer than this is considered stuck
+MAX_TURNS: int = 10000
+
+
+def play_game(seed: int, backend: str = "auto", record_dir: str = None, width: int = Board.BOARD_WIDTH_S,
+              height: int = Board.BOARD_HEIGHT_S, mines: int = Board.BOARD_MINES_S, metrics_dir: str = None,
+              budget: float = None, patterns: str = None):
+    """
+    Play a single game from start to finish
+    :param seed: seed of the board
+    :param backend: name of the solver backend, see Solver.BACKENDS
+    :param record_dir: write the game's log to record_dir/seed-<seed>.jsonl, see Replay.py
+    :param width: number of columns
+    :param height: number of rows
+    :param mines: number of mines
+    :param metrics_dir: write the AI's turn metrics to metrics_dir/metrics-<seed>.jsonl, see Metrics.py
+    :param budget: seconds each move may take, None for no limit
+    :param patterns: a pattern table file for the AI, see Patterns.py
+    :return: a dictionary describing the game's outcome
+    """
+    start = time.perf_counter()
+    board = Board(width, height, mines, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+    ai = AI(board, verbose=False, backend=BACKENDS[backend](), budget=budget,
+            patterns=load_table(patterns) if patterns is not None else None)
+    recorder = None
+    if record_dir is not None:
+        recorder = GameRecorder(os.path.join(record_dir, "seed-%d.jsonl" % seed), board, backend, budget, patterns)
+    sink = None
+    if metrics_dir is not None:
+        sink = JsonLinesSink(os.path.join(metrics_dir, "metrics-%d.jsonl" % seed), seed=seed)
+        ai.add_observer(sink)
+    outcome = "stuck"
+    turns = 0
+    slowest = 0.
+    # Guesses made from samples, when a move ran out of time to count exactly
+    sampled = 0
+    try:
+        while turns < MAX_TURNS:
+            if board.winning_check():
+                outcome = "won"
+                break
+            think = time.perf_counter()
+            moves = ai.make_move()
+            think = time.perf_counter() - think
+            slowest = max(slowest, think)
+            # The AI has nothing left to try, that's not a turn
+            if len(moves) == 0:
+                break
+            sampled += moves.samples is not None
+            turns += 1
+            opened, hitMine = board.apply_actions(moves.flags, moves.opens)
+            if recorder is not None:
+                recorder.record_turn(moves.opens, moves.flags, think, len(opened), hitMine)
+            if hitMine:
+                outcome = "lost"
+                break
+    except Exception as e:
+        outcome = "error: " + repr(e)
+    if recorder is not None:
+        recorder.close(outcome)
+    if sink is not None:
+        sink.close()
+
+    return {"seed": seed, "outcome": outcome, "turns": turns, "time": time.perf_counter() - start,
+            "slowest": slowest, "sampled": sampled,
+            "cache_hits": ai.get_cache().hits, "cache_misses": ai.get_cache().misses}
+
+
+def run_batch(games: int, processes: int = None, seed: int = 0, chunksize: int = 16, backend: str = "auto",
+              record_dir: str = None, metrics_dir: str = None, budget: float = None, patterns: str = None):
+    """
+    Play games with seeds seed, seed + 1, ..., seed + games - 1 across a process pool
+    :param games: number of games
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :param seed: seed of the first game
+    :param chunksize: number of games handed to a worker at once
+    :param backend: name of the solver backend, see Solver.BACKENDS
+    :param record_dir: directory for the game logs, none are written if None
+    :param metrics_dir: directory for the AI's turn metrics, none are gathered if None
+    :param budget: seconds each move may take, None for no limit
+    :param patterns: a pattern table file for the AI, None to go without
+    :return: the results sorted by seed, wall-clock time in seconds
+    """
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = list(pool.imap_unordered(functools.partial(play_game, backend=backend, record_dir=record_dir,
+                                                             metrics_dir=metrics_dir, budget=budget,
+                                                             patterns=patterns),
+                                           range(seed, seed + games), chunksize))
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: r["seed"])
+    return results, elapsed
+
+
+def summarise(results: List, elapsed: float):
+    games = len(results)
+    won = sum(r["outcome"] == "won" for r in results)
+    lost = sum(r["outcome"] == "lost" for r in results)
+    errors = [r for r in results if r["outcome"].startswith("error")]
+    turns = [r["turns"] for r in results]
+    print("Games:      ", games)
+    print("Time:        %.2fs" % elapsed)
+    print("Games/sec:   %.2f" % (games / elapsed))
+    print("Win rate:    %.2f%%" % (100 * won / games))
+    print("Lost:       ", lost)
+    print("Stuck:      ", games - won - lost - len(errors))
+    print("Errors:     ", len(errors))
+    print("Turns:       mean %.1f / median %.1f / max %d" % (statistics.mean(turns), statistics.median(turns),
+                                                              max(turns)))
+    print("Slowest move: %.1fms, %d guesses sampled" % (1000 * max(r["slowest"] for r in results),
+                                                        sum(r["sampled"] for r in results)))
+    hits = sum(r["cache_hits"] for r in results)
+    misses = sum(r["cache_misses"] for r in results)
+    print("Cache:       %d hits / %d misses (%.1f%%)" % (hits, misses, 100 * hits / max(1, hits + misses)))
+    for r in errors[:10]:
+        print("  seed", r["seed"], r["outcome"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play seeded Minesweeper games with the AI, headless")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--out", type=str, default=None, help="write per-game results as CSV to this file")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="auto", help="solver for the edge components")
+    parser.add_argument("--record", type=str, default=None, help="write a log of every game to this directory")
+    parser.add_argument("--metrics", type=str, default=None, help="write the AI's turn metrics to this directory")
+    parser.add_argument("--budget", type=float, default=None, help="seconds each move may take, no limit by default")
+    parser.add_argument("--patterns", type=str, default=None, help="pattern table for the AI, see Patterns.py")
+    args = parser.parse_args()
+
+    for directory in (args.record, args.metrics):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    results, elapsed = run_batch(args.games, args.processes, args.seed, args.chunksize, args.backend, args.record,
+                                 args.metrics, args.budget, args.patterns)
+    summarise(results, elapsed)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write("seed,outcome,turns,time\n")
+            for r in results:
+                f.write("%d,%s,%d,%.6f\n" % (r["seed"], r["outcome"], r["turns"], r["time"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,674 @@
+"""
+Solver backends for the AI. A backend counts the mine arrangements of one frontier component,
+grouped by the number of mines they use, and combine_solutions turns the counts of every
+component into probabilities for the whole board.
+
+Every backend returns the same thing from count_solutions:
+    key: mines used - value: [number of arrangements, how many of them have a bomb in each cell]
+The exact backends stop with SolverTimeout once their deadline has passed, SamplingBackend
+returns what it sampled by then instead, its counts are only estimates and only in proportion.
+"""
+import random
+import time
+from collections import OrderedDict
+from fractions import Fraction
+
+from typing_extensions import List
+
+
+class ConstraintSet:
+    """
+    One frontier component: its hidden cells and the numbered cells around them
+    """
+    def __init__(self, cells: List, constraints: List):
+        """
+        :param cells: the hidden cells, (row, col)
+        :param constraints: one (mines left, indices into cells) per numbered cell
+        """
+        self.cells = cells
+        self.constraints = constraints
+        # cellConstraints[j]: the constraints the j-th cell is in
+        self.cellConstraints = [[] for _ in cells]
+        for k, (_, indices) in enumerate(constraints):
+            for j in indices:
+                self.cellConstraints[j].append(k)
+
+    def __len__(self):
+        return len(self.cells)
+
+
+class SolverTimeout(Exception):
+    """
+    Raised by count_solutions when the backend's deadline passed before it was done
+    """
+
+
+class SolverBackend:
+    """
+    Interface of a solver backend, see the module docstring
+    """
+    name = "base"
+    # Whether count_solutions counts every arrangement, the AI only caches exact counts
+    exact = True
+    # Search nodes tried and cut short so far, only counted while instrumented is set (AI's turn metrics)
+    instrumented = False
+    branches = 0
+    pruned = 0
+    # time.perf_counter() value to give up at, None for no limit
+    deadline = None
+
+    def count_solutions(self, constraintSet: ConstraintSet):
+        raise NotImplementedError
+
+
+def record_arrangement(mines: List, used: int, solutions: dict):
+    entry = solutions.get(used)
+    if entry is None:
+        entry = solutions[used] = [0, [0] * len(mines)]
+    entry[0] += 1
+    cellCounts = entry[1]
+    for j, mine in enumerate(mines):
+        if mine:
+            cellCounts[j] += 1
+
+
+class EnumerationBackend(SolverBackend):
+    """
+    The reference backend: try every cell as a bomb then as not a bomb, in order, with in-place backtracking
+    """
+    name = "enumeration"
+
+    def count_solutions(self, constraintSet: ConstraintSet):
+        solutions = {}
+        n = len(constraintSet)
+        # remaining[k]: the leftover frequency of the k-th numbered cell
+        remaining = [mines for mines, _ in constraintSet.constraints]
+        cellFreqs = constraintSet.cellConstraints
+        # closing[j]: the numbered cells that have no cell left after the j-th one,
+        # their leftover frequency has to be 0 once the j-th cell is decided
+        lastCell = [-1] * len(remaining)
+        for j in range(n):
+            for k in cellFreqs[j]:
+                lastCell[k] = j
+        closing = [[] for _ in range(n)]
+        for k, j in enumerate(lastCell):
+            if j == -1:
+                if remaining[k] != 0:
+                    return solutions
+            else:
+                closing[j].append(k)
+
+        mines = [0] * n
+        if n == 0:
+            record_arrangement(mines, 0, solutions)
+        elif self.instrumented or self.deadline is not None:
+            self.counted_search(remaining, cellFreqs, closing, mines, solutions)
+        else:
+            self.generate_arrangement_helper(0, 0, remaining, cellFreqs, closing, mines, solutions)
+        return solutions
+
+    def counted_search(self, remaining: List, cellFreqs: List, closing: List, mines: List, solutions: dict):
+        """
+        The same search with every call counted, and the deadline checked every 4096 calls, see
+        CountedEnumeration. Each call tries 2 choices, the ones that worked became a call or an arrangement
+        """
+        search = CountedEnumeration(self.deadline)
+        search.generate_arrangement_helper(0, 0, remaining, cellFreqs, closing, mines, solutions)
+        if self.instrumented:
+            self.branches += search.calls
+            self.pruned += 2 * search.calls - (search.calls - 1) - sum(count for count, _ in solutions.values())
+
+    def generate_arrangement_helper(self, i: int, used: int, remaining: List, cellFreqs: List, closing: List,
+                                    mines: List, solutions: dict):
+        """
+        Backtracking step: try the i-th cell as a bomb then as not a bomb, undoing the
+        changes to remaining and mines before returning
+        :param i: the index traverse the cell list
+        :param used: the number of bombs in the first i cells
+        :param remaining: the leftover frequency of each numbered cell
+        :param cellFreqs: the indices of the numbered cells around each cell
+        :param closing: the numbered cells that must reach 0 once each cell is decided
+        :param mines: the current assumption for each cell
+        :param solutions: the counters filled by record_arrangement
+        :return: None
+        """
+        last = i == len(mines) - 1
+        freqs = cellFreqs[i]
+        closed = closing[i]
+
+        # i-th cell is a bomb, every numbered cell around it needs one to spare
+        for k in freqs:
+            if remaining[k] == 0:
+                break
+        else:
+            for k in freqs:
+                remaining[k] -= 1
+            mines[i] = 1
+            for k in closed:
+                if remaining[k] != 0:
+                    break
+            else:
+                if last:
+                    record_arrangement(mines, used + 1, solutions)
+                else:
+                    self.generate_arrangement_helper(i + 1, used + 1, remaining, cellFreqs, closing, mines, solutions)
+            for k in freqs:
+                remaining[k] += 1
+            mines[i] = 0
+
+        # i-th cell is not a bomb
+        for k in closed:
+            if remaining[k] != 0:
+                return
+        if last:
+            record_arrangement(mines, used, solutions)
+        else:
+            self.generate_arrangement_helper(i + 1, used, remaining, cellFreqs, closing, mines, solutions)
+
+
+class CountedEnumeration(EnumerationBackend):
+    """
+    One search of EnumerationBackend.counted_search. The recursion goes through
+    generate_arrangement_helper, so overriding it counts every call and the plain search
+    doesn't pay for any counting
+    """
+    def __init__(self, deadline: float = None):
+        """
+        :param deadline: time.perf_counter() value to raise SolverTimeout at, None for no limit
+        """
+        self.deadline = deadline
+        self.calls = 0
+
+    def generate_arrangement_helper(self, *args):
+        self.calls += 1
+        if self.deadline is not None and self.calls & 4095 == 0 and time.perf_counter() > self.deadline:
+            raise SolverTimeout()
+        EnumerationBackend.generate_arrangement_helper(self, *args)
+
+
+class DPLLBackend(SolverBackend):
+    """
+    DPLL-style counting search. Every assignment is followed by unit propagation: a constraint
+    that needs no more mines makes its other cells safe, one that needs all of them makes them
+    mines. Each cell watches only the constraints it's in, so propagation looks at nothing else.
+    A constraint that can't be met any more is a conflict, its cells are bumped so the search
+    branches on them first from then on.
+    Once the unassigned cells fall apart into groups that share no constraint, each group is
+    counted on its own and the counts are multiplied, a group that was already counted with the
+    same leftover constraints is taken from a cache instead of being searched again
+    """
+    name = "dpll"
+
+    def count_solutions(self, constraintSet: ConstraintSet):
+        n = len(constraintSet)
+        self.__cells = [indices for _, indices in constraintSet.constraints]
+        self.__watches = constraintSet.cellConstraints
+        # need[k]: mines the k-th constraint still needs, free[k]: its cells that are not assigned yet
+        self.__need = [mines for mines, _ in constraintSet.constraints]
+        self.__free = [len(indices) for indices in self.__cells]
+        self.__value = [-1] * n
+        self.__trail = []
+        self.__activity = [0] * n
+        # key: cells of a group, leftover of every constraint around them - value: the group's solutions
+        self.__cache = {}
+
+        solutions = {}
+        for k, indices in enumerate(self.__cells):
+            if not indices and self.__need[k] != 0:
+                return solutions
+        if not self.propagate(list(range(len(self.__cells)))):
+            return solutions
+        free = [j for j in range(n) if self.__value[j] == -1]
+        fixed = list(self.__trail)
+        for used, (count, cellCounts) in self.extend(self.solve(free), fixed, {}).items():
+            solutions[used] = [count, [cellCounts.get(j, 0) for j in range(n)]]
+        return solutions
+
+    def assign(self, j: int, value: int):
+        self.__value[j] = value
+        self.__trail.append(j)
+        for k in self.__watches[j]:
+            self.__free[k] -= 1
+            self.__need[k] -= value
+
+    def backtrack(self, mark: int):
+        """
+        Undo every assignment made after the trail was mark long
+        """
+        trail = self.__trail
+        while len(trail) > mark:
+            j = trail.pop()
+            value = self.__value[j]
+            self.__value[j] = -1
+            for k in self.__watches[j]:
+                self.__free[k] += 1
+                self.__need[k] += value
+
+    def propagate(self, queue: List):
+        """
+        Unit propagation from the given constraints
+        :return: False on a conflict
+        """
+        need = self.__need
+        free = self.__free
+        value = self.__value
+        while queue:
+            k = queue.pop()
+            if need[k] < 0 or need[k] > free[k]:
+                for j in self.__cells[k]:
+                    self.__activity[j] += 1
+                return False
+            if free[k] and (need[k] == 0 or need[k] == free[k]):
+                forced = 1 if need[k] else 0
+                for j in self.__cells[k]:
+                    if value[j] == -1:
+                        self.assign(j, forced)
+                        queue.extend(self.__watches[j])
+        return True
+
+    def split(self, free: List):
+        """
+        Group the unassigned cells by the constraints they still share
+        """
+        value = self.__value
+        group = {}
+        groups = []
+        for start in free:
+            if start in group:
+                continue
+            group[start] = len(groups)
+            members = [start]
+            stack = [start]
+            while stack:
+                j = stack.pop()
+                for k in self.__watches[j]:
+                    for other in self.__cells[k]:
+                        if value[other] == -1 and other not in group:
+                            group[other] = len(groups)
+                            members.append(other)
+                            stack.append(other)
+            groups.append(members)
+        return groups
+
+    def solve(self, free: List):
+        """
+        Count the arrangements of the unassigned cells free
+        :return: key: mines used - value: [number of arrangements, key: cell - value: arrangements with a bomb there]
+        """
+        solutions = {0: [1, {}]}
+        for members in self.split(free):
+            solutions = self.multiply(solutions, self.solve_group(members))
+            if not solutions:
+                break
+        return solutions
+
+    def solve_group(self, members: List):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SolverTimeout()
+        members.sort()
+        constraints = sorted({k for j in members for k in self.__watches[j]})
+        key = (tuple(members), tuple(self.__need[k] for k in constraints))
+        cached = self.__cache.get(key)
+        if cached is not None:
+            return cached
+
+        activity = self.__activity
+        watches = self.__watches
+        # Most conflicts first, then the cell in the most constraints
+        branch = max(members, key=lambda j: (activity[j], len(watches[j])))
+        solutions = {}
+        for guess in (1, 0):
+            mark = len(self.__trail)
+            self.assign(branch, guess)
+            if self.propagate(list(watches[branch])):
+                fixed = self.__trail[mark:]
+                free = [j for j in members if self.__value[j] == -1]
+                self.extend(self.solve(free), fixed, solutions)
+            elif self.instrumented:
+                self.pruned += 1
+            self.backtrack(mark)
+        if self.instrumented:
+            self.branches += 2
+        self.__cache[key] = solutions
+        return solutions
+
+    def extend(self, solutions: dict, fixed: List, into: dict):
+        """
+        Add the cells fixed, with their current values, to every arrangement of solutions
+        and sum the result into into
+        """
+        value = self.__value
+        mines = [j for j in fixed if value[j] == 1]
+        for used, (count, cellCounts) in solutions.items():
+            entry = into.get(used + len(mines))
+            if entry is None:
+                entry = into[used + len(mines)] = [0, {}]
+            entry[0] += count
+            total = entry[1]
+            for j, cellCount in cellCounts.items():
+                total[j] = total.get(j, 0) + cellCount
+            for j in mines:
+                total[j] = total.get(j, 0) + count
+        return into
+
+    @staticmethod
+    def multiply(a: dict, b: dict):
+        """
+        The arrangements of two groups with no constraint in common, every arrangement of one
+        goes with every arrangement of the other
+        """
+        result = {}
+        for used_a, (count_a, cells_a) in a.items():
+            for used_b, (count_b, cells_b) in b.items():
+                entry = result.get(used_a + used_b)
+                if entry is None:
+                    entry = result[used_a + used_b] = [0, {}]
+                entry[0] += count_a * count_b
+                total = entry[1]
+                for j, cellCount in cells_a.items():
+                    total[j] = total.get(j, 0) + cellCount * count_b
+                for j, cellCount in cells_b.items():
+                    total[j] = total.get(j, 0) + cellCount * count_a
+        return result
+
+
+class AutoBackend(SolverBackend):
+    """
+    Plain enumeration has the least overhead on small components, DPLL takes over from
+    threshold cells on, where enumerating every arrangement one by one blows up
+    """
+    name = "auto"
+
+    def __init__(self, threshold: int = 20):
+        self.threshold = threshold
+        self.__small = EnumerationBackend()
+        self.__large = DPLLBackend()
+
+    def count_solutions(self, constraintSet: ConstraintSet):
+        backend = self.__small if len(constraintSet) < self.threshold else self.__large
+        backend.instrumented = self.instrumented
+        backend.deadline = self.deadline
+        if not self.instrumented:
+            return backend.count_solutions(constraintSet)
+        branches, pruned = backend.branches, backend.pruned
+        solutions = backend.count_solutions(constraintSet)
+        self.branches += backend.branches - branches
+        self.pruned += backend.pruned - pruned
+        return solutions
+
+
+class SamplingBackend(SolverBackend):
+    """
+    Monte Carlo estimate for the components too big to count in time. Each sample is a random
+    walk through the cells, in breadth-first order so the numbered cells are closed off early,
+    that only takes the values every numbered cell can still be satisfied with. When both
+    values are possible a cell is a mine with the chance its numbered cells suggest, and the walk's
+    weight is divided by the chance of the value taken (importance sampling), so the weighted
+    walks that get to the end count every arrangement equally.
+    The counts returned are weighted walk counts, combine_solutions only needs them in proportion.
+    It stops after samples walks or once the deadline passes, whichever comes first. With no
+    deadline a big component gets fewer walks, so that they visit about walk_cells cells in all
+    """
+    name = "sampling"
+    exact = False
+    # Effective number of samples behind the last count_solutions, the fewer the rougher its counts
+    effective_samples = 0.
+    # With no deadline: the cells the walks of one component visit, and the walks made at the least
+    walk_cells = 250000
+    min_samples = 50
+
+    def __init__(self, samples: int = 2000, seed: int = 0):
+        """
+        :param samples: walks to try at most
+        :param seed: for the walks
+        """
+        self.samples = samples
+        self.__random = random.Random(seed)
+
+    @staticmethod
+    def walk_order(constraintSet: ConstraintSet):
+        """
+        The cells in breadth-first order through the numbered cells they share
+        """
+        order = []
+        seen = set()
+        for start in range(len(constraintSet)):
+            if start in seen:
+                continue
+            seen.add(start)
+            first = len(order)
+            order.append(start)
+            while first < len(order):
+                j = order[first]
+                first += 1
+                for k in constraintSet.cellConstraints[j]:
+                    for other in constraintSet.constraints[k][1]:
+                        if other not in seen:
+                            seen.add(other)
+                            order.append(other)
+        return order
+
+    def count_solutions(self, constraintSet: ConstraintSet):
+        solutions = {}
+        n = len(constraintSet)
+        rng = self.__random
+        watches = constraintSet.cellConstraints
+        order = self.walk_order(constraintSet)
+        startNeed = [mines for mines, _ in constraintSet.constraints]
+        startFree = [len(indices) for _, indices in constraintSet.constraints]
+        total = squares = 0.
+        samples = self.samples
+        if self.deadline is None:
+            samples = min(samples, max(self.min_samples, self.walk_cells // max(n, 1)))
+
+        for _ in range(samples):
+            # need[k]: mines the k-th numbered cell still needs, free[k]: its cells the walk hasn't reached
+            need = list(startNeed)
+            free = list(startFree)
+            mines = [0] * n
+            used = 0
+            weight = 1.
+            for j in order:
+                freqs = watches[j]
+                for k in freqs:
+                    free[k] -= 1
+                # Safe only if the cells left can still take the mines needed, a mine only if one is needed
+                canSafe = all(need[k] <= free[k] for k in freqs)
+                canMine = all(need[k] > 0 for k in freqs)
+                if canSafe and canMine:
+                    chance = sum(need[k] / (free[k] + 1) for k in freqs) / len(freqs)
+                    mine = rng.random() < chance
+                    weight /= chance if mine else 1 - chance
+                elif canSafe or canMine:
+                    mine = canMine
+                else:
+                    weight = 0.
+                    break
+                if mine:
+                    mines[j] = 1
+                    used += 1
+                    for k in freqs:
+                        need[k] -= 1
+            if weight:
+                entry = solutions.get(used)
+                if entry is None:
+                    entry = solutions[used] = [0., [0.] * n]
+                entry[0] += weight
+                cellCounts = entry[1]
+                for j in range(n):
+                    if mines[j]:
+                        cellCounts[j] += weight
+                total += weight
+                squares += weight * weight
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                break
+
+        self.effective_samples = total * total / squares if squares else 0.
+        # combine_solutions works in integers, its weights don't fit in a float on big boards.
+        # The largest count becomes 2^53, the precision of the floats they were added up in
+        scale = 2 ** 53 / max((count for count, _ in solutions.values()), default=1.)
+        return {used: [round(count * scale), [round(cellCount * scale) for cellCount in cellCounts]]
+                for used, (count, cellCounts) in solutions.items()}
+
+
+class ComponentCache:
+    """
+    The solutions of the components solved lately, least recently used dropped first.
+    A component's solutions only depend on its cells and on the mines each numbered cell around
+    them still needs (the flagged cells are already taken off), so that is the key: the same
+    part of the edge is found again on a later turn as long as nothing around it changed
+    """
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+    @staticmethod
+    def signature(constraintSet: ConstraintSet):
+        return tuple(constraintSet.cells), tuple(sorted((mines, tuple(indices))
+                                                        for mines, indices in constraintSet.constraints))
+
+    def get(self, key):
+        solutions = self.__entries.get(key)
+        if solutions is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        return solutions
+
+    def put(self, key, solutions: dict):
+        self.__entries[key] = solutions
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+
+    def clear(self):
+        self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+# The backends the AI and the simulator can be asked for by name
+BACKENDS = {
+    EnumerationBackend.name: EnumerationBackend,
+    DPLLBackend.name: DPLLBackend,
+    AutoBackend.name: AutoBackend,
+    SamplingBackend.name: SamplingBackend,
+}
+
+
+def combine_by_density(solutionsList: List, density: float):
+    """
+    When every cell is a mine on its own with the same chance, an arrangement with m mines is
+    (density / (1 - density))^m times as likely as one with none and the components don't affect
+    each other. Kept in integers, a long edge has more arrangements than a float can hold
+    """
+    ratio = Fraction(density).limit_denominator(10 ** 6)
+    mine, safe = ratio.numerator, ratio.denominator - ratio.numerator
+    componentProbabilities = []
+    for solutions in solutionsList:
+        most = max(solutions, default=0)
+        norm = 0
+        probabilities = None
+        for m, (count, cellCounts) in solutions.items():
+            w = mine ** m * safe ** (most - m)
+            norm += count * w
+            if probabilities is None:
+                probabilities = [0] * len(cellCounts)
+            for j, cellCount in enumerate(cellCounts):
+                probabilities[j] += cellCount * w
+        componentProbabilities.append([p / norm for p in probabilities])
+    return componentProbabilities, density
+
+
+def interior_weights(total: dict, minesLeft: int, interiorCount: int):
+    """
+    The number of ways to place the mines an edge solution leaves on the interior, comb(interiorCount,
+    minesLeft - t) for a solution that uses t mines, all divided by the same number. Only their
+    ratios matter and comb(n, k - 1) / comb(n, k) = k / (n - k + 1), so they are the products
+    of the factors from the fewest interior mines up and from the most down. Those have as many
+    factors as there are possible values of t, the full binomials of a big board run to thousands
+    of digits and take milliseconds each
+    :param total: key: mines the edge uses - value: number of edge solutions
+    :return: key: mines the edge uses - value: integer weight, 0 where it's impossible
+    """
+    weights = dict.fromkeys(total, 0)
+    ks = [minesLeft - t for t in total if 0 <= minesLeft - t <= interiorCount]
+    if not ks:
+        return weights
+    low, high = min(ks), max(ks)
+    # up[k - low] = (n - low) * ... * (n - k + 1), down[k - low] = (k + 1) * ... * high
+    up = [1]
+    for k in range(low + 1, high + 1):
+        up.append(up[-1] * (interiorCount - k + 1))
+    down = [1]
+    for k in range(high, low, -1):
+        down.append(down[-1] * k)
+    down.reverse()
+    for t in weights:
+        k = minesLeft - t
+        if low <= k <= high:
+            weights[t] = up[k - low] * down[k - low]
+    return weights
+
+
+def combine_solutions(solutionsList: List, minesLeft: int, interiorCount: int, density: float = None):
+    """
+    Turn the solution counts of every component into global probabilities. A solution of the
+    whole edge that uses t mines can be completed in comb(interiorCount, minesLeft - t) ways,
+    so each group of solutions is weighted by that number
+    :param solutionsList: for each component, key: mines used - value: [solutions, per-cell mine counts]
+    :param minesLeft: the mines that are not flagged yet
+    :param interiorCount: number of hidden cells that are not edge cells
+    :param density: for a board whose mine count isn't known (ChunkedBoard), the chance of each cell
+    to be a mine, minesLeft and interiorCount are not used then
+    :return: the per-cell probabilities of each component, the probability of an interior cell
+    """
+    if density is not None:
+        return combine_by_density(solutionsList, density)
+
+    def convolve(a: dict, b: dict):
+        result = {}
+        for m_a, count_a in a.items():
+            for m_b, count_b in b.items():
+                result[m_a + m_b] = result.get(m_a + m_b, 0) + count_a * count_b
+        return result
+
+    distributions = [{m: count for m, (count, _) in solutions.items()} for solutions in solutionsList]
+    # Every way to fill the components before c and from c on, key: mines used - value: number of ways
+    prefixes = [{0: 1}]
+    for distribution in distributions:
+        prefixes.append(convolve(prefixes[-1], distribution))
+    suffixes = [{0: 1}]
+    for distribution in reversed(distributions):
+        suffixes.append(convolve(distribution, suffixes[-1]))
+    suffixes.reverse()
+    total = prefixes[-1]
+    weights = interior_weights(total, minesLeft, interiorCount)
+    norm = sum(count * weights[t] for t, count in total.items())
+    # The flags or the mine count don't add up, fall back to the local probabilities
+    if norm == 0:
+        weights = dict.fromkeys(total, 1)
+        norm = sum(total.values())
+
+    componentProbabilities = []
+    for c, solutions in enumerate(solutionsList):
+        # Every way to fill the other components
+        others = convolve(prefixes[c], suffixes[c + 1])
+        probabilities = None
+        for m, (_, cellCounts) in solutions.items():
+            w = sum(count * weights[m + s] for s, count in others.items())
+            if probabilities is None:
+                probabilities = [0] * len(cellCounts)
+            for j, cellCount in enumerate(cellCounts):
+                probabilities[j] += cellCount * w
+        componentProbabilities.append([p / norm for p in probabilities])
+
+    interior_probability = 1.
+    if interiorCount > 0:
+        interiorMines = sum(count * weights[t] * (minesLeft - t) for t, count in total.items())
+        interior_probability = interiorMines / norm / interiorCount
+    return componentProbabilities, interior_probability
@@ -0,0 +1,160 @@
+"""
+Compact binary format for boards, and corpus files holding many of them.
+
+A board record is a header followed by the mines at 1 bit per cell and the states at 2 bits
+per cell, both in row-major order, so a 30x16 board takes 201 bytes instead of three 480-byte grids.
+
+A corpus file is a header, the records one after the other, then the offset of every record.
+Corpus memory-maps the file and only decodes the records that are asked for, so a corpus of
+millions of positions opens instantly.
+
+    with CorpusWriter("boards.msc") as writer:
+        for board in generate_boards(10000, first_click=AI.FIRST_MOVE):
+            writer.append(board)
+
+    with Corpus("boards.msc") as corpus:
+        board = corpus[42]
+"""
+import mmap
+import struct
+
+import numpy as np
+
+from Board import Board
+
+# height, width, mines, has seed, seed, first click row, first click column (-1 if none)
+RECORD_HEADER = struct.Struct("<HHIBqhh")
+# What the header's fields can hold: the sides, the first click's row and column, the seed
+MAX_SIDE = 2 ** 16 - 1
+MAX_FIRST_CLICK = 2 ** 15 - 1
+SEED_RANGE = range(-2 ** 63, 2 ** 63)
+# magic, version, number of records, offset of the record index
+CORPUS_HEADER = struct.Struct("<4sHQQ")
+CORPUS_MAGIC = b"MSWC"
+CORPUS_VERSION = 1
+
+
+def pack_board(board: Board):
+    """
+    :param board: a board or a snapshot of one
+    :return: the board's record, bytes
+    :raises ValueError: the board doesn't fit in the header, a side longer than MAX_SIDE, a first
+        click past MAX_FIRST_CLICK or a seed that isn't an integer in SEED_RANGE
+    """
+    height, width = board.get_board_shape()
+    if height > MAX_SIDE or width > MAX_SIDE:
+        raise ValueError("A %dx%d board is too big for a record, at most %d cells a side" % (width, height, MAX_SIDE))
+    seed = board.get_seed()
+    if seed is not None and (not isinstance(seed, int) or seed not in SEED_RANGE):
+        raise ValueError("Seed %r doesn't fit in a record, only 64-bit integer seeds do" % (seed,))
+    first_click = board.get_first_click() or (-1, -1)
+    if max(first_click) > MAX_FIRST_CLICK:
+        raise ValueError("First click %r doesn't fit in a record, at most %d for its row and column"
+                         % (first_click, MAX_FIRST_CLICK))
+    header = RECORD_HEADER.pack(height, width, board.get_mines_count(), seed is not None, seed or 0, *first_click)
+
+    mines = np.packbits(board.get_board_mines().reshape(-1))
+    # Four cells per byte, the first cell in the lowest two bits
+    state = board.get_board_state().reshape(-1)
+    state = np.pad(state, (0, -len(state) % 4))
+    state = state[0::4] | state[1::4] << 2 | state[2::4] << 4 | state[3::4] << 6
+    return header + mines.tobytes() + state.tobytes()
+
+
+def unpack_board(data, offset: int = 0):
+    """
+    :param data: bytes-like holding a record written by pack_board
+    :param offset: where the record starts in data
+    :return: Board
+    """
+    height, width, mines_count, has_seed, seed, first_row, first_col = RECORD_HEADER.unpack_from(data, offset)
+    cells = height * width
+    # Slicing copies the record out, so nothing keeps a memory map from being closed
+    start = offset + RECORD_HEADER.size
+    middle = start + (cells + 7) // 8
+    mines = np.unpackbits(np.frombuffer(data[start:middle], np.uint8), count=cells)
+    packed = np.frombuffer(data[middle:middle + (cells + 3) // 4], np.uint8)
+    state = np.empty(len(packed) * 4, dtype=np.uint8)
+    for shift in range(4):
+        state[shift::4] = packed >> (2 * shift) & 3
+
+    board = Board.restore(mines.reshape(height, width), state[:cells].reshape(height, width),
+                          seed if has_seed else None, (first_row, first_col) if first_row >= 0 else None)
+    if board.get_mines_count() != mines_count:
+        raise ValueError("Corrupted board record, %d mines instead of %d" % (board.get_mines_count(), mines_count))
+    return board
+
+
+class CorpusWriter:
+    """
+    Write boards to a corpus file one at a time, the index is written by close
+    """
+    def __init__(self, path: str):
+        self.__file = open(path, "wb")
+        self.__offsets = []
+        self.__file.write(CORPUS_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, 0, 0))
+
+    def append(self, board: Board):
+        self.__offsets.append(self.__file.tell())
+        self.__file.write(pack_board(board))
+
+    def close(self):
+        if self.__file.closed:
+            return
+        index_offset = self.__file.tell()
+        self.__file.write(np.array(self.__offsets, dtype="<u8").tobytes())
+        self.__file.seek(0)
+        self.__file.write(CORPUS_HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, len(self.__offsets), index_offset))
+        self.__file.close()
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Corpus:
+    """
+    Read-only view of a corpus file. The file is memory-mapped, a board is only read and
+    decoded when it's indexed
+    """
+    def __init__(self, path: str):
+        self.__file = open(path, "rb")
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, index_offset = CORPUS_HEADER.unpack_from(self.__map, 0)
+        if magic != CORPUS_MAGIC or version != CORPUS_VERSION:
+            self.close()
+            raise ValueError("%s is not a version %d board corpus" % (path, CORPUS_VERSION))
+        self.__count = count
+        self.__index_offset = index_offset
+
+    def offset(self, i: int):
+        return int.from_bytes(self.__map[self.__index_offset + 8 * i:self.__index_offset + 8 * i + 8], "little")
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += self.__count
+        if not 0 <= i < self.__count:
+            raise IndexError("corpus index out of range")
+        return unpack_board(self.__map, self.offset(i))
+
+    def __len__(self):
+        return self.__count
+
+    def __iter__(self):
+        for i in range(self.__count):
+            yield self[i]
+
+    def close(self):
+        self.__map.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
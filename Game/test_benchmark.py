@@ -0,0 +1,42 @@
+"""
+Checks of the benchmark's inputs: the mid-game positions have to be ones the AI guesses on, and
+looking for them has to stop on boards that have few or none.
+
+    cd Game
+    python -m pytest -q test_benchmark.py
+"""
+import unittest
+
+from AI import AI
+from Benchmark import midgame_positions
+from Storage import unpack_board
+
+
+class TestMidgamePositions(unittest.TestCase):
+    def test_expert(self):
+        positions = midgame_positions(30, 16, 99, 3)
+        self.assertEqual(len(positions), 3)
+        for packed in positions:
+            board = unpack_board(packed)
+            self.assertGreater(board.get_opened_count(), 0)
+            self.assertIsNotNone(AI(board, verbose=False).make_move().probability)
+
+    def test_no_guesses(self):
+        """
+        No mines, the first click opens the whole board and there is never a guess
+        """
+        with self.assertRaises(ValueError):
+            midgame_positions(5, 5, 0, 2)
+
+    def test_few_guesses(self):
+        """
+        Few mines, most games are won without a guess, the seeds run out first
+        """
+        with self.assertWarns(UserWarning):
+            positions = midgame_positions(9, 9, 3, 5, max_seeds=300)
+        self.assertGreater(len(positions), 0)
+        self.assertLess(len(positions), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+"""
+Checks of the Board's running counters against counting again from the grids, after every way
+a cell's state can change, of the cells opened with an empty one against a plain BFS, and of
+the mines sample_mines and Board.place_mines place.
+
+    cd Game
+    python -m pytest -q test_board.py
+"""
+import random
+import unittest
+from collections import deque
+
+import numpy as np
+
+from AI import AI
+from Board import Board, neighbour_sum, sample_mines
+from test_solver import positions
+
+
+def bfs_open(board: Board, row: int, col: int):
+    """
+    The cells that opening (row, col) reveals, found with a BFS through the empty cells
+    :return: set of (row, col)
+    """
+    mines, freq = board.get_board_mines(), board.get_board_freq()
+    opened = {(row, col)}
+    if mines[row, col] == 1 or freq[row, col] > 0:
+        return opened
+    queue = deque([(row, col)])
+    while queue:
+        r, c = queue.popleft()
+        for n in board.getNeighbour(r, c):
+            if n not in opened:
+                opened.add(n)
+                if freq[n] == 0 and mines[n] == 0:
+                    queue.append(n)
+    return opened
+
+
+def recount(board: Board):
+    """
+    :return: the hidden and the flagged neighbours of every cell, counted from the states
+    """
+    state = board.get_board_state()
+    return neighbour_sum(state == 0), neighbour_sum(state == 1)
+
+
+class TestNeighbourCounters(unittest.TestCase):
+    def assertCounters(self, board: Board):
+        hidden, flagged = recount(board)
+        height, width = board.get_board_shape()
+        for r in range(height):
+            for c in range(width):
+                self.assertEqual(board.hidden_neighbour_count(r, c), hidden[r, c], msg=(r, c))
+                self.assertEqual(board.flagged_neighbour_count(r, c), flagged[r, c], msg=(r, c))
+                self.assertEqual(board.solved_cell(r, c), hidden[r, c] == 0, msg=(r, c))
+
+    def test_set_state(self):
+        """
+        Every change of state, back to hidden too, on the corners and edges as well
+        """
+        rng = random.Random(0)
+        for width, height in ((1, 1), (1, 5), (7, 3), (30, 16)):
+            board = Board(width, height, 0, seed=0, verbose=False)
+            for i in range(4 * width * height):
+                board.set_state(rng.randrange(height), rng.randrange(width), rng.randrange(3))
+                if i % width == 0:
+                    self.assertCounters(board)
+            self.assertCounters(board)
+
+    def test_open_cell(self):
+        """
+        Empty regions open in bulk, over flagged cells too
+        """
+        for seed in range(10):
+            board = Board(30, 16, 40, seed=seed, verbose=False)
+            rng = random.Random(seed)
+            for _ in range(20):
+                board.set_state(rng.randrange(16), rng.randrange(30), 1)
+            empty = np.argwhere((board.get_board_freq() == 0) & (board.get_board_mines() == 0)).tolist()
+            for row, col in rng.sample(empty, 5):
+                board.open_cell(row, col)
+                self.assertCounters(board)
+
+    def test_apply_actions(self):
+        for board in positions(30, 16, 99, 3):
+            self.assertCounters(board)
+
+    def test_restore(self):
+        for board in positions(16, 16, 40, 3):
+            restored = Board.restore(board.get_board_mines(), board.get_board_state())
+            self.assertCounters(restored)
+            self.assertCounters(board.snapshot())
+
+    def test_snapshot(self):
+        """
+        A snapshot's changes don't reach the board's counters
+        """
+        board = Board(16, 16, 40, seed=0, verbose=False, first_click=AI.FIRST_MOVE)
+        board.open_cell(*AI.FIRST_MOVE)
+        hidden, flagged = recount(board)
+        snapshot = board.snapshot()
+        for row in range(16):
+            snapshot.set_state(row, row, 1)
+        self.assertCounters(snapshot)
+        self.assertCounters(board)
+        np.testing.assert_array_equal(recount(board)[0], hidden)
+        np.testing.assert_array_equal(recount(board)[1], flagged)
+
+
+class TestStateCounts(unittest.TestCase):
+    def assertStateCounts(self, board: Board):
+        state = board.get_board_state()
+        self.assertEqual((board.get_hidden_count(), board.get_flagged_count(), board.get_opened_count()),
+                         tuple(int(np.count_nonzero(state == s)) for s in range(3)))
+        safe = state.size - board.get_mines_count()
+        self.assertEqual(board.winning_check(), int(np.count_nonzero(state == 2)) == safe)
+
+    def test_set_state(self):
+        rng = random.Random(1)
+        board = Board(7, 3, 4, seed=1, verbose=False)
+        for _ in range(200):
+            board.set_state(rng.randrange(3), rng.randrange(7), rng.randrange(3))
+            self.assertStateCounts(board)
+
+    def test_games(self):
+        """
+        Along played games, up to the win, and on the snapshots and restored boards of them
+        """
+        won = 0
+        for board in positions(9, 9, 10, 20):
+            self.assertStateCounts(board)
+            self.assertStateCounts(board.snapshot())
+            self.assertStateCounts(Board.restore(board.get_board_mines(), board.get_board_state()))
+        for seed in range(20):
+            board = Board(9, 9, 10, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+            ai = AI(board, verbose=False)
+            while not board.winning_check():
+                moves = ai.make_move()
+                if len(moves) == 0 or board.apply_actions(moves.flags, moves.opens)[1]:
+                    break
+            self.assertStateCounts(board)
+            won += board.winning_check()
+        self.assertGreater(won, 0)
+
+
+class TestSampleMines(unittest.TestCase):
+    def assertMines(self, mines: list, width: int, height: int, count: int, first_click: tuple, safe_radius: int):
+        self.assertEqual(len(mines), count)
+        self.assertEqual(len(set(mines)), count)
+        for idx in mines:
+            self.assertTrue(0 <= idx < width * height, msg=idx)
+            row, col = divmod(idx, width)
+            if first_click is not None:
+                self.assertGreater(max(abs(row - first_click[0]), abs(col - first_click[1])), safe_radius,
+                                   msg=(width, height, first_click, safe_radius, (row, col)))
+
+    def test_first_click(self):
+        """
+        Every first click of small boards, the corners and edges too, up to as many mines as fit
+        """
+        for width in range(1, 7):
+            for height in range(1, 7):
+                for safe_radius in (0, 1, 2):
+                    for row in range(height):
+                        for col in range(width):
+                            cleared = (min(row + safe_radius, height - 1) - max(row - safe_radius, 0) + 1) * \
+                                      (min(col + safe_radius, width - 1) - max(col - safe_radius, 0) + 1)
+                            most = width * height - cleared
+                            for count in {0, most // 2, most}:
+                                mines = sample_mines(random.Random(row * width + col), width, height, count,
+                                                     (row, col), safe_radius)
+                                self.assertMines(mines, width, height, count, (row, col), safe_radius)
+                            with self.assertRaises(ValueError):
+                                sample_mines(random.Random(0), width, height, most + 1, (row, col), safe_radius)
+
+    def test_seed(self):
+        """
+        The same seed places the same mines, another seed other ones
+        """
+        for first_click in (None, (0, 0), (15, 29), (0, 17), (8, 0), (7, 12)):
+            layouts = []
+            for seed in (0, 0, 1):
+                mines = sample_mines(random.Random(seed), 30, 16, 99, first_click)
+                self.assertMines(mines, 30, 16, 99, first_click, 1)
+                layouts.append(mines)
+            self.assertEqual(layouts[0], layouts[1])
+            self.assertNotEqual(layouts[0], layouts[2])
+
+    def test_board(self):
+        for row, col in ((0, 0), (0, 29), (15, 0), (15, 29), (0, 12), (9, 29), (7, 13)):
+            board = Board(30, 16, 99, seed=row + col, verbose=False, first_click=(row, col))
+            mines = board.get_board_mines()
+            self.assertEqual(int(np.count_nonzero(mines)), 99)
+            self.assertEqual(int(mines[max(row - 1, 0):row + 2, max(col - 1, 0):col + 2].sum()), 0)
+            self.assertEqual(board.get_board_freq()[row, col], 0)
+            np.testing.assert_array_equal(Board(30, 16, 99, seed=row + col, verbose=False,
+                                                first_click=(row, col)).get_board_mines(), mines)
+
+    def test_place_mines(self):
+        """
+        A player's first click, the way Engine.py handles it: the mines are placed on the click,
+        the clicked cell opens its empty region and the board is the one made for that click
+        """
+        for seed, (row, col) in enumerate(((7, 13), (0, 29), (15, 0), (9, 4))):
+            board = Board(30, 16, 99, seed=seed, verbose=False)
+            board.set_state(3, 3, 1)
+            board.place_mines((row, col))
+            board.set_state(3, 3, 0)
+            expected = Board(30, 16, 99, seed=seed, verbose=False, first_click=(row, col))
+            np.testing.assert_array_equal(board.get_board_mines(), expected.get_board_mines())
+            np.testing.assert_array_equal(board.get_board_freq(), expected.get_board_freq())
+            self.assertEqual(board.get_first_click(), (row, col))
+            opened = board.open_cell(row, col)
+            self.assertEqual(set(opened), bfs_open(expected, row, col))
+            self.assertGreater(len(opened), 1)
+            self.assertFalse(any(board.get_board_mines()[cell] for cell in opened))
+            with self.assertRaises(ValueError):
+                board.place_mines((0, 0))
+
+
+class TestOpenCell(unittest.TestCase):
+    def test_bfs(self):
+        """
+        Random boards from empty to crowded, so the regions wind and touch only diagonally,
+        some cells opened or flagged beforehand
+        """
+        rng = random.Random(2)
+        for seed in range(60):
+            width, height = rng.randint(1, 40), rng.randint(1, 25)
+            mines = rng.randint(0, width * height * 3 // 10)
+            board = Board(width, height, mines, seed=seed, verbose=False)
+            for _ in range(rng.randrange(width * height // 4 + 1)):
+                board.set_state(rng.randrange(height), rng.randrange(width), rng.randint(1, 2))
+            safe = np.argwhere(board.get_board_mines() == 0).tolist()
+            for row, col in rng.sample(safe, min(len(safe), 8)):
+                before = set(map(tuple, np.argwhere(board.get_board_state() == 2).tolist()))
+                # An opened cell opens nothing more, like a click on it
+                expected = set() if (row, col) in before else bfs_open(board, row, col) - before
+                opened = board.open_cell(row, col)
+                self.assertEqual(len(opened), len(set(opened)))
+                self.assertEqual(set(opened), expected, msg=(seed, row, col))
+                self.assertEqual(set(map(tuple, np.argwhere(board.get_board_state() == 2).tolist())),
+                                 before | expected)
+            self.assertCounters(board)
+
+    assertCounters = TestNeighbourCounters.assertCounters
+
+
+if __name__ == '__main__':
+    unittest.main()
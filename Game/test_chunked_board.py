@@ -0,0 +1,117 @@
+"""
+Checks of ChunkedBoard: a chunk has to come out the same whichever order the chunks are created
+in, its numbers have to count the mines across its border, and a snapshot and the board it was
+taken from never see each other's changes.
+
+    cd Game
+    python -m pytest -q test_chunked_board.py
+"""
+import unittest
+
+import numpy as np
+
+from Board import neighbour_sum
+from ChunkedBoard import ChunkedBoard
+
+CHUNK = 8
+# A field of 3 x 4 chunks, the last ones cut short by the edges
+HEIGHT, WIDTH = 3 * CHUNK - 3, 4 * CHUNK - 5
+
+
+def grid(board: ChunkedBoard, name: str, rows: range, cols: range):
+    """
+    One of the board's grids over rows x cols, read cell by cell
+    :return: (len(rows), len(cols)) array
+    """
+    values = getattr(board, "get_board_" + name)()
+    return np.array([[values[r, c] for c in cols] for r in rows], dtype=np.int16)
+
+
+def hidden_neighbours(board: ChunkedBoard, row: int, col: int):
+    return sum(1 for n in board.getNeighbour(row, col) if board.get_state(*n) == 0)
+
+
+def flagged_neighbours(board: ChunkedBoard, row: int, col: int):
+    return sum(1 for n in board.getNeighbour(row, col) if board.get_state(*n) == 1)
+
+
+class TestChunks(unittest.TestCase):
+    def test_order(self):
+        """
+        The same seed gives the same mines and numbers, created row by row or backwards
+        """
+        forward = ChunkedBoard(WIDTH, HEIGHT, 0.2, seed=7, chunk_size=CHUNK)
+        backward = ChunkedBoard(WIDTH, HEIGHT, 0.2, seed=7, chunk_size=CHUNK)
+        for name in ("mines", "freq"):
+            first = grid(forward, name, range(HEIGHT), range(WIDTH))
+            second = grid(backward, name, range(HEIGHT - 1, -1, -1), range(WIDTH - 1, -1, -1))[::-1, ::-1]
+            np.testing.assert_array_equal(first, second, err_msg=name)
+
+    def test_seams(self):
+        """
+        Every number counts the mines around it, the ones in the next chunk too
+        """
+        for seed in range(5):
+            board = ChunkedBoard(WIDTH, HEIGHT, 0.2, seed=seed, chunk_size=CHUNK, first_click=(CHUNK, CHUNK))
+            mines = grid(board, "mines", range(HEIGHT), range(WIDTH))
+            np.testing.assert_array_equal(grid(board, "freq", range(HEIGHT), range(WIDTH)),
+                                          neighbour_sum(mines.astype(np.uint8)))
+            self.assertEqual(mines[CHUNK - 1:CHUNK + 2, CHUNK - 1:CHUNK + 2].sum(), 0)
+            self.assertGreater(mines.sum(), 0)
+
+    def test_endless(self):
+        """
+        With no end, a window far away and across negative chunks comes out the same from any board
+        """
+        rows, cols = range(1000 - CHUNK, 1000 + CHUNK), range(-3, CHUNK)
+        first = ChunkedBoard(seed=3, chunk_size=CHUNK)
+        second = ChunkedBoard(seed=3, chunk_size=CHUNK)
+        second.get_board_mines()[1000, 5]
+        np.testing.assert_array_equal(grid(first, "mines", rows, cols), grid(second, "mines", rows, cols))
+        self.assertEqual(grid(first, "mines", rows, range(-3, 0)).sum(), 0)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.board = ChunkedBoard(WIDTH, HEIGHT, 0.1, seed=1, chunk_size=CHUNK, first_click=(CHUNK, CHUNK))
+        self.board.open_cell(CHUNK, CHUNK)
+
+    def assertCounters(self, board: ChunkedBoard):
+        for r in range(HEIGHT):
+            for c in range(WIDTH):
+                self.assertEqual(board.hidden_neighbour_count(r, c), hidden_neighbours(board, r, c), msg=(r, c))
+                self.assertEqual(board.flagged_neighbour_count(r, c), flagged_neighbours(board, r, c), msg=(r, c))
+
+    def test_copy_on_write(self):
+        board = self.board
+        state = grid(board, "state", range(HEIGHT), range(WIDTH))
+        version = board.get_version()
+        snapshot = board.snapshot()
+        # Cells on the seams, so the chunks on both sides are copied
+        for row, col in ((CHUNK - 1, CHUNK - 1), (CHUNK, 2 * CHUNK - 1), (2 * CHUNK, 2 * CHUNK)):
+            snapshot.set_state(row, col, 1)
+        snapshot.open_cell(HEIGHT - 1, WIDTH - 1)
+        np.testing.assert_array_equal(grid(board, "state", range(HEIGHT), range(WIDTH)), state)
+        self.assertEqual(board.get_version(), version)
+        self.assertCounters(board)
+        self.assertCounters(snapshot)
+
+        # And the other way round
+        changed = grid(snapshot, "state", range(HEIGHT), range(WIDTH))
+        board.set_state(0, WIDTH - 1, 1)
+        board.set_state(CHUNK - 1, CHUNK - 1, 2)
+        np.testing.assert_array_equal(grid(snapshot, "state", range(HEIGHT), range(WIDTH)), changed)
+        self.assertCounters(board)
+        self.assertCounters(snapshot)
+
+    def test_journal(self):
+        snapshot = self.board.snapshot()
+        version = snapshot.get_version()
+        snapshot.set_state(0, 0, 1)
+        self.assertEqual(snapshot.changes_since(version), [(0, 0)])
+        self.assertEqual(snapshot.changes_since(0)[:version], self.board.changes_since(0))
+        self.assertEqual(self.board.changes_since(version), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Checks of the pattern table: what a window forces has to hold on the real board, and a table
+has to find the same after being saved and loaded, and a wrong flag can't give a code that
+doesn't fit in a table.
+
+    cd Game
+    python -m pytest -q test_patterns.py
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from Patterns import BLOCKED, NUMBER, PatternTable, harvest, window_codes
+from test_solver import positions
+
+HARVEST_GAMES = 10
+# The table is built from other games than the ones it's checked on
+HARVEST_SEED = 1000
+LOOKUP_GAMES = 10
+
+
+def lookups(table: PatternTable):
+    """
+    Look up the windows around the numbers of every position of seeded expert games
+    :return: a generator of (board, mines found, safe cells found)
+    """
+    for board in positions(30, 16, 99, LOOKUP_GAMES):
+        state = board.get_board_state()
+        freq = board.get_board_freq()
+        centres = [(r, c) for r, c in np.argwhere((state == 2) & (freq > 0)).tolist()
+                   if board.hidden_neighbour_count(r, c) > 0]
+        yield board, *table.lookup(state, freq, centres)
+
+
+class TestPatterns(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.table = {}
+        for size in (3, 5):
+            cls.table[size] = PatternTable(size)
+            harvest(cls.table[size], HARVEST_GAMES, HARVEST_SEED)
+
+    def test_real_mines(self):
+        found = 0
+        for size, table in self.table.items():
+            self.assertGreater(len(table), 0)
+            for board, mines, safe in lookups(table):
+                state = board.get_board_state()
+                for cell in mines:
+                    self.assertEqual(board.get_board_mines()[cell], 1, msg=(size, cell))
+                    self.assertEqual(state[cell], 0, msg=(size, cell))
+                for cell in safe:
+                    self.assertEqual(board.get_board_mines()[cell], 0, msg=(size, cell))
+                    self.assertEqual(state[cell], 0, msg=(size, cell))
+                found += len(mines) + len(safe)
+        self.assertGreater(found, 100)
+
+    def test_save_load(self):
+        table = self.table[5]
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "patterns.msp")
+            table.save(path)
+            loaded = PatternTable.load(path)
+        self.assertEqual((loaded.size, len(loaded)), (table.size, len(table)))
+        for (_, mines, safe), (_, loadedMines, loadedSafe) in zip(lookups(table), lookups(loaded)):
+            self.assertEqual(set(loadedMines), set(mines))
+            self.assertEqual(set(loadedSafe), set(safe))
+
+    def test_changed(self):
+        """
+        Looking up only the windows around the changed cells finds what a full lookup finds there
+        """
+        table = self.table[5]
+        for board in positions(30, 16, 99, 3):
+            state = board.get_board_state()
+            freq = board.get_board_freq()
+            centres = [(r, c) for r, c in np.argwhere((state == 2) & (freq > 0)).tolist()
+                       if board.hidden_neighbour_count(r, c) > 0]
+            self.assertEqual(table.lookup(state, freq, centres, []), ({}, {}))
+            full = table.lookup(state, freq, centres)
+            self.assertEqual(table.lookup(state, freq, centres, board.known_cells()), full)
+
+    def test_over_flagged(self):
+        """
+        A 1 with four flags around it, the way a player can flag it, is blocked in its windows
+        """
+        state = np.zeros((7, 7), dtype=np.uint8)
+        freq = np.zeros((7, 7), dtype=np.uint8)
+        state[3, 3] = state[3, 4] = 2
+        freq[3, 3], freq[3, 4] = 1, 2
+        state[2, 2] = state[2, 3] = state[4, 2] = state[4, 3] = 1
+        for size in (3, 5):
+            codes = window_codes(state, freq, [(3, 3), (3, 4)], size)
+            self.assertTrue((codes < 16).all(), msg=codes)
+            self.assertEqual(codes[0, size * size // 2], BLOCKED)
+            # The 2 next to it has two of the flags, it needs no more mines
+            self.assertEqual(codes[1, size * size // 2], NUMBER)
+            table = PatternTable(size)
+            for window in codes:
+                table.add(window)
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, "patterns.msp")
+                table.save(path)
+                loaded = PatternTable.load(path)
+            self.assertEqual(len(loaded), len(table))
+            self.assertEqual(loaded.lookup(state, freq, [(3, 3), (3, 4)]), table.lookup(state, freq, [(3, 3), (3, 4)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
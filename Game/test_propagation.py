@@ -0,0 +1,213 @@
+"""
+Checks of AI.propagate_constraints against brute force: whatever it flags has to be a mine and
+whatever it opens has to be safe in every placement of the mines, and going over only the
+components that changed has to find what going over the whole board does. And of the grid
+versions of rule 1 and 2 against the ones that go through the numbered cells one at a time,
+and of the rules when a move runs out of time to catch up with the changes.
+
+    cd Game
+    python -m pytest -q test_propagation.py
+"""
+import random
+import unittest
+
+import numpy as np
+
+from AI import AI
+from Board import Board
+from test_solver import BRUTE_FORCE_SIZE, brute_force
+
+PROPAGATION_GAMES = 200
+RULE_GAMES = 20
+
+
+class GridRulesAI(AI):
+    """
+    The AI with rule 1 and 2 always applied with array passes, however few numbers there are
+    """
+    RULE_GRID_CELLS = 0
+
+
+class CellRulesAI(AI):
+    """
+    The AI with rule 1 and 2 applied one numbered cell at a time, the way it does on a ChunkedBoard
+    """
+    ruleOneGrid = AI.ruleOne
+    ruleTwoGrid = AI.ruleTwo
+
+
+class BlockAI(AI):
+    """
+    The AI looking at the clock after every change and every numbered cell
+    """
+    FRONTIER_BLOCK = 1
+    RULE_BLOCK = 1
+
+
+def propagated(games: int, **kwargs):
+    """
+    The turns of seeded games the AI got through by propagating, nothing it could do with
+    rule 1 and 2 alone and no guess
+    :param kwargs: passed on to AI
+    :return: a generator of (the board right before the turn, ActionBatch)
+    """
+    for seed in range(games):
+        board = Board(*BRUTE_FORCE_SIZE, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+        ai = AI(board, verbose=False, **kwargs)
+        metrics = {}
+        ai.add_observer(metrics.update)
+        while not board.winning_check():
+            before = board.snapshot()
+            moves = ai.make_move()
+            if metrics["time_propagation"] > 0 and moves.probability is None and len(moves) > 0:
+                yield before, moves
+            if len(moves) == 0 or board.apply_actions(moves.flags, moves.opens)[1]:
+                break
+
+
+class TestPropagation(unittest.TestCase):
+    def assertDeduced(self, board: Board, moves):
+        expected = brute_force(board)
+        for cell in moves.opens:
+            self.assertEqual(expected[cell], 0, msg=cell)
+        for cell in moves.flags:
+            self.assertEqual(expected[cell], 1, msg=cell)
+
+    def test_brute_force(self):
+        turns = 0
+        for board, moves in propagated(PROPAGATION_GAMES):
+            self.assertDeduced(board, moves)
+            turns += 1
+        self.assertGreater(turns, 100)
+
+    def test_deadline(self):
+        """
+        With no time for it, propagating stops straight away, what it deduced by then still holds
+        """
+        for board, moves in propagated(PROPAGATION_GAMES // 4, budget=0.):
+            self.assertDeduced(board, moves)
+
+
+    def test_incremental(self):
+        """
+        Propagating only over the components that changed, with what was derived for them before,
+        deduces what a fresh AI propagating over every numbered cell of the board does
+        """
+        turns = 0
+        for width, height, mines in ((16, 16, 40), (30, 16, 99)):
+            for seed in range(RULE_GAMES):
+                board = Board(width, height, mines, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+                ai = AI(board, verbose=False)
+                metrics = {}
+                ai.add_observer(metrics.update)
+                while not board.winning_check():
+                    before = board.snapshot()
+                    moves = ai.make_move()
+                    if metrics["time_propagation"] > 0 and moves.probability is None:
+                        fresh = AI(before, verbose=False).make_move()
+                        self.assertEqual(set(moves.opens), set(fresh.opens), msg=(seed, moves.turn))
+                        self.assertEqual(set(moves.flags), set(fresh.flags), msg=(seed, moves.turn))
+                        turns += 1
+                    if len(moves) == 0 or board.apply_actions(moves.flags, moves.opens)[1]:
+                        break
+        self.assertGreater(turns, 50)
+
+
+class TestGridRules(unittest.TestCase):
+    def assertSameTurn(self, board: Board, **kwargs):
+        """
+        Both ways of applying the rules flag and open the same cells from board, the grid one
+        opens each cell once. A guess can go either way, see test_games
+        :param kwargs: passed on to both AIs
+        :return: the grid AI's ActionBatch
+        """
+        grid = GridRulesAI(board.snapshot(), verbose=False, **kwargs).make_move()
+        cells = CellRulesAI(board.snapshot(), verbose=False, **kwargs).make_move()
+        self.assertEqual(len(grid.opens), len(set(grid.opens)))
+        self.assertEqual(len(grid.flags), len(set(grid.flags)))
+        self.assertEqual(set(grid.flags), set(cells.flags))
+        if grid.probability is None:
+            self.assertEqual(set(grid.opens), set(cells.opens))
+        return grid
+
+    def test_games(self):
+        """
+        Every turn of seeded games, each AI on its own board. A guess between cells as likely as
+        each other can go either way, the grid AI's guess is played on both boards
+        """
+        for width, height, mines in ((9, 9, 10), (16, 16, 40), (30, 16, 99)):
+            for seed in range(RULE_GAMES):
+                boards = [Board(width, height, mines, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+                          for _ in range(2)]
+                ais = [GridRulesAI(boards[0], verbose=False), CellRulesAI(boards[1], verbose=False)]
+                while not boards[0].winning_check():
+                    grid, cells = (ai.make_move() for ai in ais)
+                    self.assertEqual(len(grid.opens), len(set(grid.opens)))
+                    self.assertEqual(set(grid.flags), set(cells.flags))
+                    if grid.probability is None:
+                        self.assertEqual(set(grid.opens), set(cells.opens))
+                    if len(grid) == 0 or boards[0].apply_actions(grid.flags, grid.opens)[1]:
+                        break
+                    boards[1].apply_actions(grid.flags, grid.opens)
+                    np.testing.assert_array_equal(boards[0].get_board_state(), boards[1].get_board_state())
+
+    def test_random_positions(self):
+        """
+        Random safe cells opened and random mines flagged, the numbers the rules see are scattered
+        """
+        rng = random.Random(3)
+        deduced = 0
+        for seed in range(100):
+            width, height = rng.randint(3, 30), rng.randint(3, 16)
+            board = Board(width, height, rng.randint(1, width * height // 4), seed=seed, verbose=False)
+            mines = board.get_board_mines()
+            safe = np.argwhere(mines == 0).tolist()
+            for row, col in rng.sample(safe, rng.randrange(len(safe))):
+                board.set_state(row, col, 2)
+            mined = np.argwhere(mines == 1).tolist()
+            for row, col in rng.sample(mined, rng.randrange(len(mined) + 1)):
+                board.set_state(row, col, 1)
+            if board.get_opened_count() == 0 or board.get_hidden_count() == 0:
+                continue
+            moves = self.assertSameTurn(board)
+            deduced += moves.probability is None and len(moves) > 0
+        self.assertGreater(deduced, 20)
+
+
+class TestCatchUp(unittest.TestCase):
+    def test_no_time(self):
+        """
+        With no time at all, every move stops as soon as it has something to open and leaves
+        the rest for later. What it deduces is still right, and it only guesses once it has
+        caught up with every number
+        """
+        won = 0
+        for seed in range(RULE_GAMES):
+            board = Board(30, 16, 99, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+            mines = board.get_board_mines()
+            ai = BlockAI(board, verbose=False, budget=0.)
+            while not board.winning_check():
+                moves = ai.make_move()
+                for cell in moves.flags:
+                    self.assertEqual(mines[cell], 1, msg=(seed, cell))
+                if moves.probability is None:
+                    for cell in moves.opens:
+                        self.assertEqual(mines[cell], 0, msg=(seed, cell))
+                elif moves.turn > 0:
+                    # The board the AI guessed on, with the flags it found on the way
+                    flagged = board.snapshot()
+                    for cell in moves.flags:
+                        flagged.set_state(cell[0], cell[1], 1)
+                    state = flagged.get_board_state()
+                    height, width = board.get_board_shape()
+                    numbers = {(r, c) for r in range(height) for c in range(width) if state[r, c] == 2 and
+                               board.get_board_freq()[r, c] > 0 and flagged.hidden_neighbour_count(r, c) > 0}
+                    self.assertEqual(set(ai.get_moves_list()), numbers, msg=seed)
+                if len(moves) == 0 or board.apply_actions(moves.flags, moves.opens)[1]:
+                    break
+            won += board.winning_check()
+        self.assertGreater(won, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Checks of game recording and replay: a recorded game, played again with the AI set up the way
+it was, has to come out move for move the same.
+
+    cd Game
+    python -m pytest -q test_replay.py
+"""
+import os
+import tempfile
+import unittest
+
+from Patterns import PatternTable, harvest
+from Replay import Replay
+from Simulator import play_game
+
+REPLAY_GAMES = 8
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def record(self, seed: int, **kwargs):
+        """
+        Play a seeded expert game with the simulator, logging it
+        :param kwargs: passed on to play_game
+        :return: the game's outcome, its log read back
+        """
+        result = play_game(seed, record_dir=self.folder.name, **kwargs)
+        return result, Replay(os.path.join(self.folder.name, "seed-%d.jsonl" % seed))
+
+    def assertReplays(self, result: dict, replay: Replay):
+        self.assertEqual(replay.outcome, result["outcome"])
+        self.assertEqual(len(replay.turns), result["turns"])
+        different = [r["turn"] for r in replay.verify() if not r["same"]]
+        self.assertEqual(different, [])
+
+    def test_verify(self):
+        for seed in range(REPLAY_GAMES):
+            for backend in ("auto", "dpll"):
+                result, replay = self.record(seed, backend=backend)
+                self.assertEqual(replay.backend, backend)
+                self.assertReplays(result, replay)
+
+    def test_patterns(self):
+        table = PatternTable()
+        harvest(table, 5, 1000)
+        path = os.path.join(self.folder.name, "patterns.msp")
+        table.save(path)
+        for seed in range(REPLAY_GAMES):
+            result, replay = self.record(seed, patterns=path)
+            self.assertEqual(replay.patterns, path)
+            self.assertReplays(result, replay)
+
+    def test_board_at(self):
+        result, replay = self.record(0)
+        self.assertEqual(replay.seed, 0)
+        self.assertEqual(replay.board_at(0).get_opened_count(), 0)
+        board = replay.board_at(len(replay.turns))
+        self.assertEqual(board.winning_check(), result["outcome"] == "won")
+        for turn, (record, position) in enumerate(replay.positions()):
+            self.assertEqual(record["turn"], turn)
+            self.assertEqual(position.get_version(), replay.board_at(turn).get_version())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Checks of the headless simulator: seeded games have to come out the same every time, with
+results that add up to what was played.
+
+    cd Game
+    python -m pytest -q test_simulator.py
+"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from AI import AI, ActionBatch
+from Replay import Replay
+from Simulator import play_game, run_batch, summarise
+
+SIMULATED_GAMES = 6
+# Beginner boards, small enough to win some of them
+BEGINNER = {"width": 9, "height": 9, "mines": 10}
+
+
+class TestSimulator(unittest.TestCase):
+    def assertResult(self, result: dict, seed: int):
+        self.assertEqual(result["seed"], seed)
+        self.assertIn(result["outcome"], ("won", "lost", "stuck"))
+        self.assertGreater(result["turns"], 0)
+        self.assertLessEqual(result["sampled"], result["turns"])
+        self.assertGreaterEqual(result["time"], result["slowest"])
+        self.assertGreaterEqual(result["cache_hits"], 0)
+        self.assertGreaterEqual(result["cache_misses"], 0)
+
+    def test_play_game(self):
+        """
+        Every turn counted is a turn in the game's log, and the same seed plays the same game
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            for seed in range(SIMULATED_GAMES):
+                result = play_game(seed, record_dir=folder, **BEGINNER)
+                self.assertResult(result, seed)
+                replay = Replay(os.path.join(folder, "seed-%d.jsonl" % seed))
+                self.assertEqual(replay.outcome, result["outcome"])
+                self.assertEqual(len(replay.turns), result["turns"])
+                again = play_game(seed, **BEGINNER)
+                self.assertEqual((again["outcome"], again["turns"]), (result["outcome"], result["turns"]))
+
+    def test_no_moves(self):
+        """
+        A game the AI has no move for is stuck after 0 turns, the empty move isn't a turn
+        """
+        with mock.patch.object(AI, "make_move", lambda ai, budget=None: ActionBatch([], [], 0)):
+            result = play_game(0, **BEGINNER)
+        self.assertEqual((result["outcome"], result["turns"], result["sampled"]), ("stuck", 0, 0))
+
+    def test_run_batch(self):
+        results, elapsed = run_batch(SIMULATED_GAMES, processes=2, seed=3, chunksize=2)
+        self.assertEqual([r["seed"] for r in results], list(range(3, 3 + SIMULATED_GAMES)))
+        self.assertGreater(elapsed, 0)
+        for result in results:
+            self.assertResult(result, result["seed"])
+            alone = play_game(result["seed"])
+            self.assertEqual((alone["outcome"], alone["turns"]), (result["outcome"], result["turns"]))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            summarise(results, elapsed)
+        lines = output.getvalue().splitlines()
+        won = sum(r["outcome"] == "won" for r in results)
+        self.assertIn("Games:       %d" % SIMULATED_GAMES, lines)
+        self.assertIn("Win rate:    %.2f%%" % (100 * won / SIMULATED_GAMES), lines)
+        self.assertIn("Errors:      0", lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
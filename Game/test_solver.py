@@ -0,0 +1,280 @@
+"""
+Checks of the solver backends against brute force, so a change to a backend or to
+combine_solutions can't quietly change the AI's probabilities.
+
+    cd Game
+    python -m pytest -q test_solver.py
+"""
+import itertools
+import math
+import unittest
+
+from AI import AI
+from Board import Board
+from Solver import BACKENDS, ComponentCache, ConstraintSet, SamplingBackend, combine_solutions
+
+# Small enough to try every placement of the mines left on every position
+BRUTE_FORCE_SIZE = (5, 4, 5)
+BRUTE_FORCE_GAMES = 40
+# Bigger components for comparing the backends with each other
+EXPERT_GAMES = 5
+LARGEST_COMPONENT = 30
+
+
+def positions(width: int, height: int, mines: int, games: int):
+    """
+    Every position the AI plays from in seeded games, the board is changed in place after each one
+    :return: a generator of boards
+    """
+    for seed in range(games):
+        board = Board(width, height, mines, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+        ai = AI(board, verbose=False)
+        while not board.winning_check():
+            yield board
+            moves = ai.make_move()
+            if len(moves) == 0 or board.apply_actions(moves.flags, moves.opens)[1]:
+                break
+
+
+def brute_force(board: Board):
+    """
+    The chance of each hidden cell to be a mine, over every placement of the mines that aren't
+    flagged that agrees with every opened number
+    :return: key: hidden cell - value: probability, None if no placement agrees
+    """
+    state = board.get_board_state()
+    freq = board.get_board_freq()
+    height, width = board.get_board_shape()
+    hidden = [(r, c) for r in range(height) for c in range(width) if state[r, c] == 0]
+    constraints = []
+    for r in range(height):
+        for c in range(width):
+            if state[r, c] == 2 and board.hidden_neighbour_count(r, c) > 0:
+                constraints.append((int(freq[r, c]) - board.flagged_neighbour_count(r, c),
+                                    set(board.get_hidden_neighbour(r, c))))
+    counts = dict.fromkeys(hidden, 0)
+    total = 0
+    for placement in itertools.combinations(hidden, board.get_mines_count() - board.get_flagged_count()):
+        placement = set(placement)
+        if all(len(cells & placement) == mines for mines, cells in constraints):
+            total += 1
+            for cell in placement:
+                counts[cell] += 1
+    if total == 0:
+        return None
+    return {cell: count / total for cell, count in counts.items()}
+
+
+def frontier(board: Board):
+    """
+    The components of the edge the way the AI splits it, as ConstraintSets
+    :return: the constraint sets, the number of hidden cells on no component
+    """
+    height, width = board.get_board_shape()
+    edge = [(r, c) for r in range(height) for c in range(width)
+            if board.get_board_state()[r, c] == 0 and board.get_frequency_neighbours(r, c)]
+    # Two edge cells are in the same component if they share a numbered cell
+    component = {cell: cell for cell in edge}
+
+    def find(cell):
+        while component[cell] != cell:
+            cell = component[cell]
+        return cell
+    numbers = {}
+    for cell in edge:
+        for n in board.get_frequency_neighbours(*cell):
+            numbers.setdefault(n, []).append(cell)
+    for cells in numbers.values():
+        for cell in cells[1:]:
+            component[find(cell)] = find(cells[0])
+
+    groups = {}
+    for cell in edge:
+        groups.setdefault(find(cell), []).append(cell)
+    constraintSets = []
+    for cells in groups.values():
+        index = {cell: j for j, cell in enumerate(cells)}
+        constraints = []
+        for n, around in numbers.items():
+            if around[0] in index:
+                constraints.append((int(board.get_board_freq()[n]) - board.flagged_neighbour_count(*n),
+                                    [index[cell] for cell in around]))
+        constraintSets.append(ConstraintSet(cells, constraints))
+    return constraintSets, board.get_hidden_count() - len(edge)
+
+
+def normalise(solutions: dict):
+    return {m: (count, list(cellCounts)) for m, (count, cellCounts) in solutions.items()}
+
+
+class TestBruteForce(unittest.TestCase):
+    """
+    Every exact backend, through combine_solutions, gives the same probabilities as trying
+    every placement of the mines on small boards
+    """
+    def test_backends(self):
+        checked = 0
+        for board in positions(*BRUTE_FORCE_SIZE, BRUTE_FORCE_GAMES):
+            if board.get_opened_count() == 0:
+                continue
+            expected = brute_force(board)
+            constraintSets, interiorCount = frontier(board)
+            minesLeft = board.get_mines_count() - board.get_flagged_count()
+            for name, backend in BACKENDS.items():
+                if not backend.exact:
+                    continue
+                solver = backend()
+                probabilities, interior = combine_solutions([solver.count_solutions(cs) for cs in constraintSets],
+                                                            minesLeft, interiorCount)
+                edge = set()
+                for cs, cellProbabilities in zip(constraintSets, probabilities):
+                    for cell, probability in zip(cs.cells, cellProbabilities):
+                        self.assertAlmostEqual(probability, expected[cell], places=12, msg=(name, cell))
+                        edge.add(cell)
+                        checked += 1
+                for cell in expected.keys() - edge:
+                    self.assertAlmostEqual(interior, expected[cell], places=12, msg=(name, cell))
+                    checked += 1
+        self.assertGreater(checked, 1000)
+
+    def test_ai_guess(self):
+        """
+        The chance the AI gives its guess is the brute force one
+        """
+        guesses = 0
+        for seed in range(BRUTE_FORCE_GAMES):
+            board = Board(*BRUTE_FORCE_SIZE, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+            ai = AI(board, verbose=False)
+            while not board.winning_check():
+                expected = brute_force(board) if board.get_opened_count() > 0 else None
+                moves = ai.make_move()
+                if moves.probability is not None and expected is not None:
+                    self.assertAlmostEqual(moves.probability, expected[moves.opens[0]], places=12)
+                    self.assertAlmostEqual(moves.probability, min(expected.values()), places=12)
+                    guesses += 1
+                if len(moves) == 0 or board.apply_actions(moves.flags, moves.opens)[1]:
+                    break
+        self.assertGreater(guesses, 10)
+
+
+class TestBackends(unittest.TestCase):
+    """
+    The exact backends count the same arrangements on the components of expert games
+    """
+    def test_same_counts(self):
+        compared = 0
+        for board in positions(30, 16, 99, EXPERT_GAMES):
+            for cs in frontier(board)[0]:
+                if len(cs) > LARGEST_COMPONENT:
+                    continue
+                expected = normalise(BACKENDS["enumeration"]().count_solutions(cs))
+                for name in ("dpll", "auto"):
+                    self.assertEqual(normalise(BACKENDS[name]().count_solutions(cs)), expected, msg=name)
+                compared += 1
+        self.assertGreater(compared, 100)
+
+    def test_sampling_close(self):
+        """
+        The sampler is only an estimate: each probability has to be within 4 of the standard
+        errors its effective samples give (see ActionBatch), and close on average
+        """
+        errors = []
+        for board in positions(30, 16, 99, EXPERT_GAMES):
+            for cs in frontier(board)[0]:
+                if not 8 <= len(cs) <= LARGEST_COMPONENT:
+                    continue
+                exact = combine_solutions([BACKENDS["enumeration"]().count_solutions(cs)], None, None, 0.2)[0][0]
+                sampler = SamplingBackend(seed=1)
+                sampled = combine_solutions([sampler.count_solutions(cs)], None, None, 0.2)[0][0]
+                for p, estimate in zip(exact, sampled):
+                    error = math.sqrt(p * (1 - p) / sampler.effective_samples)
+                    self.assertLessEqual(abs(estimate - p), 4 * error + 0.01, msg=cs.cells)
+                    errors.append(abs(estimate - p))
+        self.assertLess(sum(errors) / len(errors), 0.02)
+
+    def test_sampling_walks(self):
+        """
+        With no deadline a long chain gets fewer walks than a short one. Along a chain of 1s each
+        walk picks the first cell and the rest follow, every walk counts as one whole sample
+        """
+        for n, walks in ((10, 2000), (1000, SamplingBackend.walk_cells // 1000)):
+            cs = ConstraintSet([(0, j) for j in range(n)], [(1, [j, j + 1]) for j in range(n - 1)])
+            sampler = SamplingBackend(seed=1)
+            solutions = sampler.count_solutions(cs)
+            self.assertEqual(sampler.effective_samples, walks)
+            self.assertEqual(sorted(solutions), [n // 2])
+
+
+class TestComponentCache(unittest.TestCase):
+    # Two cells side by side under a 1 and a 2
+    CELLS = [(0, 0), (0, 1)]
+    CONSTRAINTS = [(1, [0]), (2, [0, 1])]
+
+    def solve(self, cs: ConstraintSet):
+        return BACKENDS["enumeration"]().count_solutions(cs)
+
+    def test_signature(self):
+        """
+        The same cells and numbers give the same key in any order of the numbers, anything else a new one
+        """
+        key = ComponentCache.signature(ConstraintSet(self.CELLS, self.CONSTRAINTS))
+        self.assertEqual(ComponentCache.signature(ConstraintSet(list(self.CELLS), self.CONSTRAINTS[::-1])), key)
+        self.assertNotEqual(ComponentCache.signature(ConstraintSet(self.CELLS, [(1, [0]), (1, [0, 1])])), key)
+        self.assertNotEqual(ComponentCache.signature(ConstraintSet([(0, 0), (1, 1)], self.CONSTRAINTS)), key)
+
+    def test_hits(self):
+        cache = ComponentCache()
+        cs = ConstraintSet(self.CELLS, self.CONSTRAINTS)
+        key = cache.signature(cs)
+        self.assertIsNone(cache.get(key))
+        solutions = self.solve(cs)
+        cache.put(key, solutions)
+        self.assertIs(cache.get(ComponentCache.signature(ConstraintSet(self.CELLS, self.CONSTRAINTS))), solutions)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # One more flag next to the 2
+        self.assertIsNone(cache.get(cache.signature(ConstraintSet(self.CELLS, [(1, [0]), (1, [0, 1])]))))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_eviction(self):
+        """
+        Past maxsize the least recently used component goes, a hit counts as a use
+        """
+        cache = ComponentCache(3)
+        keys = [cache.signature(ConstraintSet([(0, c)], [(1, [0])])) for c in range(5)]
+        for key in keys[:3]:
+            cache.put(key, {1: (1, [1])})
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.put(keys[3], {1: (1, [1])})
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.put(keys[4], {1: (1, [1])})
+        self.assertEqual(len(cache), 3)
+        self.assertEqual([cache.get(key) is not None for key in keys], [True, False, False, True, True])
+
+    def test_ai(self):
+        """
+        The AI hits its cache in expert games, and plays the same moves as without one
+        """
+        hits = 0
+        for seed in range(EXPERT_GAMES):
+            games = []
+            for cacheSize in (256, 0):
+                board = Board(30, 16, 99, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+                ai = AI(board, verbose=False, cacheSize=cacheSize)
+                moves = []
+                while not board.winning_check():
+                    batch = ai.make_move()
+                    moves.append((batch.opens, sorted(batch.flags)))
+                    if len(batch) == 0 or board.apply_actions(batch.flags, batch.opens)[1]:
+                        break
+                games.append((moves, ai.get_cache()))
+            (cached, cache), (uncached, empty) = games
+            self.assertEqual(cached, uncached, msg=seed)
+            self.assertEqual((empty.hits, len(empty)), (0, 0))
+            hits += cache.hits
+        self.assertGreater(hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Checks of the packed board format and the corpus files, a board has to come back exactly as
+it was written, counters included.
+
+    cd Game
+    python -m pytest -q test_storage.py
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from AI import AI
+from Board import Board
+from Storage import MAX_FIRST_CLICK, MAX_SIDE, SEED_RANGE, Corpus, CorpusWriter, pack_board, unpack_board
+from test_solver import positions
+
+# Odd sizes too, so the last byte of the mines and of the states is only partly used
+SIZES = ((1, 1, 0), (1, 1, 1), (3, 1, 1), (7, 3, 5), (5, 9, 10), (30, 16, 99))
+
+
+def played(width: int, height: int, mines: int, games: int = 3):
+    """
+    Boards with some of every state on them: flagged and opened cells when the AI can play
+    the size, a few cells set by hand when it can't
+    :return: list of boards
+    """
+    if width * height < 9:
+        boards = []
+        for seed in range(games):
+            board = Board(width, height, mines, seed=seed, verbose=False)
+            board.set_state(0, 0, 1 + seed % 2)
+            boards.append(board)
+        return boards
+    return [board.snapshot() for board in positions(width, height, mines, games)]
+
+
+def assert_same_board(test: unittest.TestCase, board: Board, other: Board):
+    """
+    other has the same mines, states, settings and counters as board
+    """
+    height, width = board.get_board_shape()
+    test.assertEqual(other.get_board_shape(), (height, width))
+    np.testing.assert_array_equal(other.get_board_mines(), board.get_board_mines())
+    np.testing.assert_array_equal(other.get_board_state(), board.get_board_state())
+    np.testing.assert_array_equal(other.get_board_freq(), board.get_board_freq())
+    test.assertEqual(other.get_seed(), board.get_seed())
+    test.assertEqual(other.get_first_click(), board.get_first_click())
+    test.assertEqual(other.get_mines_count(), board.get_mines_count())
+    test.assertEqual((other.get_hidden_count(), other.get_flagged_count(), other.get_opened_count()),
+                     (board.get_hidden_count(), board.get_flagged_count(), board.get_opened_count()))
+    for r in range(height):
+        for c in range(width):
+            test.assertEqual(other.hidden_neighbour_count(r, c), board.hidden_neighbour_count(r, c))
+            test.assertEqual(other.flagged_neighbour_count(r, c), board.flagged_neighbour_count(r, c))
+
+
+class TestPackBoard(unittest.TestCase):
+    def test_round_trip(self):
+        for size in SIZES:
+            for board in played(*size):
+                assert_same_board(self, board, unpack_board(pack_board(board)))
+
+    def test_unseeded(self):
+        board = Board(9, 9, 10, verbose=False, first_click=AI.FIRST_MOVE)
+        board.open_cell(*AI.FIRST_MOVE)
+        other = unpack_board(pack_board(board))
+        self.assertIsNone(other.get_seed())
+        assert_same_board(self, board, other)
+
+    def test_limits(self):
+        """
+        The biggest seeds, sides and first clicks the header holds come back, anything past them
+        is refused when the record is written
+        """
+        for seed in (SEED_RANGE[0], SEED_RANGE[-1]):
+            board = Board(5, 4, 3, seed=seed, verbose=False, first_click=AI.FIRST_MOVE)
+            assert_same_board(self, board, unpack_board(pack_board(board)))
+        for seed in (SEED_RANGE[0] - 1, SEED_RANGE[-1] + 1, 2 ** 200, "seed"):
+            with self.assertRaises(ValueError):
+                pack_board(Board(5, 4, 3, seed=seed, verbose=False))
+        for width, height in ((MAX_SIDE, 1), (1, MAX_SIDE)):
+            click = (min(height - 1, MAX_FIRST_CLICK), min(width - 1, MAX_FIRST_CLICK))
+            board = Board(width, height, 3, seed=0, verbose=False, first_click=click)
+            board.open_cell(*click)
+            assert_same_board(self, board, unpack_board(pack_board(board)))
+            with self.assertRaises(ValueError):
+                pack_board(Board(width, height, 3, seed=0, verbose=False, first_click=(height - 1, width - 1)))
+        with self.assertRaises(ValueError):
+            pack_board(Board(MAX_SIDE + 1, 1, 0, verbose=False))
+
+    def test_offset(self):
+        board = played(7, 3, 5)[-1]
+        data = b"\x00" * 5 + pack_board(board)
+        assert_same_board(self, board, unpack_board(data, 5))
+
+
+class TestCorpus(unittest.TestCase):
+    def test_round_trip(self):
+        boards = [board for size in SIZES for board in played(*size)]
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "boards.msc")
+            with CorpusWriter(path) as writer:
+                for board in boards:
+                    writer.append(board)
+                self.assertEqual(len(writer), len(boards))
+            with Corpus(path) as corpus:
+                self.assertEqual(len(corpus), len(boards))
+                for board, other in zip(boards, corpus):
+                    assert_same_board(self, board, other)
+                assert_same_board(self, boards[-1], corpus[-1])
+                with self.assertRaises(IndexError):
+                    corpus[len(boards)]
+
+    def test_not_a_corpus(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "boards.msc")
+            with open(path, "wb") as f:
+                f.write(b"\x00" * 64)
+            with self.assertRaises(ValueError):
+                Corpus(path)
+
+
+if __name__ == '__main__':
+    unittest.main()